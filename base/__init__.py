@@ -1,4 +1,5 @@
-from logging import StreamHandler, getLogger
+from functools import lru_cache
+from logging import Logger, StreamHandler, getLogger
 from sys import stderr, stdout
 from typing import TYPE_CHECKING
 
@@ -8,30 +9,69 @@ if TYPE_CHECKING:
     from typing import Any
 
 
-ssl_config: 'dict[str, dict[str,Any]]' = load("config/ssl_config.toml")
+# Config sections are read on first use: every name below maps to the file
+# holding it and the keys leading to it. A file is parsed once, the section
+# is then kept as a module attribute.
+_ssl_config: 'str' = "config/ssl_config.toml"
+_app_config: 'str' = "config/app_config.toml"
 
-try:
-    ssl_certificate: 'dict[str,Any]' = ssl_config.pop("ssl_certificate")
-    ssl_private_key: 'dict[str,Any]' = ssl_config.pop("ssl_private_key")
-    ssl_digest: 'dict[str,Any]' = ssl_config.pop("ssl_digest")
-    ssl_certificate_file: 'dict[str,Any]' = ssl_config.pop("certificate")
-    del ssl_config
-except KeyError as key_error:
-    stderr.write(f"SSL config is missing section {key_error}")
+_sections: 'dict[str, tuple[str, tuple[str, ...]]]' = {
+    'ssl_certificate': (_ssl_config, ("ssl_certificate",)),
+    'ssl_private_key': (_ssl_config, ("ssl_private_key",)),
+    'ssl_leaf_key': (_ssl_config, ("leaf_key",)),
+    'ssl_digest': (_ssl_config, ("ssl_digest",)),
+    'ssl_certificate_file': (_ssl_config, ("certificate",)),
+    'app': (_app_config, ("app",)),
+    'app_log': (_app_config, ("log", "app")),
+    'request_log': (_app_config, ("log", "request")),
+    'cache': (_app_config, ("cache",)),
+    'response_cache': (_app_config, ("response_cache",)),
+    'upstream_pool': (_app_config, ("upstream_pool",)),
+    'stream': (_app_config, ("stream",)),
+    'memory': (_app_config, ("memory",)),
+    'codec': (_app_config, ("codec",)),
+    'interceptors': (_app_config, ("interceptors",)),
+    'observers': (_app_config, ("observers",)),
+    'tls': (_app_config, ("tls",)),
+    'passthrough': (_app_config, ("passthrough",)),
+    'dns': (_app_config, ("dns",)),
+    'startup': (_app_config, ("startup",)),
+    'supervisor': (_app_config, ("supervisor",)),
+    'metrics': (_app_config, ("metrics",)),
+}
 
-app_config: 'dict[str, dict[str,Any]]' = load("config/app_config.toml")
 
-try:
-    app: 'dict[str,Any]' = app_config.pop("app")
-    app_log: 'dict[str,str]' = app_config['log'].pop("app")
-    request_log: 'dict[str,Any]' = app_config['log'].pop("request")
-    cache: 'dict[str,Any]' = app_config.pop("cache")
-    del app_config
-except KeyError as key_error:
-    stderr.write(f"Application config is missing section {key_error}")
+@lru_cache(maxsize=None)
+def _load(file: 'str') -> 'dict[str, Any]':
+    return load(file)
 
 
-logger = getLogger("Root")
-logger.setLevel(app_log['level'].upper())  # type:ignore
-sh = StreamHandler(stdout)
-logger.addHandler(sh)
+def _section(name: 'str') -> 'dict[str,Any]':
+    file, keys = _sections[name]
+    section: 'dict[str,Any]' = _load(file)
+    try:
+        for key in keys:
+            section = section[key]
+    except KeyError as key_error:
+        stderr.write(f"{'SSL' if file == _ssl_config else 'Application'} config is missing section {key_error}")
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    return section
+
+
+@lru_cache(maxsize=None)
+def _logger() -> 'Logger':
+    root: 'Logger' = getLogger("Root")
+    root.setLevel(_section('app_log')['level'].upper())
+    root.addHandler(StreamHandler(stdout))
+    return root
+
+
+def __getattr__(name: 'str') -> 'Any':
+    if name == 'logger':
+        value: 'Any' = _logger()
+    elif name in _sections:
+        value = _section(name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
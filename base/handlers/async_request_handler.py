@@ -0,0 +1,646 @@
+""" Asyncio based proxy handler """
+
+from asyncio import (IncompleteReadError, LimitOverrunError, StreamReader,
+                     StreamWriter, get_running_loop, open_connection,
+                     wait_for)
+from contextvars import copy_context
+from http.client import BadStatusLine, HTTPException, HTTPMessage, parse_headers
+from inspect import iscoroutinefunction
+from io import BytesIO
+from socket import socket
+from ssl import SSLError
+from time import monotonic, time
+from typing import TYPE_CHECKING
+from uuid import uuid4
+
+from base import logger, stream
+
+from .body_capture import BodyCapture
+from .passthrough import pump_streams
+from .request_handler import ProxyRequestHandler, _chunk_size, _content_length, _del_header
+
+if TYPE_CHECKING:
+    from typing import Any, AsyncIterator, Callable
+
+    from base.server.async_proxy_server import AsyncBaseProxyServer
+
+    from .connection_pool import PoolKey
+    from .memory_budget import MemoryBudget
+    from .metrics import Metrics
+    from .response_cache import CachedResponse, ResponseCache
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'AsyncProxyRequestHandler'
+]
+
+
+class AsyncProxyRequestHandler(ProxyRequestHandler):
+    """ Proxy handler driven by asyncio streams instead of a blocking socket.
+
+    Request parsing, error replies and message building are inherited from
+    ``ProxyRequestHandler``; only socket I/O is replaced by awaitable
+    equivalents. Blocking work (certificate minting, plugins) is pushed to the
+    event loop's default executor. ``_proxy_sock`` holds the upstream
+    ``(StreamReader, StreamWriter)`` pair, which is what the pool stores.
+    """
+
+    def __init__(self, reader: 'StreamReader', writer: 'StreamWriter',
+                 server: 'AsyncBaseProxyServer') -> 'None':
+        self.server = server  # type:ignore
+        self._init_request_state()
+
+        self.reader = reader
+        self.writer = writer
+        self.client_address = writer.get_extra_info('peername') or ('', 0)
+
+        # BaseHTTPRequestHandler writes replies to wfile, they are buffered
+        # here and flushed to the stream writer.
+        self.rfile = BytesIO()
+        self.wfile = BytesIO()
+        self.close_connection = True
+
+        self._proxy_reader: 'StreamReader'
+        self._proxy_writer: 'StreamWriter'
+
+    async def handle(self) -> 'None':  # type:ignore
+        metrics: 'Metrics' = self.server.metrics
+        if metrics:
+            metrics.inc('connections_total')
+            metrics.gauge('connections_active', 1)
+        try:
+            await self.handle_one_request_async()
+            while not self.close_connection:
+                await self.handle_one_request_async()
+        except (ConnectionError, IncompleteReadError, SSLError, TimeoutError):
+            pass
+        finally:
+            # Hand a tunnel's connection back once the client is gone
+            if self._proxy_sock is not None:
+                self._release_upstream(reusable=self._proxy_idle)
+            self._release_budget()
+            self.logger.close()
+            if metrics:
+                metrics.gauge('connections_active', -1)
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, SSLError):
+                pass
+
+    async def handle_one_request_async(self) -> 'None':
+        self.close_connection = True
+        try:
+            head: 'bytes' = await wait_for(self.reader.readuntil(separator=b'\r\n\r\n'), timeout=self.timeout)
+        except IncompleteReadError:
+            return
+        except LimitOverrunError:
+            self.send_error(code=431)
+            await self.flush()
+            return
+
+        self.rfile = BytesIO(head)
+        self.raw_requestline = self.rfile.readline(65537)
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(code=414)
+            await self.flush()
+            return
+
+        if self.parse_request():
+            try:
+                if self.command == 'CONNECT':
+                    await self.do_CONNECT_async()
+                else:
+                    await self.do_COMMAND_async()
+            except (ConnectionError, IncompleteReadError, SSLError, TimeoutError):
+                raise
+            except Exception:
+                # Whatever was half written can not be followed by another response
+                logger.exception(f'Failed to handle {self.requestline!r} from {self.client_address[0]}')
+                self.close_connection = True
+                return
+        await self.flush()
+
+    async def flush(self) -> 'None':
+        data: 'bytes' = self.wfile.getvalue()  # type:ignore
+        if data:
+            self.wfile.seek(0)
+            self.wfile.truncate()
+            self.writer.write(data)
+            await self.writer.drain()
+
+    async def run_blocking(self, func: 'Callable[..., Any]', *args: 'Any') -> 'Any':
+        """ Await ``func`` directly when it is a coroutine function, otherwise
+        run it on the default executor so it can not stall the event loop. """
+        if iscoroutinefunction(func):
+            return await func(*args)
+        # Carry context variables, such as the plugins' current handler, along
+        return await get_running_loop().run_in_executor(None, copy_context().run, func, *args)
+
+    async def _connect_to_host_async(self) -> 'None':
+        self._parse_target()
+        await self._connect_to_target_async()
+
+    async def _connect_to_target_async(self) -> 'None':
+        self._proxy_key: 'PoolKey' = (self.hostname, int(self.port), self.is_connect)
+        await self._acquire_upstream_async()
+
+        if self.is_connect:
+            cert: 'dict[str, Any] | None' = self._proxy_writer.get_extra_info('peercert')
+            if cert:
+                self.san = cert.get('subjectAltName', [
+                    ('DNS', self.hostname)])
+
+    async def _acquire_upstream_async(self) -> 'None':
+        # Reuse an idle keep-alive connection to the destination if possible
+        pooled: 'tuple[StreamReader, StreamWriter] | None' = \
+            self.server.upstream_pool.acquire(key=self._proxy_key)
+        self._proxy_reused = pooled is not None
+        self._proxy_reader, self._proxy_writer = pooled if pooled is not None else await self._open_upstream_async()
+        self._proxy_sock = (self._proxy_reader, self._proxy_writer)  # type:ignore
+
+    async def _open_upstream_async(self) -> 'tuple[StreamReader, StreamWriter]':
+        # Connect to destination, resolving first to time DNS on its own
+        started: 'float' = monotonic()
+        addresses: 'list[tuple[Any, ...]]' = \
+            await self.server.resolver.resolve_async(host=self.hostname, port=int(self.port))
+        resolved: 'float' = monotonic()
+        sock: 'socket' = await self.server.resolver.connect_async(host=self.hostname, addresses=addresses)
+        connected: 'float' = monotonic()
+        reader, writer = await open_connection(sock=sock)
+
+        # Wrap the socket if SSL is required. asyncio's SSL transport takes
+        # no session to resume, share the context only
+        if self.is_connect:
+            try:
+                await writer.start_tls(sslcontext=self.server.tls_sessions.context, server_hostname=self.hostname)
+            except BaseException:
+                writer.close()
+                raise
+        self._observe_upstream(started=started, resolved=resolved, connected=connected)
+        return reader, writer
+
+    async def _send_to_upstream_async(self, request: 'list[bytes]') -> 'tuple[str, int, str, HTTPMessage]':
+        try:
+            self._proxy_writer.writelines(request)
+            await self._proxy_writer.drain()
+            if self.http_request_streamed:
+                # A streamed body can not be replayed once read from the client
+                self._proxy_reused = False
+                await self._relay_request_stream_async()
+            return await self._read_response_head()
+        except (OSError, IncompleteReadError):
+            # A pooled connection may have been closed by the origin while
+            # idle, retry once on a fresh one.
+            if not self._may_retry():
+                raise
+            self.server.upstream_pool.discard(conn=self._proxy_sock)
+            self._proxy_reused = False
+            self._proxy_reader, self._proxy_writer = await self._open_upstream_async()
+            self._proxy_sock = (self._proxy_reader, self._proxy_writer)  # type:ignore
+            return await self._send_to_upstream_async(request=request)
+
+    async def _bypasses_interception_async(self) -> 'bool':
+        if not self.server.passthrough:
+            return False
+        try:
+            self._parse_target()
+            port: 'int' = int(self.port)
+        except ValueError:
+            # Left for the intercepting path to reject
+            return False
+        decision: 'bool | None' = self.server.passthrough.lookup(host=self.hostname, port=port)
+        if decision is not None:
+            return decision
+        try:
+            infos: 'list[tuple[Any, ...]]' = await self.server.resolver.resolve_async(host=self.hostname, port=port)
+        except OSError:
+            infos = []
+        return self.server.passthrough.decide(host=self.hostname, port=port,
+                                              addresses=[str(info[4][0]) for info in infos])
+
+    async def _tunnel_async(self) -> 'None':
+        try:
+            addresses: 'list[tuple[Any, ...]]' = \
+                await self.server.resolver.resolve_async(host=self.hostname, port=int(self.port))
+            upstream: 'tuple[StreamReader, StreamWriter]' = await open_connection(
+                sock=await self.server.resolver.connect_async(host=self.hostname, addresses=addresses))
+        except Exception as e:
+            self.send_error(code=502, message=str(e))
+            return
+        self.send_response(code=200, message='Connection established')
+        self.end_headers()
+        await self.flush()
+        self.close_connection = True
+
+        started: 'float' = monotonic()
+        bytes_up, bytes_down = 0, 0
+        self.server.tunnels.opened()
+        try:
+            bytes_up, bytes_down = await pump_streams(client=(self.reader, self.writer), upstream=upstream)
+        finally:
+            upstream[1].close()
+            self._tunnel_closed(bytes_up=bytes_up, bytes_down=bytes_down, seconds=monotonic() - started)
+
+    async def do_CONNECT_async(self) -> 'None':
+        self.is_connect = True
+        if await self._bypasses_interception_async():
+            await self._tunnel_async()
+            return
+        try:
+            # Connect to destination first
+            await self._connect_to_host_async()
+            ssl_context = self.server.tls_contexts.lookup(hostname=self.hostname) or \
+                await self.run_blocking(self._server_ssl_context)
+
+            # If successful, let's do this! Reading stays paused until the
+            # TLS protocol takes over so the ClientHello is not buffered by
+            # the plain stream reader.
+            self.writer.transport.pause_reading()
+            self.send_response(code=200, message='Connection established')
+            self.end_headers()
+            await self.flush()
+            started: 'float' = monotonic()
+            await self.writer.start_tls(sslcontext=ssl_context)
+            if self.server.metrics:
+                self.server.metrics.observe('phase_seconds', monotonic() - started, phase='client_tls')
+
+        except Exception as e:
+            self.send_error(code=500, message=str(e))
+            return
+
+        # The tunnel then serves requests until the client asks to close or
+        # stays idle for longer than app.idle_timeout
+        self.ssl_host = f'https://{self.path}'
+        await self.handle_one_request_async()
+
+    async def do_COMMAND_async(self) -> 'None':
+        self._exchange_started: 'tuple[float, float]' = (time(), monotonic())
+        self.request_id = uuid4()
+        # Is this an SSL tunnel?
+        try:
+            if not self.is_connect:
+                self._parse_target()
+            cached: 'CachedResponse | None' = None
+            if self._cache_key():
+                cached = self._cache_select(entry=await self._cache_load_async())
+            if cached is None and self.http_cache_result != 'unavailable':
+                await self._prepare_upstream_async()
+        except Exception as e:
+            self.send_error(code=500, message=str(e))
+            return
+        if self.http_cache_result == 'unavailable':
+            self.send_error(code=504, message='Not in cache')
+            return
+        if cached is not None:
+            await self._relay_cached_async(entry=cached)
+            return
+        self._proxy_idle = False
+        self._exchange_connected: 'float' = monotonic()
+
+        # Build request
+        self.http_request_title: 'str' = \
+            f'{self.command} {self.path} {self.request_version}\r\n'
+
+        # Add headers to the request
+        self.http_request_headers: 'dict[str,str]' = dict()
+
+        for header, value in self.headers.items():
+            self.http_request_headers[header] = value
+        if self._cache_entry is not None:
+            # Revalidate the stored response rather than fetch it again
+            self.http_request_headers.update(self._cache_entry.validators)
+
+        # Append message body if present to the request, answering a pending
+        # "100 Continue" first. Large and chunked bodies are piped to the
+        # destination after the headers instead.
+        self.http_request_body = b""
+        try:
+            self.http_request_framing: 'str' = self._request_framing()
+            self.http_request_streamed = self._should_stream_request()
+            if not self.http_request_streamed and self.http_request_framing != 'none':
+                await self.flush()
+                self.http_request_body = b"".join([chunk async for chunk in self._iter_request_body_async()])
+        except ValueError as e:
+            self._abort_exchange(code=400, error=e)
+            return
+        if not self.http_request_streamed and self.http_request_framing != 'none':
+            self._hold_budget(size=len(self.http_request_body))
+            if self.http_request_framing == 'chunked':
+                _del_header(headers=self.http_request_headers, name='Transfer-Encoding')
+                self.http_request_headers['Content-Length'] = str(len(self.http_request_body))
+
+        # Send it down the pipe! A streamed request body fails on the
+        # client's framing, the response head on the origin's.
+        try:
+            version, status, reason, message = await self._send_to_upstream_async(
+                request=await self.build_request_async())
+            self._exchange_responded: 'float' = monotonic()
+
+            # Parse response
+            framing: 'str' = self._response_framing(status=status, message=message)
+        except ValueError as e:
+            self._abort_exchange(code=400, error=e)
+            return
+        except HTTPException as e:
+            self._abort_exchange(code=502, error=e)
+            return
+        will_close: 'bool' = framing == 'eof' or self._response_will_close(version=version, message=message) or \
+            self._request_closes_upstream()
+
+        self.http_response_title: 'str' = \
+            f'{self.request_version} {status} {reason}\r\n'
+        self.http_response_status: 'int' = status
+        self.http_response_streamed = self._should_stream_response(
+            length=self._response_length(framing=framing, message=message))
+
+        if self.http_response_streamed:
+            await self._relay_response_stream_async(framing=framing, message=message)
+        else:
+            try:
+                http_response_body: 'bytes' = b"".join(
+                    [chunk async for chunk in self._iter_response_body(framing=framing, message=message)])
+            except HTTPException as e:
+                self._abort_exchange(code=502, error=e)
+                return
+            self._hold_budget(size=len(http_response_body))
+
+            # Get rid of the pesky header
+            del message['Transfer-Encoding']
+
+            self.http_response_headers: 'dict[str,str]' = dict()
+            for header, value in message.items():
+                self.http_response_headers[header] = value
+            self.http_response_body = http_response_body
+            if framing in ('chunked', 'eof'):
+                # Let a keep-alive client find the end of a de-chunked body
+                self.http_response_headers['Content-Length'] = str(len(http_response_body))
+
+        # Let's close off the remote end, unless the origin keeps it alive.
+        # A tunnel keeps its connection for the client's next request.
+        if self.is_connect and not will_close and not self.close_connection:
+            self._proxy_idle = True
+        else:
+            self._release_upstream(reusable=not will_close)
+        self._update_cache(reason=reason, response_headers=message.items())
+
+        # Relay the message
+        if not self.http_response_streamed:
+            response: 'list[bytes]' = await self.build_response_async()
+            await self.flush()
+            self.writer.writelines(response)
+            await self.writer.drain()
+        await self._capture_exchange_async(status=self.http_response_status, response_headers=message.items())
+        self._release_budget()
+
+    async def _prepare_upstream_async(self) -> 'None':
+        if not self.is_connect:
+            # Connect to destination
+            await self._connect_to_target_async()
+        elif self._proxy_sock is None:
+            # The previous request in this tunnel gave its connection up
+            await self._acquire_upstream_async()
+        elif self._proxy_idle:
+            # Kept from the previous request, the origin may have closed it since
+            self._proxy_reused = True
+
+    async def _cache_load_async(self) -> 'CachedResponse | None':
+        # Only the disk tier blocks
+        cache: 'ResponseCache' = self.server.response_cache
+        entry: 'CachedResponse | None' = cache.lookup(url=self._cache_url, headers=self.headers)
+        if entry is None and cache.disk is not None:
+            entry = await self.run_blocking(cache.load, self._cache_url, self.headers)
+        return entry
+
+    async def _relay_cached_async(self, entry: 'CachedResponse') -> 'None':
+        self._use_cached_request()
+        # Request interceptors see every request, their changes go nowhere
+        await self.build_request_async()
+        self._use_cached(entry=entry)
+        response: 'list[bytes]' = await self.build_response_async()
+        await self.flush()
+        self.writer.writelines(response)
+        await self.writer.drain()
+        await self._capture_exchange_async(status=self.http_response_status, response_headers=entry.headers)
+
+    async def _capture_exchange_async(self, status: 'int', response_headers: 'list[tuple[str,str]]') -> 'None':
+        # A blocking capture queue is waited for off the event loop
+        meta, request_body, response_body = self._exchange_record(status=status, response_headers=response_headers)
+        await self.logger.exchange_async(meta=meta, request_body=request_body, response_body=response_body)
+
+    async def _iter_request_body_async(self) -> 'AsyncIterator[bytes]':
+        chunk_size: 'int' = stream['chunk_size']
+        budget: 'MemoryBudget' = self.server.memory_budget
+
+        if self.http_request_framing == 'chunked':
+            while True:
+                size = _chunk_size(line=await self.reader.readline())
+                if size == 0:
+                    # Discard trailers
+                    while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                while size > 0:
+                    async with budget.hold_async(size=min(size, chunk_size)):
+                        data: 'bytes' = await self.reader.readexactly(min(size, chunk_size))
+                        size -= len(data)
+                        yield data
+                await self.reader.readline()
+
+        elif self.http_request_framing == 'length':
+            remaining = _content_length(value=self.headers['Content-Length'])
+            while remaining > 0:
+                async with budget.hold_async(size=min(remaining, chunk_size)):
+                    data = await self.reader.read(min(remaining, chunk_size))
+                    if not data:
+                        raise IncompleteReadError(partial=b"", expected=remaining)
+                    remaining -= len(data)
+                    yield data
+
+    async def _relay_request_stream_async(self) -> 'None':
+        """ Asyncio counterpart of ``_relay_request_stream``. """
+        chunked: 'bool' = self.http_request_framing == 'chunked'
+        capture = BodyCapture(budget=self.server.memory_budget)
+        self.http_request_body_capture = capture
+
+        await self.flush()
+        async for chunk in self._iter_request_body_async():
+            if chunked:
+                self._proxy_writer.writelines((b'%x\r\n' % len(chunk), chunk, b'\r\n'))
+            else:
+                self._proxy_writer.write(chunk)
+            await self._proxy_writer.drain()
+            capture.write(chunk=chunk)
+            await self.request_body_chunk_async(chunk=chunk)
+
+        if chunked:
+            self._proxy_writer.write(b'0\r\n\r\n')
+            await self._proxy_writer.drain()
+
+        self.http_request_body = capture.getvalue()
+        self.http_request_body_truncated = capture.truncated
+        await self.end_request_stream_async()
+        capture.close()
+
+    async def _read_response_head(self) -> 'tuple[str, int, str, HTTPMessage]':
+        while True:
+            status_line: 'str' = (await self._proxy_reader.readline()).decode(encoding='iso-8859-1')
+            if not status_line:
+                raise ConnectionError('Remote end closed connection without response')
+            version, status, reason = (status_line.rstrip('\r\n').split(maxsplit=2) + [''])[:3]
+
+            head = BytesIO()
+            while True:
+                line: 'bytes' = await self._proxy_reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                head.write(line)
+            head.seek(0)
+            message: 'HTTPMessage' = parse_headers(head)  # type:ignore
+
+            if len(status) != 3 or not (status.isascii() and status.isdigit()):
+                raise BadStatusLine(status_line.rstrip('\r\n'))
+            # Skip interim responses
+            if status != '100':
+                return version, int(status), reason, message
+
+    def _response_framing(self, status: 'int', message: 'HTTPMessage') -> 'str':
+        """ Tell how the response body is delimited: ``none``, ``chunked``,
+        ``length`` or ``eof`` (the origin closes the connection). """
+        if self.command == 'HEAD' or status < 200 or status in (204, 304):
+            return 'none'
+        if 'chunked' in message.get('Transfer-Encoding', '').lower():
+            return 'chunked'
+        if 'Content-Length' in message:
+            try:
+                _content_length(value=message['Content-Length'])
+            except ValueError as e:
+                raise HTTPException(str(e)) from e
+            return 'length'
+        return 'eof'
+
+    async def _iter_response_body(self, framing: 'str', message: 'HTTPMessage') -> 'AsyncIterator[bytes]':
+        chunk_size: 'int' = stream['chunk_size']
+        budget: 'MemoryBudget' = self.server.memory_budget
+
+        if framing == 'chunked':
+            while True:
+                size_line: 'bytes' = await self._proxy_reader.readline()
+                try:
+                    size = _chunk_size(line=size_line)
+                except ValueError as e:
+                    raise HTTPException(str(e)) from e
+                if size == 0:
+                    # Discard trailers
+                    while (await self._proxy_reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                while size > 0:
+                    async with budget.hold_async(size=min(size, chunk_size)):
+                        data: 'bytes' = await self._proxy_reader.readexactly(min(size, chunk_size))
+                        size -= len(data)
+                        yield data
+                await self._proxy_reader.readexactly(2)
+
+        elif framing == 'length':
+            # Checked by _response_framing
+            remaining = _content_length(value=message['Content-Length'])
+            while remaining > 0:
+                async with budget.hold_async(size=min(remaining, chunk_size)):
+                    data = await self._proxy_reader.read(min(remaining, chunk_size))
+                    if not data:
+                        raise IncompleteReadError(partial=b"", expected=remaining)
+                    remaining -= len(data)
+                    yield data
+
+        elif framing == 'eof':
+            while True:
+                async with budget.hold_async(size=chunk_size):
+                    data = await self._proxy_reader.read(chunk_size)
+                    if not data:
+                        return
+                    yield data
+
+    @staticmethod
+    def _response_length(framing: 'str', message: 'HTTPMessage') -> 'int | None':
+        """ Length of the response body, ``None`` when only its end tells. """
+        if framing == 'none':
+            return 0
+        if framing == 'length':
+            return _content_length(value=message['Content-Length'])
+        return None
+
+    async def _relay_response_stream_async(self, framing: 'str', message: 'HTTPMessage') -> 'None':
+        """ Asyncio counterpart of ``_relay_response_stream``. """
+        chunked: 'bool' = framing == 'chunked'
+        if chunked and self.request_version != 'HTTP/1.1':
+            del message['Transfer-Encoding']
+            chunked = False
+        if framing == 'eof' or (framing == 'chunked' and not chunked):
+            self.close_connection = True
+
+        self.http_response_headers = dict()
+        for header, value in message.items():
+            self.http_response_headers[header] = value
+
+        capture = BodyCapture(budget=self.server.memory_budget)
+        self.http_response_body_capture = capture
+
+        await self.begin_response_stream_async()
+        await self.flush()
+        self.writer.write(self.build_response_head())
+
+        async for chunk in self._iter_response_body(framing=framing, message=message):
+            if chunked:
+                self.writer.writelines((b'%x\r\n' % len(chunk), chunk, b'\r\n'))
+            else:
+                self.writer.write(chunk)
+            await self.writer.drain()
+
+            capture.write(chunk=chunk)
+            await self.response_body_chunk_async(chunk=chunk)
+
+        if chunked:
+            self.writer.write(b'0\r\n\r\n')
+            await self.writer.drain()
+
+        self.http_response_body = capture.getvalue()
+        self.http_response_body_truncated = capture.truncated
+        await self.end_response_stream_async()
+        capture.close()
+
+    def _response_will_close(self, version: 'str', message: 'HTTPMessage') -> 'bool':
+        connection: 'str' = message.get('Connection', '').lower()
+        if version == 'HTTP/1.1':
+            return 'close' in connection
+        return 'keep-alive' not in connection and 'Keep-Alive' not in message
+
+    async def build_request_async(self) -> 'list[bytes]':
+        return self.build_request()
+
+    async def build_response_async(self) -> 'list[bytes]':
+        return self.build_response()
+
+    async def request_body_chunk_async(self, chunk: 'bytes') -> 'None':
+        self.request_body_chunk(chunk=chunk)
+
+    async def end_request_stream_async(self) -> 'None':
+        self.end_request_stream()
+
+    async def begin_response_stream_async(self) -> 'None':
+        self.begin_response_stream()
+
+    async def response_body_chunk_async(self, chunk: 'bytes') -> 'None':
+        self.response_body_chunk(chunk=chunk)
+
+    async def end_response_stream_async(self) -> 'None':
+        self.end_response_stream()
@@ -0,0 +1,116 @@
+""" Bounded capture of relayed message bodies """
+
+from io import BytesIO
+from tempfile import TemporaryFile
+from typing import TYPE_CHECKING
+
+from base import cache, memory, stream
+
+from .memory_budget import MemoryBudget
+
+if TYPE_CHECKING:
+    from typing import IO
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'BodyCapture'
+]
+
+
+class BodyCapture:
+    """ View of a streamed body for interceptors.
+
+    Keeps the first ``limit`` bytes or, when ``spill`` is set, the complete
+    body in an anonymous temporary file under ``spill_dir``. Short of that
+    the kept bytes stay in memory, held against ``budget``; past
+    ``spill_threshold`` bytes they are moved to a temporary file as soon as
+    the budget has no room for them.
+    """
+
+    def __init__(self, limit: 'int | None' = None, spill: 'bool | None' = None, spill_dir: 'str | None' = None,
+                 spill_threshold: 'int | None' = None, budget: 'MemoryBudget | None' = None) -> 'None':
+        limit = stream['capture_limit'] if limit is None else limit
+        spill = stream['spill'] if spill is None else spill
+        spill_dir = (cache['dir'] or None) if spill_dir is None else spill_dir
+        self.limit = limit
+        self.spill_dir = spill_dir
+        self.spill_threshold = memory['spill_threshold'] if spill_threshold is None else spill_threshold
+        self.budget = budget if budget is not None else MemoryBudget(limit=0)
+        self.size = 0
+        self._whole = spill
+        self._kept = 0
+        self._held = 0
+        self._prefix = bytearray()
+        self._file: 'IO[bytes] | None' = TemporaryFile(dir=spill_dir) if spill else None
+
+    def write(self, chunk: 'bytes') -> 'None':
+        self.size += len(chunk)
+        room: 'int' = len(chunk) if self._whole else self.limit - self._kept
+        if room <= 0:
+            return
+        data: 'bytes | memoryview' = chunk if room >= len(chunk) else memoryview(chunk)[:room]
+        self._kept += len(data)
+        if self._file is None:
+            if self._kept <= self.spill_threshold:
+                self.budget.reserve(size=len(data))
+            elif not self.budget.try_reserve(size=len(data)):
+                self._spill()
+        if self._file is not None:
+            self._file.write(data)
+            return
+        self._held += len(data)
+        self._prefix += data
+
+    def _spill(self) -> 'None':
+        self._file = TemporaryFile(dir=self.spill_dir)
+        self._file.write(self._prefix)
+        self._prefix = bytearray()
+        self.budget.release(size=self._held)
+        self.budget.spills += 1
+        self._held = 0
+
+    @property
+    def truncated(self) -> 'bool':
+        """ Whether ``getvalue`` misses part of the body. """
+        return self.size > min(self._kept, self.limit)
+
+    @property
+    def spilled(self) -> 'bool':
+        return self._file is not None
+
+    @property
+    def complete(self) -> 'bool':
+        """ Whether ``open`` gives the complete body. """
+        return self._kept == self.size
+
+    def getvalue(self) -> 'bytes':
+        """ Captured prefix of the body, at most ``limit`` bytes. """
+        if self._file is None:
+            return bytes(self._prefix)
+        self._file.flush()
+        self._file.seek(0)
+        prefix: 'bytes' = self._file.read(self.limit)
+        self._file.seek(0, 2)
+        return prefix
+
+    def open(self) -> 'IO[bytes]':
+        """ File-like object positioned at the start of the captured body,
+        spilled or not; see ``complete``. """
+        if self._file is None:
+            return BytesIO(self._prefix)
+        self._file.flush()
+        self._file.seek(0)
+        return self._file
+
+    def close(self) -> 'None':
+        self.budget.release(size=self._held)
+        self._held = 0
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,15 +1,37 @@
 """ Handle SSL Certificates management"""
 
-from os import makedirs, path
+from contextlib import contextmanager
+from ipaddress import ip_address
+from os import O_CREAT, O_RDWR
+from os import close as os_close
+from os import makedirs
+from os import open as os_open
+from os import path, replace, unlink
 from random import randint
-from tempfile import gettempdir
+from tempfile import gettempdir, mkstemp
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import TYPE_CHECKING
+from zlib import crc32
 
 from OpenSSL.crypto import (FILETYPE_PEM, X509, PKey, X509Extension, X509Req,
                             dump_certificate, dump_privatekey,
                             load_certificate, load_privatekey)
 
-from base import (cache, ssl_certificate, ssl_certificate_file, ssl_digest,
-                  ssl_private_key)
+from base import (cache, logger, ssl_certificate, ssl_certificate_file,
+                  ssl_digest, ssl_private_key, startup)
+
+from .key_pool import KeyPool
+
+try:
+    from fcntl import LOCK_EX, LOCK_UN, flock
+except ImportError:  # no cross-process locking on Windows, renames stay atomic
+    flock = None
+
+if TYPE_CHECKING:
+    from typing import Iterator
+
+    from .metrics import Metrics
 
 __author__ = 'Rushirajsinh Chudasama'
 __copyright__ = 'Copyright 2025, PyLogProxy Project'
@@ -23,20 +45,73 @@ __all__ = [
 ]
 
 
+def _is_ip_address(name: 'str') -> 'bool':
+    try:
+        ip_address(name)
+        return True
+    except ValueError:
+        return False
+
+
 class CertificateAuthority:
 
-    """ Class to handle Certificate Authority """
+    """ Class to handle Certificate Authority
 
-    def __init__(self, cache_dir: 'str' = cache['dir'] or f"{gettempdir()}/pylogproxy") -> 'None':
+    A CA found in ``cache_dir`` is loaded right away. A missing one is
+    generated there, with ``background`` on a thread of its own so that the
+    proxy serves while it is made; minting leaf certificates then waits
+    for it, see ``wait``.
+    """
+
+    def __init__(self, cache_dir: 'str | None' = None, metrics: 'Metrics | None' = None,
+                 background: 'bool | None' = None) -> 'None':
+        cache_dir = (cache['dir'] or f"{gettempdir()}/pylogproxy") if cache_dir is None else cache_dir
+        background = startup['background_ca'] if background is None else background
         makedirs(name=cache_dir, exist_ok=True)
         self.pkey_file = f"{cache_dir}/{ssl_certificate_file['private_key_name']}"
         self.crt_file = f"{cache_dir}/{ssl_certificate_file['certificate_name']}"
         self.cache_dir = cache_dir
+        self.metrics = metrics
+        self.key_pool = KeyPool()
+        self._flights_lock = Lock()
+        self._flights: 'dict[str, list]' = {}
+        self._ready = Event()
+        self._error: 'Exception | None' = None
 
-        if not path.exists(path=self.pkey_file):
-            self._generate_ca()
+        if background and not path.exists(path=self.pkey_file):
+            Thread(target=self._prepare_in_background, name='pylogproxy-ca', daemon=True).start()
         else:
-            self._read_pkey()
+            self._prepare()
+            self._ready.set()
+
+    @property
+    def ready(self) -> 'bool':
+        """ Whether certificate and key of the CA are available. """
+        return self._ready.is_set() and self._error is None
+
+    def wait(self) -> 'None':
+        """ Block until the CA is available, raising what made it fail. """
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def _prepare(self) -> 'None':
+        with self._file_lock(name='ca'):
+            if not path.exists(path=self.pkey_file):
+                started: 'float' = monotonic()
+                self._generate_ca()
+                logger.info(f"Generated CA certificate {self.crt_file} in {monotonic() - started:.1f}s")
+            else:
+                self._read_pkey()
+
+    def _prepare_in_background(self) -> 'None':
+        try:
+            self._prepare()
+        except Exception as e:
+            self._error = e
+            logger.error(f"Could not generate the CA certificate: {e}")
+        finally:
+            self._ready.set()
 
     def _generate_ca(self) -> 'None':
         # Generate key
@@ -74,11 +149,9 @@ class CertificateAuthority:
         ])
         self.cert.sign(pkey=self.key, digest=ssl_digest['digest'])
 
-        with open(file=self.pkey_file, mode='wb') as f:
-            f.write(dump_privatekey(type=FILETYPE_PEM, pkey=self.key))
-
-        with open(file=self.crt_file, mode='wb') as f:
-            f.write(dump_certificate(type=FILETYPE_PEM, cert=self.cert))
+        # The key file marks a complete CA, write it last
+        self._write_atomic(file=self.crt_file, data=dump_certificate(type=FILETYPE_PEM, cert=self.cert))
+        self._write_atomic(file=self.pkey_file, data=dump_privatekey(type=FILETYPE_PEM, pkey=self.key))
 
     def _read_pkey(self) -> None:
         with open(file=self.crt_file, mode='rb') as f:
@@ -91,43 +164,112 @@ class CertificateAuthority:
         cnp: 'str' = path.sep.join([self.cache_dir, '.pylogp_%s.pem' % cn])
         cnc: 'str' = path.sep.join(
             [self.cache_dir, '.pycrt_%s.pem' % cn])
-        if not path.exists(path=cnp):
-
-            san_list: 'list[str]' = []
-            for entry in san:
-                if len(entry) > 0 and entry[0] == "DNS":
-                    san_list.append(f"{entry[0]}:{entry[1]}")
-
-            # create private key
-            key = PKey()
-            key.generate_key(type=ssl_private_key['key_algorithm'], bits=ssl_private_key['key_size'])
-
-            # Generate CSR
-            csr = X509Req()
-            csr.get_subject().CN = cn
-            csr.set_pubkey(pkey=key)
-            csr.sign(pkey=key, digest=ssl_digest['digest'])
-
-            # Sign CSR
-            cert = X509()
-            cert.set_serial_number(
-                serial=randint(1000000000, 9999999999))
-            cert.set_subject(subject=csr.get_subject())
-            cert.set_issuer(issuer=self.cert.get_subject())
-            cert.set_version(version=2)
-            cert.gmtime_adj_notBefore(amount=0)
-            cert.gmtime_adj_notAfter(amount=31536000)
-            cert.set_pubkey(pkey=csr.get_pubkey())
-            cert.add_extensions(extensions=[
-                X509Extension(type_name=b"subjectAltName", critical=False,
-                              value=",".join(san_list).encode('utf-8')),
-            ])
-            cert.sign(pkey=self.key, digest=ssl_digest['digest'])
-
-            with open(file=cnc, mode='wb') as f:
-                f.write(dump_certificate(type=FILETYPE_PEM, cert=cert))
-
-            with open(file=cnp, mode='wb') as f:
-                f.write(dump_privatekey(type=FILETYPE_PEM, pkey=key))
+        if path.exists(path=cnp) and not self._leaf_expired(cnc=cnc):
+            if self.metrics:
+                self.metrics.inc('leaf_certificates_total', result='cached')
+            return cnc, cnp
 
+        self.wait()
+        # Concurrent callers for the same CN queue up behind one generation,
+        # workers in other processes behind the lock file.
+        started: 'float' = monotonic()
+        with self._single_flight(cn=cn), self._file_lock(name=cn):
+            minted: 'bool' = not path.exists(path=cnp) or self._leaf_expired(cnc=cnc)
+            if minted and path.exists(path=cnp):
+                # The key file marks a complete pair, readers wait for the new one
+                unlink(cnp)
+            if minted:
+                self._sign_cert(cn=cn, san=san, cnc=cnc, cnp=cnp)
+        if self.metrics:
+            self.metrics.inc('leaf_certificates_total', result='minted' if minted else 'waited')
+            self.metrics.observe('phase_seconds', monotonic() - started, phase='cert_mint')
         return cnc, cnp
+
+    @staticmethod
+    def _leaf_expired(cnc: 'str') -> 'bool':
+        """ Whether the cached leaf certificate is past its notAfter, a
+        missing certificate counts as expired. """
+        try:
+            with open(file=cnc, mode='rb') as f:
+                return load_certificate(type=FILETYPE_PEM, buffer=f.read()).has_expired()
+        except OSError:
+            return True
+
+    def _sign_cert(self, cn: 'str', san: 'list[tuple[str,str]]', cnc: 'str', cnp: 'str') -> 'None':
+        san_list: 'list[str]' = []
+        for entry in san:
+            if len(entry) > 1 and entry[0] == "DNS":
+                san_list.append(f"DNS:{entry[1]}")
+            elif len(entry) > 1 and entry[0] == "IP Address":
+                san_list.append(f"IP:{entry[1]}")
+        if not san_list:
+            # An empty subjectAltName can not be signed, name the CN instead
+            san_list.append(f"IP:{cn}" if _is_ip_address(cn) else f"DNS:{cn}")
+
+        # take a pre-generated private key
+        key: 'PKey' = self.key_pool.take()
+
+        # Generate CSR
+        csr = X509Req()
+        csr.get_subject().CN = cn
+        csr.set_pubkey(pkey=key)
+        csr.sign(pkey=key, digest=ssl_digest['digest'])
+
+        # Sign CSR
+        cert = X509()
+        cert.set_serial_number(
+            serial=randint(1000000000, 9999999999))
+        cert.set_subject(subject=csr.get_subject())
+        cert.set_issuer(issuer=self.cert.get_subject())
+        cert.set_version(version=2)
+        cert.gmtime_adj_notBefore(amount=0)
+        cert.gmtime_adj_notAfter(amount=31536000)
+        cert.set_pubkey(pkey=csr.get_pubkey())
+        cert.add_extensions(extensions=[
+            X509Extension(type_name=b"subjectAltName", critical=False,
+                          value=",".join(san_list).encode('utf-8')),
+        ])
+        cert.sign(pkey=self.key, digest=ssl_digest['digest'])
+
+        # The key file marks a complete pair, write it last
+        self._write_atomic(file=cnc, data=dump_certificate(type=FILETYPE_PEM, cert=cert))
+        self._write_atomic(file=cnp, data=dump_privatekey(type=FILETYPE_PEM, pkey=key))
+
+    @contextmanager
+    def _single_flight(self, cn: 'str') -> 'Iterator[None]':
+        with self._flights_lock:
+            flight = self._flights.setdefault(cn, [Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._flights_lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[cn]
+
+    @contextmanager
+    def _file_lock(self, name: 'str') -> 'Iterator[None]':
+        if flock is None:
+            yield
+            return
+        # A fixed set of striped lock files keeps the cache dir from filling up
+        fd = os_open(path.join(self.cache_dir, '.pylogproxy_%02d.lock' % (crc32(name.encode('utf-8')) % 64)),
+                     O_CREAT | O_RDWR, 0o600)
+        try:
+            flock(fd, LOCK_EX)
+            yield
+        finally:
+            flock(fd, LOCK_UN)
+            os_close(fd)
+
+    def _write_atomic(self, file: 'str', data: 'bytes') -> 'None':
+        fd, tmp = mkstemp(dir=self.cache_dir, prefix='.tmp_')
+        try:
+            with open(file=fd, mode='wb') as f:
+                f.write(data)
+            replace(tmp, file)
+        except BaseException:
+            unlink(tmp)
+            raise
@@ -0,0 +1,246 @@
+""" Asynchronous writer for per-connection capture records """
+
+from asyncio import get_running_loop
+from functools import partial
+from logging import CRITICAL, DEBUG, ERROR, INFO, WARNING, getLevelName
+from os import makedirs
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import monotonic, time
+from typing import TYPE_CHECKING
+
+from base import logger, request_log
+
+from .capture_store import CaptureStore
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import Queue as ProcessQueue
+    from typing import Any
+
+    CaptureEntry = tuple[dict[str, Any], bytes, bytes]
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'CaptureWriter',
+    'CaptureForwarder',
+    'CaptureRecord'
+]
+
+
+class CaptureRecord:
+    """ Capture of one client connection.
+
+    Offers the part of the ``logging.Logger`` API plugins use. Log lines are
+    kept in memory and stored with the next exchange recorded through
+    ``exchange``; whatever is left when the record is closed is stored as a
+    record of its own under the connection's id. The relaying thread never
+    touches the file system.
+    """
+
+    def __init__(self, writer: 'CaptureWriter', connection_id: 'str', level: 'int') -> 'None':
+        self.writer = writer
+        self.connection_id = connection_id
+        self.level = level
+        self.closed = False
+        self._lines: 'list[str]' = []
+
+    def isEnabledFor(self, level: 'int') -> 'bool':
+        return level >= self.level
+
+    def log(self, level: 'int', msg: 'Any', *args: 'Any') -> 'None':
+        if level >= self.level and not self.closed:
+            self._lines.append(msg % args if args else str(msg))
+
+    def debug(self, msg: 'Any', *args: 'Any') -> 'None':
+        self.log(DEBUG, msg, *args)
+
+    def info(self, msg: 'Any', *args: 'Any') -> 'None':
+        self.log(INFO, msg, *args)
+
+    def warning(self, msg: 'Any', *args: 'Any') -> 'None':
+        self.log(WARNING, msg, *args)
+
+    def error(self, msg: 'Any', *args: 'Any') -> 'None':
+        self.log(ERROR, msg, *args)
+
+    def critical(self, msg: 'Any', *args: 'Any') -> 'None':
+        self.log(CRITICAL, msg, *args)
+
+    def exchange(self, meta: 'dict[str, Any]', request_body: 'bytes', response_body: 'bytes') -> 'None':
+        """ Store one request/response exchange together with the pending log
+        lines, under ``meta['request_id']`` when it has one. """
+        if self.closed:
+            return
+        self.writer.submit(meta=self._complete(meta=meta), request_body=request_body, response_body=response_body)
+
+    async def exchange_async(self, meta: 'dict[str, Any]', request_body: 'bytes', response_body: 'bytes') -> 'None':
+        """ ``exchange`` from the event loop. """
+        if self.closed:
+            return
+        await self.writer.submit_async(meta=self._complete(meta=meta), request_body=request_body,
+                                       response_body=response_body)
+
+    def _complete(self, meta: 'dict[str, Any]') -> 'dict[str, Any]':
+        meta.setdefault('request_id', self.connection_id)
+        meta['connection_id'] = self.connection_id
+        meta['log'] = "\n".join(self._lines)
+        self._lines.clear()
+        return meta
+
+    def close(self) -> 'None':
+        """ Store log lines not attached to an exchange, later calls are ignored. """
+        if not self.closed and self._lines:
+            self.exchange(meta={'time': time()}, request_body=b"", response_body=b"")
+        self.closed = True
+
+
+class CaptureWriter:
+    """ Bounded queues feeding writer threads that append capture records to
+    a ``CaptureStore`` under ``directory``.
+
+    Every connection is pinned to one writer thread, and so to one series
+    of segments, to keep its records in order. A thread batches what it
+    dequeues and flushes its store once ``batch_size`` bytes are pending or
+    ``flush_interval`` seconds have passed. When a queue is full,
+    ``on_full="drop"`` discards the record and counts it in ``dropped``;
+    ``on_full="block"`` makes the relaying thread wait instead, or, through
+    ``submit_async``, a thread of the event loop's default executor.
+    """
+
+    def __init__(self, directory: 'str | None' = None, queue_size: 'int | None' = None, writers: 'int | None' = None,
+                 batch_size: 'int | None' = None, flush_interval: 'float | None' = None,
+                 on_full: 'str | None' = None, level: 'str | None' = None, segment_bytes: 'int | None' = None,
+                 segment_seconds: 'float | None' = None) -> 'None':
+        directory = request_log['dir'] if directory is None else directory
+        queue_size = request_log['queue_size'] if queue_size is None else queue_size
+        writers = request_log['writers'] if writers is None else writers
+        batch_size = request_log['batch_bytes'] if batch_size is None else batch_size
+        flush_interval = request_log['flush_interval'] if flush_interval is None else flush_interval
+        on_full = request_log['on_full'] if on_full is None else on_full
+        level = request_log['level'] if level is None else level
+        segment_bytes = request_log['segment_bytes'] if segment_bytes is None else segment_bytes
+        segment_seconds = request_log['segment_seconds'] if segment_seconds is None else segment_seconds
+        if on_full not in ('drop', 'block'):
+            raise ValueError(f'Unknown capture queue policy {on_full!r}')
+        makedirs(name=directory, exist_ok=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block = on_full == 'block'
+        self.level: 'int' = getLevelName(level.upper())
+        self.dropped = 0
+        self.written = 0
+        self._lock = Lock()
+        writers = max(writers, 1)
+        self._queues: 'list[Queue[CaptureEntry | None]]' = [Queue(maxsize=queue_size) for _ in range(writers)]
+        self._threads: 'list[Thread]' = []
+        for i, queue in enumerate(self._queues):
+            store = CaptureStore(directory=directory, segment_bytes=segment_bytes,
+                                 segment_seconds=segment_seconds, name=str(i) if writers > 1 else '')
+            self._threads.append(Thread(target=self._run, args=(queue, store),
+                                        name=f'pylogproxy-capture-{i}', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def open(self, connection_id: 'Any') -> 'CaptureRecord':
+        """ Start the capture record of a new connection. """
+        return CaptureRecord(writer=self, connection_id=str(connection_id), level=self.level)
+
+    def submit(self, meta: 'dict[str, Any]', request_body: 'bytes', response_body: 'bytes') -> 'None':
+        queue = self._queues[hash(meta['connection_id']) % len(self._queues)]
+        try:
+            queue.put(item=(meta, request_body, response_body), block=self.block)
+        except Full:
+            with self._lock:
+                self.dropped += 1
+
+    async def submit_async(self, meta: 'dict[str, Any]', request_body: 'bytes', response_body: 'bytes') -> 'None':
+        """ ``submit`` without blocking the event loop while a queue is full. """
+        if not self.block:
+            self.submit(meta=meta, request_body=request_body, response_body=response_body)
+            return
+        await get_running_loop().run_in_executor(
+            None, partial(self.submit, meta=meta, request_body=request_body, response_body=response_body))
+
+    def close(self) -> 'None':
+        """ Write everything queued so far and stop the writer threads. """
+        for queue in self._queues:
+            queue.put(item=None)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self, queue: 'Queue[CaptureEntry | None]', store: 'CaptureStore') -> 'None':
+        pending_size = 0
+        deadline = monotonic() + self.flush_interval
+        while True:
+            try:
+                item = queue.get(timeout=max(deadline - monotonic(), 0))
+            except Empty:
+                item = ()
+
+            if item:
+                meta, request_body, response_body = item
+                try:
+                    store.append(meta=meta, request_body=request_body, response_body=response_body)
+                except Exception as store_error:
+                    # Losing one record must not stop the writer thread
+                    logger.error(f"Could not store capture record {meta.get('request_id')}: {store_error}")
+                else:
+                    pending_size += len(request_body) + len(response_body) + len(meta['log'])
+                    with self._lock:
+                        self.written += 1
+
+            if item is None or pending_size >= self.batch_size or monotonic() >= deadline:
+                try:
+                    store.flush()
+                except Exception as store_error:
+                    logger.error(f"Could not flush capture store: {store_error}")
+                pending_size = 0
+                deadline = monotonic() + self.flush_interval
+            if item is None:
+                store.close()
+                return
+
+
+class CaptureForwarder(CaptureWriter):
+    """ Capture writer of a worker process.
+
+    Records are pickled onto a ``multiprocessing`` queue read by the
+    supervisor, whose ``CaptureWriter`` owns the capture store; workers
+    never write segment files themselves. ``on_full`` applies to the shared
+    queue like it does to the writer's own queues.
+    """
+
+    def __init__(self, queue: 'ProcessQueue[CaptureEntry | None]', on_full: 'str | None' = None,
+                 level: 'str | None' = None) -> 'None':
+        on_full = request_log['on_full'] if on_full is None else on_full
+        level = request_log['level'] if level is None else level
+        if on_full not in ('drop', 'block'):
+            raise ValueError(f'Unknown capture queue policy {on_full!r}')
+        self.block = on_full == 'block'
+        self.level = getLevelName(level.upper())
+        self.dropped = 0
+        self.written = 0
+        self._lock = Lock()
+        self._queue = queue
+
+    def submit(self, meta: 'dict[str, Any]', request_body: 'bytes', response_body: 'bytes') -> 'None':
+        try:
+            self._queue.put((meta, request_body, response_body), block=self.block)
+        except Full:
+            with self._lock:
+                self.dropped += 1
+        else:
+            with self._lock:
+                self.written += 1
+
+    def close(self) -> 'None':
+        """ Wait until everything submitted was handed to the supervisor. """
+        self._queue.close()
+        self._queue.join_thread()
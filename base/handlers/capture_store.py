@@ -0,0 +1,195 @@
+""" Segmented capture store with a fixed-size sidecar index """
+
+from json import dumps, loads
+from mmap import ACCESS_READ, mmap
+from os import getpid, listdir, path
+from struct import Struct
+from time import strftime, time
+from typing import TYPE_CHECKING, NamedTuple
+from uuid import UUID
+from zlib import crc32
+
+if TYPE_CHECKING:
+    from typing import IO, Any, Iterator
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'CaptureStore',
+    'CaptureReader',
+    'IndexEntry',
+    'host_hash',
+    'segments'
+]
+
+# Record framing in a segment: magic, metadata length, request body length,
+# response body length, followed by the JSON metadata and both bodies.
+RECORD_HEAD = Struct('<4sIII')
+RECORD_MAGIC = b'PLC1'
+
+# One index entry per record: start time, record offset, record length,
+# crc32 of the host, response status, method code, request id.
+INDEX_ENTRY = Struct('<dQIIHB16s')
+
+METHODS = ('', 'GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'OPTIONS', 'PATCH', 'CONNECT', 'TRACE')
+_METHOD_CODES = {method: code for code, method in enumerate(METHODS)}
+
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+
+
+class IndexEntry(NamedTuple):
+    time: 'float'
+    offset: 'int'
+    length: 'int'
+    host_hash: 'int'
+    status: 'int'
+    method: 'str'
+    request_id: 'UUID'
+
+
+def host_hash(host: 'str') -> 'int':
+    """ Hash of a hostname as stored in the index. """
+    return crc32(host.lower().encode(encoding='utf-8'))
+
+
+def segments(directory: 'str') -> 'list[str]':
+    """ Paths of the segments in ``directory`` without suffix, oldest first. """
+    if not path.isdir(directory):
+        return []
+    return sorted(path.join(directory, name[:-len(SEGMENT_SUFFIX)])
+                  for name in listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+class CaptureStore:
+    """ Appends capture records to rotating segment files.
+
+    Every segment ``<name>.seg`` has a sidecar ``<name>.idx`` of fixed-size
+    ``INDEX_ENTRY`` structs, so a reader can select records by time, host,
+    method, status or request id without parsing the segment. Readers skip
+    index entries pointing past the data flushed so far. Segments are
+    rotated once they reach ``segment_bytes`` or are ``segment_seconds``
+    old. ``name`` keeps the segments of several writers apart.
+    """
+
+    def __init__(self, directory: 'str', segment_bytes: 'int', segment_seconds: 'float',
+                 name: 'str' = '') -> 'None':
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.name = name
+        self._segment: 'IO[bytes] | None' = None
+        self._index: 'IO[bytes] | None' = None
+        self._opened_at = 0.0
+        self._offset = 0
+        self._serial = 0
+
+    def append(self, meta: 'dict[str, Any]', request_body: 'bytes' = b"", response_body: 'bytes' = b"") -> 'None':
+        if self._segment is None or self._offset >= self.segment_bytes or \
+                time() - self._opened_at >= self.segment_seconds:
+            self._rotate()
+
+        encoded: 'bytes' = dumps(meta, separators=(',', ':')).encode(encoding='utf-8')
+        head: 'bytes' = RECORD_HEAD.pack(RECORD_MAGIC, len(encoded), len(request_body), len(response_body))
+        length = len(head) + len(encoded) + len(request_body) + len(response_body)
+
+        self._segment.write(head)  # type:ignore
+        self._segment.write(encoded)  # type:ignore
+        self._segment.write(request_body)  # type:ignore
+        self._segment.write(response_body)  # type:ignore
+        self._index.write(INDEX_ENTRY.pack(  # type:ignore
+            meta.get('time', 0.0), self._offset, length, host_hash(meta.get('host') or ''),
+            meta.get('status') or 0, _METHOD_CODES.get(meta.get('method') or '', 0),
+            UUID(meta['request_id']).bytes))
+        self._offset += length
+
+    def flush(self) -> 'None':
+        if self._segment is not None:
+            self._segment.flush()
+            self._index.flush()  # type:ignore
+
+    def close(self) -> 'None':
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()  # type:ignore
+            self._segment = self._index = None
+
+    def _rotate(self) -> 'None':
+        self.close()
+        self._serial += 1
+        base: 'str' = path.join(self.directory, f"capture-{strftime('%Y%m%d%H%M%S')}-{getpid()}"
+                                                f"{'-' + self.name if self.name else ''}-{self._serial}")
+        self._segment = open(file=base + SEGMENT_SUFFIX, mode='ab')
+        self._index = open(file=base + INDEX_SUFFIX, mode='ab')
+        self._offset = self._segment.tell()
+        self._opened_at = time()
+
+
+class CaptureReader:
+    """ Read access to one segment and its index through ``mmap``.
+
+    Only the pages of the records actually read are loaded. Usable as a
+    context manager.
+    """
+
+    def __init__(self, base: 'str') -> 'None':
+        self.base = base
+        self._segment_file = open(file=base + SEGMENT_SUFFIX, mode='rb')
+        self._index_file = open(file=base + INDEX_SUFFIX, mode='rb')
+        self._segment = self._map(self._segment_file)
+        self._index = self._map(self._index_file)
+
+    def __enter__(self) -> 'CaptureReader':
+        return self
+
+    def __exit__(self, *exc_info: 'Any') -> 'None':
+        self.close()
+
+    def __len__(self) -> 'int':
+        return len(self._index) // INDEX_ENTRY.size
+
+    def entries(self) -> 'Iterator[IndexEntry]':
+        # Entries appended after the segment was mapped, or written only
+        # partially, are ignored
+        usable = len(self) * INDEX_ENTRY.size
+        for position in range(0, usable, INDEX_ENTRY.size):
+            started, offset, length, hashed, status, method, request_id = \
+                INDEX_ENTRY.unpack_from(self._index, position)
+            if offset + length > len(self._segment):
+                break
+            yield IndexEntry(started, offset, length, hashed, status,
+                             METHODS[method] if method < len(METHODS) else '', UUID(bytes=request_id))
+
+    def read(self, entry: 'IndexEntry') -> 'dict[str, Any]':
+        """ Metadata of the record at ``entry`` with its bodies under
+        ``request_body`` and ``response_body``. """
+        magic, meta_length, request_length, response_length = \
+            RECORD_HEAD.unpack_from(self._segment, entry.offset)
+        if magic != RECORD_MAGIC:
+            raise ValueError(f'No capture record at {self.base}{SEGMENT_SUFFIX}:{entry.offset}')
+        start = entry.offset + RECORD_HEAD.size
+        record: 'dict[str, Any]' = loads(self._segment[start:start + meta_length])
+        start += meta_length
+        record['request_body'] = self._segment[start:start + request_length]
+        start += request_length
+        record['response_body'] = self._segment[start:start + response_length]
+        return record
+
+    def close(self) -> 'None':
+        for mapped in (self._segment, self._index):
+            if isinstance(mapped, mmap):
+                mapped.close()
+        self._segment_file.close()
+        self._index_file.close()
+
+    @staticmethod
+    def _map(f: 'IO[bytes]') -> 'Any':
+        # mmap refuses empty files
+        if not path.getsize(f.name):
+            return b""
+        return mmap(f.fileno(), 0, access=ACCESS_READ)
@@ -0,0 +1,168 @@
+""" Keep-alive pool of upstream connections """
+
+from select import select
+from ssl import SSLSocket, SSLWantReadError
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from base import upstream_pool
+
+if TYPE_CHECKING:
+    from asyncio import StreamReader, StreamWriter
+    from socket import socket
+    from typing import Any
+
+    PoolKey = tuple[str, int, bool]
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'UpstreamConnectionPool',
+    'AsyncUpstreamConnectionPool'
+]
+
+
+class UpstreamConnectionPool:
+    """ Bounded pool of idle upstream connections keyed by ``(hostname, port, is_tls)``.
+
+    Connections are handed out most-recently-used first, dropped once they
+    have been idle longer than ``idle_timeout`` and health checked before
+    reuse. At most ``max_idle_per_host`` connections are kept per key and
+    ``max_idle`` overall; the oldest idle connection is evicted first.
+    """
+
+    def __init__(self, max_idle_per_host: 'int | None' = None, max_idle: 'int | None' = None,
+                 idle_timeout: 'float | None' = None) -> 'None':
+        self.max_idle_per_host: 'int' = upstream_pool['max_idle_per_host'] if max_idle_per_host is None \
+            else max_idle_per_host
+        self.max_idle: 'int' = upstream_pool['max_idle'] if max_idle is None else max_idle
+        self.idle_timeout: 'float' = upstream_pool['idle_timeout'] if idle_timeout is None else idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._idle: 'dict[PoolKey, list[tuple[float, Any]]]' = {}
+        self._idle_count = 0
+
+    def acquire(self, key: 'PoolKey') -> 'Any | None':
+        """ Return a live idle connection for ``key`` or ``None``. """
+        while True:
+            stale: 'list[Any]' = []
+            conn: 'Any | None' = None
+            with self._lock:
+                stack = self._idle.get(key)
+                now = monotonic()
+                while stack:
+                    released_at, candidate = stack.pop()
+                    self._idle_count -= 1
+                    if now - released_at <= self.idle_timeout:
+                        conn = candidate
+                        break
+                    stale.append(candidate)
+                if stack is not None and not stack:
+                    del self._idle[key]
+                if conn is None:
+                    self.misses += 1
+
+            for candidate in stale:
+                self._close(candidate)
+            if conn is None:
+                return None
+            if self._is_alive(conn):
+                with self._lock:
+                    self.hits += 1
+                return conn
+            self._close(conn)
+
+    def release(self, key: 'PoolKey', conn: 'Any') -> 'None':
+        """ Hand a connection whose last response permitted keep-alive back to the pool. """
+        evicted: 'list[Any]' = []
+        with self._lock:
+            now = monotonic()
+            evicted.extend(self._prune(now))
+
+            stack = self._idle.setdefault(key, [])
+            stack.append((now, conn))
+            self._idle_count += 1
+
+            if len(stack) > self.max_idle_per_host:
+                evicted.append(stack.pop(0)[1])
+                self._idle_count -= 1
+
+            while self._idle_count > self.max_idle:
+                oldest: 'PoolKey' = min(self._idle, key=lambda k: self._idle[k][0][0])
+                evicted.append(self._idle[oldest].pop(0)[1])
+                self._idle_count -= 1
+                if not self._idle[oldest]:
+                    del self._idle[oldest]
+
+        for conn in evicted:
+            self._close(conn)
+
+    def discard(self, conn: 'Any') -> 'None':
+        """ Close a connection that must not be reused. """
+        self._close(conn)
+
+    def clear(self) -> 'None':
+        with self._lock:
+            idle = [conn for stack in self._idle.values() for _, conn in stack]
+            self._idle.clear()
+            self._idle_count = 0
+        for conn in idle:
+            self._close(conn)
+
+    def _prune(self, now: 'float') -> 'list[Any]':
+        # Stacks are ordered oldest first, stop at the first fresh entry
+        expired: 'list[Any]' = []
+        for key in list(self._idle):
+            stack = self._idle[key]
+            while stack and now - stack[0][0] > self.idle_timeout:
+                expired.append(stack.pop(0)[1])
+                self._idle_count -= 1
+            if not stack:
+                del self._idle[key]
+        return expired
+
+    def _is_alive(self, conn: 'socket') -> 'bool':
+        # An idle keep-alive socket must not be readable: readability means
+        # the peer closed it or sent unsolicited data.
+        try:
+            readable, _, _ = select([conn], [], [], 0)
+            if not readable:
+                return True
+            if isinstance(conn, SSLSocket):
+                # TLS 1.3 session tickets may arrive after the handshake,
+                # consuming them without application data is fine.
+                timeout = conn.gettimeout()
+                conn.setblocking(False)
+                try:
+                    conn.recv(1)
+                except SSLWantReadError:
+                    return True
+                finally:
+                    conn.settimeout(timeout)
+            return False
+        except (OSError, ValueError):
+            return False
+
+    def _close(self, conn: 'socket') -> 'None':
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+
+class AsyncUpstreamConnectionPool(UpstreamConnectionPool):
+    """ Pool of ``(StreamReader, StreamWriter)`` pairs for the asyncio engine. """
+
+    def _is_alive(self, conn: 'tuple[StreamReader, StreamWriter]') -> 'bool':  # type:ignore
+        reader, writer = conn
+        return not writer.is_closing() and not reader.at_eof() and not reader._buffer  # type:ignore
+
+    def _close(self, conn: 'tuple[StreamReader, StreamWriter]') -> 'None':  # type:ignore
+        conn[1].close()
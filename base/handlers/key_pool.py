@@ -0,0 +1,97 @@
+""" Pre-generated private keys for leaf certificates """
+
+from collections import deque
+from threading import Event, Lock, Thread
+
+from cryptography.hazmat.primitives.asymmetric import ec
+from OpenSSL.crypto import TYPE_RSA, PKey
+
+from base import ssl_leaf_key
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'KeyPool'
+]
+
+
+class KeyPool:
+    """ Pool of leaf private keys kept ready by a background thread.
+
+    Taking a key never waits for the generator unless the pool ran dry; the
+    thread refills it to ``size`` keys whenever fewer than ``watermark`` are
+    left. With ``reuse_key`` every caller gets the same keypair instead.
+    """
+
+    def __init__(self, key_type: 'str | None' = None, key_size: 'int | None' = None, curve: 'str | None' = None,
+                 size: 'int | None' = None, watermark: 'int | None' = None,
+                 reuse_key: 'bool | None' = None) -> 'None':
+        key_type = ssl_leaf_key['key_type'] if key_type is None else key_type
+        key_size = ssl_leaf_key['key_size'] if key_size is None else key_size
+        curve = ssl_leaf_key['curve'] if curve is None else curve
+        size = ssl_leaf_key['pool_size'] if size is None else size
+        watermark = ssl_leaf_key['refill_watermark'] if watermark is None else watermark
+        reuse_key = ssl_leaf_key['reuse_key'] if reuse_key is None else reuse_key
+        if key_type not in ('rsa', 'ec'):
+            raise ValueError(f'Unsupported leaf key type {key_type!r}')
+        self.key_type = key_type
+        self.key_size = key_size
+        self.curve: 'ec.EllipticCurve' = getattr(ec, curve.upper())()
+        self.size = size
+        self.watermark = watermark
+        self.reuse_key = reuse_key
+
+        self._keys: 'deque[PKey]' = deque()
+        self._lock = Lock()
+        self._shared_key: 'PKey | None' = None
+        self._refill = Event()
+        self._closed = False
+        self._thread: 'Thread | None' = None
+
+        if not reuse_key and size > 0:
+            self._thread = Thread(target=self._run, name='pylogproxy-keypool', daemon=True)
+            self._thread.start()
+            self._refill.set()
+
+    def take(self) -> 'PKey':
+        if self.reuse_key:
+            with self._lock:
+                if self._shared_key is None:
+                    self._shared_key = self.generate()
+                return self._shared_key
+
+        with self._lock:
+            key: 'PKey | None' = self._keys.popleft() if self._keys else None
+            if len(self._keys) < self.watermark:
+                self._refill.set()
+        return key if key is not None else self.generate()
+
+    def generate(self) -> 'PKey':
+        if self.key_type == 'ec':
+            return PKey.from_cryptography_key(ec.generate_private_key(curve=self.curve))
+        key = PKey()
+        key.generate_key(type=TYPE_RSA, bits=self.key_size)
+        return key
+
+    def close(self) -> 'None':
+        self._closed = True
+        self._refill.set()
+
+    def __len__(self) -> 'int':
+        return len(self._keys)
+
+    def _run(self) -> 'None':
+        while True:
+            self._refill.wait()
+            self._refill.clear()
+            while not self._closed and len(self._keys) < self.size:
+                key = self.generate()
+                with self._lock:
+                    self._keys.append(key)
+            if self._closed:
+                return
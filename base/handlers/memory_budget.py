@@ -0,0 +1,161 @@
+""" Process-wide budget for message body bytes held in memory """
+
+from asyncio import AbstractEventLoop, Future, get_running_loop
+from asyncio import wait_for as async_wait_for
+from contextlib import asynccontextmanager, contextmanager
+from threading import Condition
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from base import memory
+
+if TYPE_CHECKING:
+    from typing import AsyncIterator, Iterator
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'MemoryBudget'
+]
+
+
+def _wake(waiter: 'Future') -> 'None':
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class MemoryBudget:
+    """ Bytes of message bodies in flight across the connections of a server.
+
+    Relays ``hold`` every chunk from before it is read until it has been
+    forwarded; once ``limit`` bytes are held they wait, which stops reading
+    from the sockets involved. A relay waits at most ``max_wait`` seconds and
+    then goes ahead anyway: exchanges holding buffered bodies while relaying
+    another one can not stall each other for good. Buffered bodies are
+    ``reserve``d without waiting, the handlers buffer a body only while it
+    ``fits``. A budget with no limit is falsy and never waits.
+    """
+
+    def __init__(self, limit: 'int | None' = None, max_wait: 'float | None' = None) -> 'None':
+        self.limit: 'int' = memory['budget'] if limit is None else limit
+        self.max_wait: 'float' = memory['max_wait'] if max_wait is None else max_wait
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        self.overcommits = 0
+        self.spills = 0
+        self._condition = Condition()
+        self._waiters: 'list[tuple[AbstractEventLoop, Future]]' = []
+
+    def __bool__(self) -> 'bool':
+        return self.limit > 0
+
+    def available(self) -> 'int':
+        return max(0, self.limit - self.used)
+
+    def fits(self, size: 'int') -> 'bool':
+        """ Whether ``size`` more bytes stay within the limit. """
+        return not self.limit or self.used + size <= self.limit
+
+    def _grant(self, size: 'int') -> 'bool':
+        # Called with the condition held; the first holder always gets through
+        if self.used and self.used + size > self.limit:
+            return False
+        self._take(size=size)
+        return True
+
+    def _take(self, size: 'int') -> 'None':
+        self.used += size
+        if self.used > self.peak:
+            self.peak = self.used
+
+    def reserve(self, size: 'int') -> 'None':
+        """ Count ``size`` bytes as held, whether they fit or not. """
+        if not self.limit:
+            return
+        with self._condition:
+            self._take(size=size)
+
+    def try_reserve(self, size: 'int') -> 'bool':
+        """ Hold ``size`` bytes if they fit. """
+        if not self.limit:
+            return True
+        with self._condition:
+            return self._grant(size=size)
+
+    def wait(self, size: 'int') -> 'None':
+        """ Hold ``size`` bytes, blocking while the budget is used up. """
+        if not self.limit:
+            return
+        with self._condition:
+            if self._grant(size=size):
+                return
+            self.waits += 1
+            deadline: 'float' = monotonic() + self.max_wait
+            while not self._grant(size=size):
+                remaining: 'float' = deadline - monotonic()
+                if remaining <= 0:
+                    self.overcommits += 1
+                    self._take(size=size)
+                    return
+                self._condition.wait(timeout=remaining)
+
+    async def wait_async(self, size: 'int') -> 'None':
+        """ ``wait`` on the event loop. """
+        if not self.limit:
+            return
+        loop: 'AbstractEventLoop' = get_running_loop()
+        deadline: 'float' = monotonic() + self.max_wait
+        waited: 'bool' = False
+        while True:
+            with self._condition:
+                if self._grant(size=size):
+                    return
+                remaining: 'float' = deadline - monotonic()
+                if remaining <= 0:
+                    self.overcommits += 1
+                    self._take(size=size)
+                    return
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                waiter: 'Future' = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await async_wait_for(waiter, timeout=remaining)
+            except TimeoutError:
+                pass
+
+    def release(self, size: 'int') -> 'None':
+        if not self.limit:
+            return
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_wake, waiter)
+
+    @contextmanager
+    def hold(self, size: 'int') -> 'Iterator[None]':
+        """ ``wait`` for ``size`` bytes, released when the block is left. """
+        self.wait(size=size)
+        try:
+            yield
+        finally:
+            self.release(size=size)
+
+    @asynccontextmanager
+    async def hold_async(self, size: 'int') -> 'AsyncIterator[None]':
+        """ ``hold`` on the event loop. """
+        await self.wait_async(size=size)
+        try:
+            yield
+        finally:
+            self.release(size=size)
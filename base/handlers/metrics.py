@@ -0,0 +1,138 @@
+""" Counters, gauges and latency histograms in Prometheus text format """
+
+from bisect import bisect_left
+from threading import Lock
+from typing import TYPE_CHECKING
+
+from base import metrics
+
+if TYPE_CHECKING:
+    from typing import Callable, Iterable
+
+    Labels = tuple[tuple[str, str], ...]
+    # (name, type, labels, value), labels as the keyword arguments of inc()
+    Sample = tuple[str, str, dict[str, str], float]
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'Metrics'
+]
+
+
+def _format_labels(labels: 'Labels', extra: 'str' = '') -> 'str':
+    pairs: 'list[str]' = ['%s="%s"' % (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                          for name, value in labels]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+class _Histogram:
+    """ Observations counted into fixed buckets, cumulated when rendered. """
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, size: 'int') -> 'None':
+        # One slot per bucket plus +Inf
+        self.counts: 'list[int]' = [0] * (size + 1)
+        self.total = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """ Registry of the proxy's counters, gauges and histograms.
+
+    A disabled registry is falsy; instrumented code checks it before taking
+    a timestamp, so disabled metrics cost one truth test per phase. Metric
+    names get the ``pylogproxy_`` prefix when rendered. Values that other
+    components count anyway, such as cache hits, are read at render time by
+    collectors registered with ``collect`` instead of being counted twice.
+    """
+
+    prefix = 'pylogproxy_'
+
+    def __init__(self, enabled: 'bool | None' = None, buckets: 'Iterable[float] | None' = None) -> 'None':
+        self.enabled: 'bool' = metrics['enabled'] if enabled is None else enabled
+        self.buckets: 'tuple[float, ...]' = tuple(sorted(metrics['buckets'] if buckets is None else buckets))
+        self._lock = Lock()
+        self._types: 'dict[str, str]' = {}
+        self._values: 'dict[str, dict[Labels, float]]' = {}
+        self._histograms: 'dict[str, dict[Labels, _Histogram]]' = {}
+        self._collectors: 'list[Callable[[], Iterable[Sample]]]' = []
+
+    def __bool__(self) -> 'bool':
+        return self.enabled
+
+    def inc(self, name: 'str', value: 'float' = 1, **labels: 'str') -> 'None':
+        """ Add ``value`` to a counter. """
+        self._add(name=name, kind='counter', value=value, labels=labels)
+
+    def gauge(self, name: 'str', value: 'float', **labels: 'str') -> 'None':
+        """ Move a gauge by ``value``, which may be negative. """
+        self._add(name=name, kind='gauge', value=value, labels=labels)
+
+    def observe(self, name: 'str', seconds: 'float', **labels: 'str') -> 'None':
+        """ Record a duration in histogram ``name``. """
+        key: 'Labels' = tuple(sorted(labels.items()))
+        index: 'int' = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._types.setdefault(name, 'histogram')
+            series: 'dict[Labels, _Histogram]' = self._histograms.setdefault(name, {})
+            histogram: '_Histogram | None' = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(size=len(self.buckets))
+            histogram.counts[index] += 1
+            histogram.total += seconds
+            histogram.count += 1
+
+    def collect(self, collector: 'Callable[[], Iterable[Sample]]') -> 'None':
+        """ Register a callable yielding ``(name, type, labels, value)`` samples at render time. """
+        self._collectors.append(collector)
+
+    def render(self) -> 'str':
+        """ All metrics in the Prometheus text exposition format. """
+        lines: 'list[str]' = []
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+            histograms = {name: {labels: (list(h.counts), h.total, h.count) for labels, h in series.items()}
+                          for name, series in self._histograms.items()}
+            types = dict(self._types)
+
+        collected: 'dict[str, dict[Labels, float]]' = {}
+        for collector in self._collectors:
+            for name, kind, sample_labels, value in collector():
+                types.setdefault(name, kind)
+                collected.setdefault(name, {})[tuple(sorted(sample_labels.items()))] = value
+        for name, series in collected.items():
+            values.setdefault(name, {}).update(series)
+
+        for name in sorted(types):
+            metric: 'str' = self.prefix + name
+            lines.append(f'# TYPE {metric} {types[name]}')
+            if name in histograms:
+                for labels, (counts, total, count) in histograms[name].items():
+                    cumulative: 'int' = 0
+                    for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                        cumulative += bucket_count
+                        le: 'str' = 'le="%s"' % ('+Inf' if bound == float('inf') else repr(float(bound)))
+                        lines.append(f'{metric}_bucket{_format_labels(labels, le)} {cumulative}')
+                    lines.append(f'{metric}_sum{_format_labels(labels)} {total!r}')
+                    lines.append(f'{metric}_count{_format_labels(labels)} {count}')
+            else:
+                for labels, value in values.get(name, {}).items():
+                    lines.append(f'{metric}{_format_labels(labels)} {value!r}')
+        lines.append('')
+        return '\n'.join(lines)
+
+    def _add(self, name: 'str', kind: 'str', value: 'float', labels: 'dict[str, str]') -> 'None':
+        key: 'Labels' = tuple(sorted(labels.items()))
+        with self._lock:
+            self._types.setdefault(name, kind)
+            series: 'dict[Labels, float]' = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
@@ -0,0 +1,301 @@
+""" Blind tunnels for CONNECT targets that are not intercepted """
+
+from asyncio import gather, wait_for
+from errno import EINVAL
+from ipaddress import IPv4Address, IPv6Address, ip_address, ip_network
+from os import close as os_close
+from os import pipe
+from selectors import EVENT_READ, DefaultSelector
+from socket import SHUT_WR, getaddrinfo
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from base import app, passthrough
+
+try:
+    from os import SPLICE_F_MOVE, SPLICE_F_NONBLOCK, splice
+except ImportError:  # os.splice is Linux only
+    splice = None  # type:ignore
+
+if TYPE_CHECKING:
+    from asyncio import StreamReader, StreamWriter
+    from ipaddress import IPv4Network, IPv6Network
+    from socket import socket
+    from typing import Iterable
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'BypassList',
+    'TunnelStats',
+    'pump',
+    'pump_streams'
+]
+
+
+def _split_port(entry: 'str') -> 'tuple[str, int | None]':
+    """ ``host``, ``host:port`` or ``[v6]:port``; a bare IPv6 address or network has no port. """
+    if entry.startswith('['):
+        host, _, port = entry[1:].partition(']')
+        return host, int(port[1:]) if port else None
+    if entry.count(':') == 1:
+        host, _, port = entry.partition(':')
+        return host, int(port)
+    return entry, None
+
+
+class BypassList:
+    """ CONNECT targets relayed as raw bytes instead of being intercepted.
+
+    An entry is an exact hostname, ``*.domain`` (or ``.domain``) for every
+    subdomain, an IP address or a CIDR network, optionally followed by
+    ``:port``. Networks match IP literal targets as well as the addresses a
+    hostname resolves to; names are only resolved when networks are
+    configured. Decisions are remembered for up to ``cache_size`` targets.
+    """
+
+    def __init__(self, entries: 'Iterable[str] | None' = None, cache_size: 'int | None' = None) -> 'None':
+        entries = passthrough['hosts'] if entries is None else entries
+        self.cache_size: 'int' = passthrough['cache_size'] if cache_size is None else cache_size
+        self._exact: 'dict[str, set[int | None]]' = {}
+        self._suffixes: 'list[tuple[str, int | None]]' = []
+        self._networks: 'list[tuple[IPv4Network | IPv6Network, int | None]]' = []
+        self._decisions: 'dict[tuple[str, int], bool]' = {}
+        self._lock = Lock()
+        for entry in entries:
+            self.add(entry=entry)
+
+    def __bool__(self) -> 'bool':
+        return bool(self._exact or self._suffixes or self._networks)
+
+    def add(self, entry: 'str') -> 'None':
+        host, port = _split_port(entry=entry.strip().lower())
+        if host.startswith(('*.', '.')):
+            self._suffixes.append(('.' + host.lstrip('*.'), port))
+        elif '/' in host:
+            self._networks.append((ip_network(host, strict=False), port))
+        else:
+            self._exact.setdefault(host, set()).add(port)
+        with self._lock:
+            self._decisions.clear()
+
+    def lookup(self, host: 'str', port: 'int') -> 'bool | None':
+        """ Decision for a target, ``None`` if it depends on the addresses
+        ``host`` resolves to; pass those to ``decide``. """
+        key: 'tuple[str, int]' = (host.lower(), port)
+        decision: 'bool | None' = self._decisions.get(key)
+        if decision is not None:
+            return decision
+        if self._match_name(host=key[0], port=port):
+            return self._remember(key=key, decision=True)
+        if not self._networks:
+            return self._remember(key=key, decision=False)
+        try:
+            return self._remember(key=key, decision=self._match_address(address=key[0], port=port))
+        except ValueError:
+            # A hostname
+            return None
+
+    def decide(self, host: 'str', port: 'int', addresses: 'Iterable[str]') -> 'bool':
+        matched: 'bool' = False
+        for address in addresses:
+            try:
+                if self._match_address(address=address, port=port):
+                    matched = True
+                    break
+            except ValueError:
+                continue
+        return self._remember(key=(host.lower(), port), decision=matched)
+
+    def matches(self, host: 'str', port: 'int') -> 'bool':
+        """ Whether a CONNECT to ``host:port`` bypasses interception, resolving the name if needed. """
+        decision: 'bool | None' = self.lookup(host=host, port=port)
+        if decision is not None:
+            return decision
+        try:
+            addresses: 'list[str]' = [str(info[4][0]) for info in getaddrinfo(host, port)]
+        except OSError:
+            addresses = []
+        return self.decide(host=host, port=port, addresses=addresses)
+
+    def _match_name(self, host: 'str', port: 'int') -> 'bool':
+        ports: 'set[int | None] | None' = self._exact.get(host)
+        if ports is not None and (None in ports or port in ports):
+            return True
+        return any(host.endswith(suffix) and (wanted is None or wanted == port)
+                   for suffix, wanted in self._suffixes)
+
+    def _match_address(self, address: 'str', port: 'int') -> 'bool':
+        ip: 'IPv4Address | IPv6Address' = ip_address(address.split('%', 1)[0])
+        return any(ip in network and (wanted is None or wanted == port) for network, wanted in self._networks)
+
+    def _remember(self, key: 'tuple[str, int]', decision: 'bool') -> 'bool':
+        with self._lock:
+            if len(self._decisions) >= self.cache_size:
+                self._decisions.clear()
+            self._decisions[key] = decision
+        return decision
+
+
+class TunnelStats:
+    """ Totals over the blind tunnels of a server. """
+
+    def __init__(self) -> 'None':
+        self.tunnels = 0
+        self.active = 0
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.seconds = 0.0
+        self._lock = Lock()
+
+    def opened(self) -> 'None':
+        with self._lock:
+            self.tunnels += 1
+            self.active += 1
+
+    def closed(self, bytes_up: 'int', bytes_down: 'int', seconds: 'float') -> 'None':
+        with self._lock:
+            self.active -= 1
+            self.bytes_up += bytes_up
+            self.bytes_down += bytes_down
+            self.seconds += seconds
+
+
+class _Direction:
+    """ One half of a tunnel, moving bytes from ``src`` to ``dst``. """
+
+    __slots__ = ('src', 'dst', 'count', 'pipe')
+
+    def __init__(self, src: 'socket', dst: 'socket') -> 'None':
+        self.src = src
+        self.dst = dst
+        self.count = 0
+        self.pipe: 'tuple[int, int] | None' = pipe() if splice is not None else None
+
+    def transfer(self, buffer: 'memoryview') -> 'bool':
+        """ Move what is available, ``False`` once ``src`` reached end of stream. """
+        if self.pipe is not None:
+            return self._splice(buffer=buffer)
+        size: 'int' = self.src.recv_into(buffer)
+        if not size:
+            return False
+        self.dst.sendall(buffer[:size])
+        self.count += size
+        return True
+
+    def _splice(self, buffer: 'memoryview') -> 'bool':
+        read_end, write_end = self.pipe  # type:ignore
+        try:
+            pending: 'int' = splice(self.src.fileno(), write_end, len(buffer),  # type:ignore
+                                    flags=SPLICE_F_MOVE | SPLICE_F_NONBLOCK)  # type:ignore
+        except BlockingIOError:
+            return True
+        except OSError as e:
+            if e.errno != EINVAL:
+                raise
+            # Not every socket type supports splice, copy from here on
+            self.close()
+            return self.transfer(buffer=buffer)
+        if not pending:
+            return False
+        self.count += pending
+        while pending:
+            pending -= splice(read_end, self.dst.fileno(), pending, flags=SPLICE_F_MOVE)  # type:ignore
+        return True
+
+    def close(self) -> 'None':
+        if self.pipe is not None:
+            for fd in self.pipe:
+                os_close(fd)
+            self.pipe = None
+
+
+def pump(client: 'socket', upstream: 'socket', buffer_size: 'int | None' = None,
+         idle_timeout: 'float | None' = None) -> 'tuple[int, int]':
+    """ Relay bytes both ways until both sides finished or the tunnel was
+    idle for ``idle_timeout`` seconds; returns the bytes sent up and down.
+
+    Both sockets are watched by one selector. On Linux the payload moves
+    through a pipe with ``os.splice`` and never enters Python; elsewhere
+    it is copied through a reused buffer. End of stream on one side is
+    passed on as a write shutdown to the other.
+    """
+    buffer_size = passthrough['buffer_size'] if buffer_size is None else buffer_size
+    idle_timeout = app['idle_timeout'] if idle_timeout is None else idle_timeout
+    client.setblocking(True)
+    upstream.setblocking(True)
+    up = _Direction(src=client, dst=upstream)
+    down = _Direction(src=upstream, dst=client)
+    buffer = memoryview(bytearray(buffer_size))
+    selector = DefaultSelector()
+    try:
+        selector.register(client, EVENT_READ, up)
+        selector.register(upstream, EVENT_READ, down)
+        open_directions: 'int' = 2
+        while open_directions:
+            events = selector.select(timeout=idle_timeout)
+            if not events:
+                break
+            for key, _ in events:
+                direction: '_Direction' = key.data
+                if not direction.transfer(buffer=buffer):
+                    selector.unregister(direction.src)
+                    try:
+                        direction.dst.shutdown(SHUT_WR)
+                    except OSError:
+                        pass
+                    open_directions -= 1
+    except OSError:
+        # Either side reset the connection
+        pass
+    finally:
+        selector.close()
+        up.close()
+        down.close()
+    return up.count, down.count
+
+
+async def _copy(reader: 'StreamReader', writer: 'StreamWriter', buffer_size: 'int',
+                idle_timeout: 'float', counter: 'list[int]', activity: 'list[float]') -> 'None':
+    # activity holds the time either direction last moved data, a tunnel
+    # busy one way is not idle the other way
+    try:
+        while True:
+            remaining: 'float' = activity[0] + idle_timeout - monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            try:
+                chunk: 'bytes' = await wait_for(reader.read(buffer_size), timeout=remaining)
+            except TimeoutError:
+                continue
+            if not chunk:
+                break
+            writer.write(chunk)
+            counter[0] += len(chunk)
+            await writer.drain()
+            activity[0] = monotonic()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (OSError, TimeoutError):
+        writer.close()
+
+
+async def pump_streams(client: 'tuple[StreamReader, StreamWriter]', upstream: 'tuple[StreamReader, StreamWriter]',
+                       buffer_size: 'int | None' = None, idle_timeout: 'float | None' = None) -> 'tuple[int, int]':
+    """ ``pump`` for the asyncio engine, both directions run on the event loop. """
+    buffer_size = passthrough['buffer_size'] if buffer_size is None else buffer_size
+    idle_timeout = app['idle_timeout'] if idle_timeout is None else idle_timeout
+    up: 'list[int]' = [0]
+    down: 'list[int]' = [0]
+    activity: 'list[float]' = [monotonic()]
+    await gather(_copy(reader=client[0], writer=upstream[1], buffer_size=buffer_size,
+                       idle_timeout=idle_timeout, counter=up, activity=activity),
+                 _copy(reader=upstream[0], writer=client[1], buffer_size=buffer_size,
+                       idle_timeout=idle_timeout, counter=down, activity=activity))
+    return up[0], down[0]
@@ -1,26 +1,34 @@
 """ Base module for proxy handler """
 
-from http.client import HTTPResponse
+from http.client import HTTPException, HTTPResponse
 from http.server import BaseHTTPRequestHandler
-from logging import FileHandler, getLogger
-from os import makedirs
-from socket import create_connection
-from ssl import CERT_OPTIONAL, Purpose, create_default_context
+from re import compile as re_compile
+from socket import socket
+from ssl import SSLSocket
+from time import monotonic, time
 from typing import TYPE_CHECKING
 from urllib.parse import ParseResult, urlparse, urlunparse
 from uuid import uuid4
 
 import certifi
 
-from base import logger, request_log
+from base import app, logger, stream
+
+from .body_capture import BodyCapture
+from .passthrough import pump
 
 if TYPE_CHECKING:
-    from logging import Logger
-    from socket import socket
-    from typing import Any
+    from ssl import SSLContext
+    from typing import Any, Iterable, Iterator
 
     from server.proxy_server import BaseProxyServer
 
+    from .capture import CaptureRecord
+    from .connection_pool import PoolKey
+    from .memory_budget import MemoryBudget
+    from .metrics import Metrics
+    from .response_cache import CachedResponse, ResponseCache
+
 __author__ = 'Rushirajsinh Chudasama'
 __copyright__ = 'Copyright 2025, PyLogProxy Project'
 __credits__ = ['Rushirajsinh Chudasama']
@@ -33,6 +41,63 @@ __all__ = [
 ]
 
 
+def _del_header(headers: 'dict[str,str]', name: 'str') -> 'None':
+    for header in [header for header in headers if header.lower() == name.lower()]:
+        del headers[header]
+
+
+# Hex digits of a chunk size, enough for any size a 64 bit length can hold
+_CHUNK_SIZE = re_compile(rb'[0-9A-Fa-f]{1,16}')
+
+
+def _content_length(value: 'str') -> 'int':
+    """ A ``Content-Length`` value, ``ValueError`` unless it is a plain decimal. """
+    value = value.strip()
+    if not (value.isascii() and value.isdigit()):
+        raise ValueError(f'Invalid Content-Length {value[:32]!r}')
+    return int(value)
+
+
+def _chunk_size(line: 'bytes') -> 'int':
+    """ Size announced by a chunk size line, extensions ignored. """
+    size: 'bytes' = line.split(b';', 1)[0].strip()
+    if not _CHUNK_SIZE.fullmatch(size):
+        raise ValueError(f'Invalid chunk size line {line[:32]!r}')
+    return int(size, 16)
+
+
+# Requests that may be sent again when their connection fails (RFC 9110 section 9.2.2)
+_IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT', 'DELETE'))
+
+# TLS records hold at most 16 KiB, a smaller message is joined into one
+_TLS_RECORD_SIZE = 16384
+
+
+def _send_buffers(sock: 'socket', buffers: 'Iterable[bytes]') -> 'None':
+    """ Send ``buffers`` back to back without joining them.
+
+    Plain sockets take them in one vectored ``sendmsg`` call, resuming
+    after partial writes on memoryviews of the remaining data. ``SSLSocket``
+    has no ``sendmsg``; there only messages fitting a single TLS record are
+    joined, larger buffers are sent one by one.
+    """
+    views: 'list[memoryview]' = [memoryview(buffer) for buffer in buffers if buffer]
+    if isinstance(sock, SSLSocket) or not hasattr(sock, 'sendmsg'):
+        if len(views) > 1 and sum(view.nbytes for view in views) <= _TLS_RECORD_SIZE:
+            views = [memoryview(b"".join(views))]
+        for view in views:
+            sock.sendall(view)
+        return
+    while views:
+        sent: 'int' = sock.sendmsg(views)
+        while sent:
+            if sent >= views[0].nbytes:
+                sent -= views.pop(0).nbytes
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+
 class UnsupportedSchemeException(Exception):
     """ Exception for un supported http scheme. """
     pass
@@ -42,11 +107,26 @@ class ProxyRequestHandler(BaseHTTPRequestHandler):
     """ Base class for handling proxy connection """
 
     ca_file = certifi.where()
+    # Needed for parse_request to honour keep-alive of HTTP/1.1 clients,
+    # servers without ``keep_alive`` close every connection after one request
+    protocol_version = 'HTTP/1.1'
+    # Seconds a keep-alive client may stay silent between requests, app.idle_timeout if None
+    timeout: 'float | None' = None
 
     def __init__(self, request: 'socket | tuple[bytes, socket]',
                  client_address: 'tuple[str, int] | str',
                  server: 'BaseProxyServer') -> 'None':
 
+        self.server = server  # type:ignore
+        self._init_request_state()
+
+        BaseHTTPRequestHandler.__init__(self, request, client_address, server)
+
+        self.server: 'BaseProxyServer'  # type:ignore
+
+    def _init_request_state(self) -> 'None':
+        if self.timeout is None:
+            self.timeout = app['idle_timeout']
         self.is_connect = False
         self.hostname = ""
         self.port = 8000
@@ -54,26 +134,39 @@ class ProxyRequestHandler(BaseHTTPRequestHandler):
         self.ssl_host = ""
         self._headers_buffer = []
         self.san: 'list[tuple[str,str]]' = []
-        self.request_id = uuid4()
-        self.logger: 'Logger' = getLogger(str(self.request_id))
-
-        makedirs(name=request_log['dir'], exist_ok=True)
-
-        self.logger.handlers.clear()
-        self.logger.setLevel(request_log['level'].upper())
-
-        # Create a file handler to log messages to a file
-        file_handler = FileHandler(f'{request_log['dir']}/{self.request_id}.log')
-
-        # Add handlers to the logger
-        self.logger.addHandler(file_handler)
-
-        BaseHTTPRequestHandler.__init__(self, request, client_address, server)
-
-        self.server: 'BaseProxyServer'  # type:ignore
-        self._proxy_sock: 'socket'
+        self._proxy_sock: 'socket | None' = None
+        self._proxy_idle = False
+        self._budget_held = 0
+        # Response body and its decoding, shared by the interceptors of an exchange
+        self.http_response_body_decoded: 'tuple[bytes, tuple[bool, bytes, str, str]] | None' = None
+        # Decoder of a streamed response with the last chunk fed, where its
+        # plaintext starts and the plaintext itself
+        self.http_response_chunk_decoded: 'tuple[Any, bytes, int, bytes] | None' = None
+        # Every exchange on the connection gets an id of its own in do_COMMAND
+        self.connection_id = uuid4()
+        self.request_id = self.connection_id
+        # Stored in the segments under request_log.dir by the server's capture writer
+        self.logger: 'CaptureRecord' = self.server.capture.open(connection_id=self.connection_id)
+
+    def parse_request(self) -> 'bool':
+        parsed: 'bool' = BaseHTTPRequestHandler.parse_request(self)
+        if not self.server.keep_alive:
+            self.close_connection = True
+        return parsed
+
+    def handle(self) -> 'None':
+        metrics: 'Metrics' = self.server.metrics
+        if not metrics:
+            BaseHTTPRequestHandler.handle(self)
+            return
+        metrics.inc('connections_total')
+        metrics.gauge('connections_active', 1)
+        try:
+            BaseHTTPRequestHandler.handle(self)
+        finally:
+            metrics.gauge('connections_active', -1)
 
-    def _connect_to_host(self) -> 'None':
+    def _parse_target(self) -> 'None':
         # Get hostname and port to connect to
         if self.is_connect:
             self.hostname, self.port = self.path.split(sep=':')
@@ -94,33 +187,163 @@ class ProxyRequestHandler(BaseHTTPRequestHandler):
                     fragment=u.fragment
                 )
             )
-        # Connect to destination
-        self._proxy_sock = create_connection((self.hostname, int(self.port)))
 
-        # Wrap socket if SSL is required
+    def _connect_to_host(self) -> 'None':
+        self._parse_target()
+        self._connect_to_target()
+
+    def _connect_to_target(self) -> 'None':
+        self._proxy_key: 'PoolKey' = (self.hostname, int(self.port), self.is_connect)
+        self._acquire_upstream()
+
         if self.is_connect:
-            context = create_default_context(cafile=self.ca_file)
-            self._proxy_sock = context.wrap_socket(
-                sock=self._proxy_sock, server_hostname=self.hostname)
-            cert = self._proxy_sock.getpeercert()
+            cert = self._proxy_sock.getpeercert()  # type:ignore
             if cert:
                 self.san = cert.get('subjectAltName', [
                     ('DNS', self.hostname)])  # type:ignore
 
+    def _acquire_upstream(self) -> 'None':
+        # Reuse an idle keep-alive connection to the destination if possible
+        pooled: 'socket | None' = self.server.upstream_pool.acquire(key=self._proxy_key)
+        self._proxy_reused = pooled is not None
+        self._proxy_sock = pooled if pooled is not None else self._open_upstream()
+
+    def _release_upstream(self, reusable: 'bool') -> 'None':
+        if reusable:
+            self.server.upstream_pool.release(key=self._proxy_key, conn=self._proxy_sock)
+        else:
+            self.server.upstream_pool.discard(conn=self._proxy_sock)
+        self._proxy_sock = None
+        self._proxy_idle = False
+
+    def _abort_exchange(self, code: 'int', error: 'Exception') -> 'None':
+        """ Answer ``code`` to a message whose framing could not be parsed;
+        neither connection is left in a state to be reused. """
+        if self._proxy_sock is not None:
+            self._release_upstream(reusable=False)
+        self._release_budget()
+        self.close_connection = True
+        self.send_error(code=code, message=str(error))
+
+    def _request_closes_upstream(self) -> 'bool':
+        # The origin drops the connection after answering a request that
+        # asked it to, whether or not its response says so
+        return any(header.lower() == 'connection' and 'close' in value.lower()
+                   for header, value in self.http_request_headers.items())
+
+    def _open_upstream(self) -> 'socket':
+        # Connect to destination, resolving first to time DNS on its own
+        started: 'float' = monotonic()
+        addresses: 'list[tuple[Any, ...]]' = self.server.resolver.resolve(host=self.hostname, port=int(self.port))
+        resolved: 'float' = monotonic()
+        sock: 'socket' = self.server.resolver.connect(host=self.hostname, addresses=addresses)
+        connected: 'float' = monotonic()
+
+        # Wrap socket if SSL is required
+        if self.is_connect:
+            sock = self.server.tls_sessions.wrap_socket(sock=sock, hostname=self.hostname, port=int(self.port))
+        self._observe_upstream(started=started, resolved=resolved, connected=connected)
+        return sock
+
+    def _observe_upstream(self, started: 'float', resolved: 'float', connected: 'float') -> 'None':
+        metrics: 'Metrics' = self.server.metrics
+        if not metrics:
+            return
+        metrics.observe('phase_seconds', resolved - started, phase='dns')
+        metrics.observe('phase_seconds', connected - resolved, phase='upstream_connect')
+        if self.is_connect:
+            metrics.observe('phase_seconds', monotonic() - connected, phase='upstream_tls')
+        metrics.inc('upstream_connections_total')
+
+    def _send_to_upstream(self, request: 'list[bytes]') -> 'None':
+        try:
+            _send_buffers(sock=self._proxy_sock, buffers=request)
+            if self.http_request_streamed:
+                # A streamed body can not be replayed once read from the client
+                self._proxy_reused = False
+                self._relay_request_stream()
+            self.http_response = HTTPResponse(sock=self._proxy_sock, method=self.command)
+            self.http_response.begin()
+            if not self._proxy_reused and isinstance(self._proxy_sock, SSLSocket):
+                # Any TLS 1.3 session ticket has arrived with the response
+                self.server.tls_sessions.store(hostname=self.hostname, port=int(self.port),
+                                               ssl_sock=self._proxy_sock)
+        except OSError:
+            # A pooled connection may have been closed by the origin while
+            # idle, retry once on a fresh one.
+            if not self._may_retry():
+                raise
+            self.server.upstream_pool.discard(conn=self._proxy_sock)
+            self._proxy_reused = False
+            self._proxy_sock = self._open_upstream()
+            self._send_to_upstream(request=request)
+
+    def _may_retry(self) -> 'bool':
+        # The origin may have acted on a request before dropping the
+        # connection, only one that is safe to repeat is sent again
+        return self._proxy_reused and self.command in _IDEMPOTENT_METHODS
+
+    def _server_ssl_context(self) -> 'SSLContext':
+        return self.server.tls_contexts.get(hostname=self.hostname, san=self.san)
+
     def _transition_to_ssl(self) -> 'None':
-        ssl_context = create_default_context(
-            purpose=Purpose.CLIENT_AUTH, cafile=self.ca_file)
-        ssl_context.verify_mode = CERT_OPTIONAL
-        cert: 'str'
-        pem: 'str'
-        cert, pem = self.server.ca.generate_sign_cert(
-            cn=self.hostname, san=self.san)
-        ssl_context.load_cert_chain(certfile=cert, keyfile=pem)
+        ssl_context = self._server_ssl_context()
+        started: 'float' = monotonic()
         self.request = ssl_context.wrap_socket(
             sock=self.request, server_side=True)
+        if self.server.metrics:
+            self.server.metrics.observe('phase_seconds', monotonic() - started, phase='client_tls')
+
+    def _bypasses_interception(self) -> 'bool':
+        if not self.server.passthrough:
+            return False
+        try:
+            self._parse_target()
+            port: 'int' = int(self.port)
+        except ValueError:
+            # Left for the intercepting path to reject
+            return False
+        decision: 'bool | None' = self.server.passthrough.lookup(host=self.hostname, port=port)
+        if decision is not None:
+            return decision
+        try:
+            infos: 'list[tuple[Any, ...]]' = self.server.resolver.resolve(host=self.hostname, port=port)
+        except OSError:
+            infos = []
+        return self.server.passthrough.decide(host=self.hostname, port=port,
+                                              addresses=[str(info[4][0]) for info in infos])
+
+    def _tunnel(self) -> 'None':
+        """ Relay a bypassed CONNECT as raw bytes until either side is done. """
+        try:
+            upstream: 'socket' = self.server.resolver.connect(
+                host=self.hostname, addresses=self.server.resolver.resolve(host=self.hostname, port=int(self.port)))
+        except Exception as e:
+            self.send_error(code=502, message=str(e))
+            return
+        self.send_response(code=200, message='Connection established')
+        self.end_headers()
+        self.close_connection = True
+
+        started: 'float' = monotonic()
+        bytes_up, bytes_down = 0, 0
+        self.server.tunnels.opened()
+        try:
+            bytes_up, bytes_down = pump(client=self.request, upstream=upstream)
+        finally:
+            upstream.close()
+            self._tunnel_closed(bytes_up=bytes_up, bytes_down=bytes_down, seconds=monotonic() - started)
+
+    def _tunnel_closed(self, bytes_up: 'int', bytes_down: 'int', seconds: 'float') -> 'None':
+        self.server.tunnels.closed(bytes_up=bytes_up, bytes_down=bytes_down, seconds=seconds)
+        self.logger.info(f"Passthrough {self.hostname}:{self.port} closed after {seconds:.3f}s, "
+                         f"{bytes_up} bytes up, {bytes_down} bytes down")
 
     def do_CONNECT(self):
         self.is_connect = True
+        if self._bypasses_interception():
+            self._tunnel()
+            return
         try:
             # Connect to destination first
             self._connect_to_host()
@@ -135,21 +358,37 @@ class ProxyRequestHandler(BaseHTTPRequestHandler):
             self.send_error(code=500, message=str(e))
             return
 
-        # Reload!
+        # Reload! The tunnel then serves requests until the client asks to
+        # close or stays idle for longer than app.idle_timeout, on servers
+        # that keep connections alive
         self.setup()
         self.ssl_host = f'https://{self.path}'
         self.handle_one_request()
 
     def do_COMMAND(self) -> 'None':
+        self._exchange_started: 'tuple[float, float]' = (time(), monotonic())
+        self.request_id = uuid4()
         # Is this an SSL tunnel?
-        if not self.is_connect:
-            try:
-                # Connect to destination
-                self._connect_to_host()
-            except Exception as e:
-                self.send_error(code=500, message=str(e))
-                return
-            # Extract path
+        try:
+            if not self.is_connect:
+                self._parse_target()
+            cached: 'CachedResponse | None' = None
+            if self._cache_key():
+                cached = self._cache_select(
+                    entry=self.server.response_cache.load(url=self._cache_url, headers=self.headers))
+            if cached is None and self.http_cache_result != 'unavailable':
+                self._prepare_upstream()
+        except Exception as e:
+            self.send_error(code=500, message=str(e))
+            return
+        if self.http_cache_result == 'unavailable':
+            self.send_error(code=504, message='Not in cache')
+            return
+        if cached is not None:
+            self._relay_cached(entry=cached)
+            return
+        self._proxy_idle = False
+        self._exchange_connected: 'float' = monotonic()
 
         # Build request
         self.http_request_title: 'str' = \
@@ -160,56 +399,467 @@ class ProxyRequestHandler(BaseHTTPRequestHandler):
 
         for header, value in self.headers.items():
             self.http_request_headers[header] = value
+        if self._cache_entry is not None:
+            # Revalidate the stored response rather than fetch it again
+            self.http_request_headers.update(self._cache_entry.validators)
 
-        # Append message body if present to the request
+        # Append message body if present to the request, large and chunked
+        # bodies are piped to the destination after the headers instead
         self.http_request_body = b""
-        if 'Content-Length' in self.headers:
-            self.http_request_body += self.rfile.read(
-                int(self.headers['Content-Length']))
+        try:
+            self.http_request_framing: 'str' = self._request_framing()
+            self.http_request_streamed = self._should_stream_request()
+            if not self.http_request_streamed and self.http_request_framing != 'none':
+                self.http_request_body = b"".join(self._iter_request_body())
+        except ValueError as e:
+            self._abort_exchange(code=400, error=e)
+            return
+        if not self.http_request_streamed and self.http_request_framing != 'none':
+            self._hold_budget(size=len(self.http_request_body))
+            if self.http_request_framing == 'chunked':
+                _del_header(headers=self.http_request_headers, name='Transfer-Encoding')
+                self.http_request_headers['Content-Length'] = str(len(self.http_request_body))
 
         # # Send it down the pipe!
-        self._proxy_sock.sendall(self.build_request())
+        self.http_response: 'HTTPResponse'
+        try:
+            self._send_to_upstream(request=self.build_request())
+        except ValueError as e:
+            self._abort_exchange(code=400, error=e)
+            return
+        except HTTPException as e:
+            self._abort_exchange(code=502, error=e)
+            return
+        self._exchange_responded: 'float' = monotonic()
 
         # Parse response
-        self.http_response: 'HTTPResponse' = HTTPResponse(sock=self._proxy_sock)
-
-        self.http_response.begin()
-        # Get rid of the pesky header
-        del self.http_response.msg['Transfer-Encoding']
-
         self.http_response_title: 'str' = \
             f'{self.request_version
                } {self.http_response.status
                   } {self.http_response.reason}\r\n'
+        self.http_response_status: 'int' = self.http_response.status
+        self.http_response_streamed = self._should_stream_response(length=self.http_response.length)
 
-        self.http_response_headers: 'dict[str,str]' = dict()
-        for header, value in self.http_response.getheaders():
-            self.http_response_headers[header] = value
-        self.http_response_body = self.http_response.read()
+        if self.http_response_streamed:
+            self._relay_response_stream()
+        else:
+            # Get rid of the pesky header
+            del self.http_response.msg['Transfer-Encoding']
+
+            self.http_response_headers: 'dict[str,str]' = dict()
+            for header, value in self.http_response.getheaders():
+                self.http_response_headers[header] = value
+            unframed: 'bool' = self.http_response.length is None
+            try:
+                self.http_response_body = self.http_response.read()
+            except HTTPException as e:
+                self._abort_exchange(code=502, error=e)
+                return
+            self._hold_budget(size=len(self.http_response_body))
+            if unframed:
+                # Let a keep-alive client find the end of a de-chunked body
+                self.http_response_headers['Content-Length'] = str(len(self.http_response_body))
 
-        # Let's close off the remote end
+        # Let's close off the remote end, unless the origin keeps it alive.
+        # A tunnel keeps its connection for the client's next request.
         self.http_response.close()
-        self._proxy_sock.close()
+        will_close: 'bool' = self.http_response.will_close or self._request_closes_upstream()
+        if self.is_connect and not will_close and not self.close_connection:
+            self._proxy_idle = True
+        else:
+            self._release_upstream(reusable=not will_close)
+        self._update_cache(reason=self.http_response.reason, response_headers=self.http_response.getheaders())
 
         # Relay the message
-        self.request.sendall(self.build_response())
-
-    def build_http_message(self, title: 'str', headers: 'dict[str,str]', body: 'bytes') -> 'bytes':
-        http_headers = ""
-        for header, value in headers.items():
-            http_headers += f"{header}: {value}\r\n"
-        http_headers += "\r\n"  # End of headers
+        if not self.http_response_streamed:
+            _send_buffers(sock=self.request, buffers=self.build_response())
+        self._capture_exchange(status=self.http_response_status, response_headers=self.http_response.getheaders())
+        self._release_budget()
+
+    def _hold_budget(self, size: 'int') -> 'None':
+        """ Count a buffered body against the server's memory budget until
+        the exchange is over. """
+        self.server.memory_budget.reserve(size=size)
+        self._budget_held += size
+
+    def _release_budget(self) -> 'None':
+        self.server.memory_budget.release(size=self._budget_held)
+        self._budget_held = 0
+        self.http_request_body = b""
+        self.http_response_body = b""
+        self.http_response_body_decoded = None
+        self.http_response_chunk_decoded = None
 
-        return title.encode(encoding="utf-8") + \
-            http_headers.encode(encoding="utf-8") + \
-            body
+    def _prepare_upstream(self) -> 'None':
+        if not self.is_connect:
+            # Connect to destination
+            self._connect_to_target()
+        elif self._proxy_sock is None:
+            # The previous request in this tunnel gave its connection up
+            self._acquire_upstream()
+        elif self._proxy_idle:
+            # Kept from the previous request, the origin may have closed it since
+            self._proxy_reused = True
+
+    def _cache_key(self) -> 'str':
+        """ URL under which the response to this request is cached, empty
+        when the cache can not take part in the exchange. """
+        cache: 'ResponseCache' = self.server.response_cache
+        self.http_cache_result = ''
+        self._cache_entry: 'CachedResponse | None' = None
+        self._cache_url = ''
+        if cache and cache.accepts(method=self.command, headers=self.headers):
+            self._cache_url = cache.url(host=self.hostname, port=int(self.port), tls=self.is_connect, path=self.path)
+        return self._cache_url
+
+    def _cache_select(self, entry: 'CachedResponse | None') -> 'CachedResponse | None':
+        """ ``entry``, stored for this request, if it answers it without
+        going upstream. A stale one is kept in ``_cache_entry`` to be
+        revalidated unless the client sent conditions of its own. """
+        cache: 'ResponseCache' = self.server.response_cache
+        if entry is not None and cache.usable(entry=entry, headers=self.headers):
+            self.http_cache_result = 'hit'
+            return entry
+        if cache.only_if_cached(headers=self.headers):
+            self.http_cache_result = 'unavailable'
+        elif entry is not None and entry.validators and \
+                'If-None-Match' not in self.headers and 'If-Modified-Since' not in self.headers:
+            self._cache_entry = entry
+        return None
+
+    def _use_cached(self, entry: 'CachedResponse') -> 'None':
+        """ Make ``entry`` the response to relay, ``304`` when the client's
+        own conditions hold for it. """
+        cache: 'ResponseCache' = self.server.response_cache
+        status, reason, body = entry.status, entry.reason, entry.body
+        headers: 'dict[str,str]' = dict(entry.headers)
+        headers['Age'] = cache.age_header(entry=entry)
+        if cache.not_modified(entry=entry, headers=self.headers):
+            status, reason, body = 304, 'Not Modified', b""
+            _del_header(headers=headers, name='Content-Length')
+        elif self.command == 'HEAD':
+            body = b""
+        cache.record(result=self.http_cache_result, saved=len(entry.body) if self.command == 'GET' else 0)
+
+        self.http_response_title = f'{self.request_version} {status} {reason}\r\n'
+        self.http_response_status = status
+        self.http_response_streamed = False
+        self.http_response_headers = headers
+        self.http_response_body = body
+
+    def _use_cached_request(self) -> 'None':
+        # The request never goes upstream, it has no body to relay
+        self._exchange_connected = self._exchange_responded = monotonic()
+        self.http_request_title = f'{self.command} {self.path} {self.request_version}\r\n'
+        self.http_request_headers = dict(self.headers.items())
+        self.http_request_body = b""
+        self.http_request_framing = 'none'
+        self.http_request_streamed = False
+
+    def _relay_cached(self, entry: 'CachedResponse') -> 'None':
+        self._use_cached_request()
+        # Request interceptors see every request, their changes go nowhere
+        self.build_request()
+        self._use_cached(entry=entry)
+        _send_buffers(sock=self.request, buffers=self.build_response())
+        self._capture_exchange(status=self.http_response_status, response_headers=entry.headers)
+
+    def _update_cache(self, reason: 'str', response_headers: 'list[tuple[str,str]]') -> 'None':
+        """ Store, freshen or invalidate cached responses once the response
+        head and a buffered body are in. A ``304`` revalidating the stored
+        response has that relayed in its place. """
+        cache: 'ResponseCache' = self.server.response_cache
+        if not cache:
+            return
+        status: 'int' = self.http_response_status
+        if self.command not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            # An unsafe request may have changed what is stored for its URL
+            if 200 <= status < 400:
+                cache.invalidate(url=cache.url(host=self.hostname, port=int(self.port), tls=self.is_connect,
+                                               path=self.path))
+            return
+        if not self._cache_url:
+            return
+        if status == 304 and self._cache_entry is not None:
+            self.http_cache_result = 'revalidated'
+            self._use_cached(entry=cache.freshen(url=self._cache_url, entry=self._cache_entry,
+                                                 response_headers=response_headers,
+                                                 request_time=self._exchange_started[0], response_time=time()))
+            return
+        self.http_cache_result = 'miss'
+        cache.record(result=self.http_cache_result)
+        if self.command == 'GET' and not self.http_response_streamed:
+            cache.store(url=self._cache_url, headers=self.headers, status=status, reason=reason,
+                        response_headers=list(self.http_response_headers.items()), body=self.http_response_body,
+                        request_time=self._exchange_started[0], response_time=time())
+
+    def _capture_exchange(self, status: 'int', response_headers: 'list[tuple[str,str]]') -> 'None':
+        """ Hand the finished exchange to the connection's capture record. """
+        meta, request_body, response_body = self._exchange_record(status=status, response_headers=response_headers)
+        self.logger.exchange(meta=meta, request_body=request_body, response_body=response_body)
+
+    def _exchange_record(self, status: 'int',
+                         response_headers: 'list[tuple[str,str]]') -> 'tuple[dict[str, Any], bytes, bytes]':
+        """ Capture record of the finished exchange, after ``end_exchange``.
+
+        Headers are stored as received, bodies up to ``stream.capture_limit``
+        bytes along with their full size. """
+        limit: 'int' = stream['capture_limit']
+        request_body: 'bytes' = self.http_request_body or b""
+        response_body: 'bytes' = self.http_response_body or b""
+        started, clock = self._exchange_started
+        meta: 'dict[str, Any]' = {
+            'time': started,
+            'request_id': str(self.request_id),
+            'client': self.client_address[0] if self.client_address else '',
+            'host': self.hostname,
+            'port': int(self.port),
+            'tls': self.is_connect,
+            'method': self.command,
+            'status': status,
+            'request': {
+                'line': self.http_request_title.rstrip('\r\n'),
+                'headers': self.headers.items(),
+                'body_size': self.http_request_body_capture.size if self.http_request_streamed else len(request_body),
+            },
+            'response': {
+                'line': self.http_response_title.rstrip('\r\n'),
+                'headers': response_headers,
+                'body_size': self.http_response_body_capture.size if self.http_response_streamed
+                else len(response_body),
+                'streamed': self.http_response_streamed,
+            },
+            # How the response cache took part: hit, revalidated, miss or empty
+            'cache': self.http_cache_result,
+            # Milliseconds since the request head was parsed
+            'timings': {
+                'connect': round((self._exchange_connected - clock) * 1000, 3),
+                'response': round((self._exchange_responded - clock) * 1000, 3),
+                'total': round((monotonic() - clock) * 1000, 3),
+            },
+        }
+        if self.server.metrics:
+            self._observe_exchange(meta=meta)
+        self.end_exchange(meta=meta, request_body=request_body[:limit], response_body=response_body[:limit])
+        return meta, request_body[:limit], response_body[:limit]
+
+    def _observe_exchange(self, meta: 'dict[str, Any]') -> 'None':
+        metrics: 'Metrics' = self.server.metrics
+        timings: 'dict[str, float]' = meta['timings']
+        # Upstream acquisition, then sending the request and waiting for the
+        # response head, then relaying the response including plugins
+        metrics.observe('phase_seconds', timings['connect'] / 1000, phase='upstream_acquire')
+        metrics.observe('phase_seconds', (timings['response'] - timings['connect']) / 1000, phase='upstream_response')
+        metrics.observe('phase_seconds', (timings['total'] - timings['response']) / 1000, phase='response_relay')
+        metrics.observe('exchange_seconds', timings['total'] / 1000)
+        metrics.inc('exchanges_total', method=meta['method'], status=str(meta['status']))
+        metrics.inc('body_bytes_total', meta['request']['body_size'], direction='request')
+        metrics.inc('body_bytes_total', meta['response']['body_size'], direction='response')
+
+    def _request_framing(self) -> 'str':
+        """ Tell how the request body is delimited: ``none``, ``chunked`` or ``length``. """
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            return 'chunked'
+        if 'Content-Length' in self.headers:
+            _content_length(value=self.headers['Content-Length'])
+            return 'length'
+        return 'none'
+
+    def _should_stream_request(self) -> 'bool':
+        if not stream['requests']:
+            return False
+        if self.http_request_framing == 'chunked':
+            return True
+        length: 'int' = _content_length(value=self.headers['Content-Length']) \
+            if self.http_request_framing == 'length' else 0
+        return self.http_request_framing == 'length' and \
+            (length > stream['request_threshold'] or not self.server.memory_budget.fits(size=length))
+
+    def _iter_request_body(self) -> 'Iterator[bytes]':
+        """ Body chunks as read from the client, each held against the
+        memory budget until the next one is asked for. """
+        chunk_size: 'int' = stream['chunk_size']
+        budget: 'MemoryBudget' = self.server.memory_budget
+
+        if self.http_request_framing == 'chunked':
+            while True:
+                size = _chunk_size(line=self.rfile.readline(65537))
+                if size == 0:
+                    # Discard trailers
+                    while self.rfile.readline(65537) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                while size > 0:
+                    with budget.hold(size=min(size, chunk_size)):
+                        data: 'bytes' = self.rfile.read(min(size, chunk_size))
+                        if not data:
+                            raise ConnectionError('Client closed connection before end of body')
+                        size -= len(data)
+                        yield data
+                self.rfile.readline(65537)
+
+        elif self.http_request_framing == 'length':
+            remaining = _content_length(value=self.headers['Content-Length'])
+            while remaining > 0:
+                with budget.hold(size=min(remaining, chunk_size)):
+                    data = self.rfile.read(min(remaining, chunk_size))
+                    if not data:
+                        raise ConnectionError('Client closed connection before end of body')
+                    remaining -= len(data)
+                    yield data
+
+    def _relay_request_stream(self) -> 'None':
+        """ Pipe the request body from the client to the destination in
+        fixed size chunks, keeping chunked bodies chunked. """
+        chunked: 'bool' = self.http_request_framing == 'chunked'
+        capture = BodyCapture(budget=self.server.memory_budget)
+        self.http_request_body_capture = capture
+
+        for chunk in self._iter_request_body():
+            if chunked:
+                _send_buffers(sock=self._proxy_sock, buffers=(b'%x\r\n' % len(chunk), chunk, b'\r\n'))
+            else:
+                self._proxy_sock.sendall(chunk)
+            capture.write(chunk=chunk)
+            self.request_body_chunk(chunk=chunk)
+
+        if chunked:
+            self._proxy_sock.sendall(b'0\r\n\r\n')
+
+        self.http_request_body = capture.getvalue()
+        self.http_request_body_truncated = capture.truncated
+        self.end_request_stream()
+        capture.close()
+
+    def request_body_chunk(self, chunk: 'bytes') -> 'None':
+        """ Called with every body chunk of a streamed request after it has
+        been forwarded. """
+        pass
+
+    def end_request_stream(self) -> 'None':
+        """ Called once a streamed request body has been forwarded,
+        ``http_request_body`` then holds the captured prefix of the body and
+        ``http_request_body_capture.open()`` reads the whole body back when
+        it is ``complete``. """
+        pass
+
+    def _should_stream_response(self, length: 'int | None') -> 'bool':
+        if not stream['responses']:
+            return False
+        # Chunked and close delimited bodies have no length to judge by
+        if length is None:
+            return True
+        return length > stream['response_threshold'] or not self.server.memory_budget.fits(size=length)
+
+    def _relay_response_stream(self) -> 'None':
+        """ Send the status line and headers right away, then forward the
+        body as it arrives. Chunked bodies stay chunked for HTTP/1.1 clients,
+        other clients get a body delimited by closing the connection. """
+        chunked: 'bool' = bool(self.http_response.chunked)
+        if chunked and self.request_version != 'HTTP/1.1':
+            del self.http_response.msg['Transfer-Encoding']
+            chunked = False
+        if self.http_response.length is None and not chunked:
+            self.close_connection = True
+
+        self.http_response_headers = dict()
+        for header, value in self.http_response.getheaders():
+            self.http_response_headers[header] = value
 
-    def build_request(self) -> 'bytes':
+        budget: 'MemoryBudget' = self.server.memory_budget
+        capture = BodyCapture(budget=budget)
+        self.http_response_body_capture = capture
+
+        self.begin_response_stream()
+        self.request.sendall(self.build_response_head())
+
+        has_body: 'bool' = self.command != 'HEAD' and self.http_response.status not in (204, 304) and \
+            self.http_response.status >= 200
+        while has_body:
+            # Nothing more is read from the origin while the budget is used up
+            with budget.hold(size=stream['chunk_size']):
+                chunk: 'bytes' = self.http_response.read1(stream['chunk_size'])
+                if not chunk:
+                    break
+                if chunked:
+                    _send_buffers(sock=self.request, buffers=(b'%x\r\n' % len(chunk), chunk, b'\r\n'))
+                else:
+                    self.request.sendall(chunk)
+
+                capture.write(chunk=chunk)
+                self.response_body_chunk(chunk=chunk)
+
+        if has_body and chunked:
+            self.request.sendall(b'0\r\n\r\n')
+
+        self.http_response_body = capture.getvalue()
+        self.http_response_body_truncated = capture.truncated
+        self.end_response_stream()
+        capture.close()
+
+    def begin_response_stream(self) -> 'None':
+        """ Called before the headers of a streamed response are relayed. """
+        pass
+
+    def response_body_chunk(self, chunk: 'bytes') -> 'None':
+        """ Called with every body chunk of a streamed response after it has
+        been relayed. """
+        pass
+
+    def end_response_stream(self) -> 'None':
+        """ Called once a streamed response has been relayed completely,
+        ``http_response_body`` then holds the captured prefix of the body and
+        ``http_response_body_capture.open()`` the complete body when it is
+        ``complete``. """
+        pass
+
+    def end_exchange(self, meta: 'dict[str, Any]', request_body: 'bytes', response_body: 'bytes') -> 'None':
+        """ Called once an exchange has been relayed with what is about to be
+        captured; ``meta`` must not be kept, it is handed on afterwards. """
+        pass
+
+    def finish(self) -> 'None':
+        BaseHTTPRequestHandler.finish(self)
+        # Hand a tunnel's connection back once the client is gone
+        if self._proxy_sock is not None:
+            self._release_upstream(reusable=self._proxy_idle)
+        self._release_budget()
+        self.logger.close()
+        # The server only shuts down the socket it accepted, a MITM
+        # connection has been wrapped in TLS since and is closed here
+        self.request.close()
+
+    def encode_http_head(self, title: 'str', headers: 'dict[str,str]') -> 'bytes':
+        """ Start line and header block, encoded in one go. """
+        lines: 'list[str]' = [title]
+        lines.extend(f"{header}: {value}\r\n" for header, value in headers.items())
+        lines.append("\r\n")  # End of headers
+        return "".join(lines).encode(encoding="utf-8")
+
+    def build_http_message(self, title: 'str', headers: 'dict[str,str]', body: 'bytes') -> 'list[bytes]':
+        """ Buffers of a message, the encoded head followed by the body as
+        is, ready to be sent without being joined. """
+        head: 'bytes' = self.encode_http_head(title=title, headers=headers)
+        return [head, body] if body else [head]
+
+    def build_request(self) -> 'list[bytes]':
         return self.build_http_message(title=self.http_request_title, headers=self.http_request_headers, body=self.http_request_body)
 
-    def build_response(self) -> 'bytes':
+    def build_response(self) -> 'list[bytes]':
+        self._announce_close()
         return self.build_http_message(title=self.http_response_title, headers=self.http_response_headers, body=self.http_response_body)
 
+    def build_response_head(self) -> 'bytes':
+        self._announce_close()
+        return self.encode_http_head(title=self.http_response_title, headers=self.http_response_headers)
+
+    def _announce_close(self) -> 'None':
+        # Connection is hop-by-hop, the client learns from the proxy whether
+        # the connection ends after this response
+        if self.close_connection:
+            _del_header(headers=self.http_response_headers, name='Connection')
+            self.http_response_headers['Connection'] = 'close'
+
     def __getattr__(self, item: 'str'):
         if item.startswith('do_'):
             return self.do_COMMAND
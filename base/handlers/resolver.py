@@ -0,0 +1,316 @@
+""" Cached name resolution and Happy Eyeballs connects for upstream sockets """
+
+from asyncio import (FIRST_COMPLETED, Task, gather, get_running_loop, shield,
+                     wait, wait_for, wrap_future)
+from asyncio import timeout as async_timeout
+from collections import OrderedDict
+from concurrent.futures import Future
+from errno import EINPROGRESS, EWOULDBLOCK
+from ipaddress import ip_address
+from os import strerror
+from selectors import EVENT_WRITE, DefaultSelector
+from socket import (AF_INET, AF_INET6, IPPROTO_TCP, SO_ERROR, SOCK_STREAM,
+                    SOL_SOCKET, getaddrinfo, socket)
+from threading import Lock
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from base import dns
+
+if TYPE_CHECKING:
+    from typing import Any, Iterable
+
+    AddrInfo = tuple[Any, ...]
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'Resolver'
+]
+
+
+def _interleave(addresses: 'list[AddrInfo]', first_family: 'int | None') -> 'list[AddrInfo]':
+    """ Alternate address families, starting with ``first_family`` or the
+    family of the first address (RFC 8305 section 4). """
+    families: 'dict[int, list[AddrInfo]]' = {}
+    for info in addresses:
+        families.setdefault(info[0], []).append(info)
+    order: 'list[int]' = list(families)
+    if first_family in families:
+        order.remove(first_family)  # type:ignore
+        order.insert(0, first_family)  # type:ignore
+    ordered: 'list[AddrInfo]' = []
+    queues: 'list[list[AddrInfo]]' = [families[family] for family in order]
+    while any(queues):
+        for queue in queues:
+            if queue:
+                ordered.append(queue.pop(0))
+    return ordered
+
+
+def _static(addresses: 'Iterable[str]', port: 'int') -> 'list[AddrInfo]':
+    infos: 'list[AddrInfo]' = []
+    for address in addresses:
+        if ip_address(address).version == 6:
+            infos.append((AF_INET6, SOCK_STREAM, IPPROTO_TCP, '', (address, port, 0, 0)))
+        else:
+            infos.append((AF_INET, SOCK_STREAM, IPPROTO_TCP, '', (address, port)))
+    return infos
+
+
+class Resolver:
+    """ Resolves upstream hosts through a TTL-bounded cache and connects to
+    them by racing their addresses.
+
+    ``getaddrinfo`` does not expose record TTLs, answers are kept for
+    ``ttl`` seconds and failures for ``negative_ttl``; at most
+    ``cache_size`` names are remembered. Concurrent lookups of one name,
+    from threads or coroutines, share a single ``getaddrinfo`` call.
+    ``hosts`` maps names to fixed addresses that are never looked up, nor
+    are address literals. A caller waits at most ``lookup_timeout``
+    seconds for a lookup another one started.
+
+    ``connect`` follows RFC 8305: address families are interleaved and the
+    next address is tried whenever the previous attempt failed or has not
+    succeeded within ``happy_eyeballs_delay`` seconds; the first connection
+    wins. The family that won is tried first for that host next time.
+    """
+
+    def __init__(self, ttl: 'float | None' = None, negative_ttl: 'float | None' = None,
+                 cache_size: 'int | None' = None, hosts: 'dict[str, list[str]] | None' = None,
+                 happy_eyeballs_delay: 'float | None' = None, connect_timeout: 'float | None' = None,
+                 lookup_timeout: 'float | None' = None) -> 'None':
+        hosts = dns['hosts'] if hosts is None else hosts
+        self.ttl: 'float' = dns['ttl'] if ttl is None else ttl
+        self.negative_ttl: 'float' = dns['negative_ttl'] if negative_ttl is None else negative_ttl
+        self.cache_size: 'int' = dns['cache_size'] if cache_size is None else cache_size
+        self.hosts: 'dict[str, list[str]]' = {name.lower(): list(addresses) for name, addresses in hosts.items()}
+        self.happy_eyeballs_delay: 'float' = dns['happy_eyeballs_delay'] if happy_eyeballs_delay is None \
+            else happy_eyeballs_delay
+        self.connect_timeout: 'float' = dns['connect_timeout'] if connect_timeout is None else connect_timeout
+        self.lookup_timeout: 'float' = dns['lookup_timeout'] if lookup_timeout is None else lookup_timeout
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._lock = Lock()
+        self._cache: 'OrderedDict[tuple[str, int], tuple[float, list[AddrInfo] | OSError]]' = OrderedDict()
+        self._flights: 'dict[tuple[str, int], Future]' = {}
+        self._families: 'OrderedDict[str, int]' = OrderedDict()
+
+    def resolve(self, host: 'str', port: 'int') -> 'list[AddrInfo]':
+        """ ``getaddrinfo`` results for a TCP connection to ``host:port``. """
+        key: 'tuple[str, int]' = (host.lower(), port)
+        cached: 'list[AddrInfo] | None' = self._cached(key=key)
+        if cached is not None:
+            return cached
+        flight, leader = self._join_flight(key=key)
+        if not leader:
+            try:
+                return flight.result(timeout=self.lookup_timeout)
+            except TimeoutError:
+                raise TimeoutError(f'Lookup of {host} timed out') from None
+        try:
+            infos: 'list[AddrInfo]' = getaddrinfo(host, port, type=SOCK_STREAM)
+        except UnicodeError as e:
+            raise self._land_invalid(key=key, flight=flight, host=host, error=e) from e
+        except OSError as e:
+            self._land(key=key, flight=flight, result=e)
+            raise
+        except BaseException:
+            # Interrupted, let waiting callers retry on their own
+            self._land(key=key, flight=flight, result=OSError(f'Lookup of {host} was interrupted'), remember=False)
+            raise
+        self._land(key=key, flight=flight, result=infos)
+        return infos
+
+    async def resolve_async(self, host: 'str', port: 'int') -> 'list[AddrInfo]':
+        """ ``resolve`` on the event loop. """
+        key: 'tuple[str, int]' = (host.lower(), port)
+        cached: 'list[AddrInfo] | None' = self._cached(key=key)
+        if cached is not None:
+            return cached
+        flight, leader = self._join_flight(key=key)
+        if not leader:
+            try:
+                # Shielded, a waiter giving up must not cancel the shared lookup
+                return await wait_for(shield(wrap_future(flight)), timeout=self.lookup_timeout)
+            except TimeoutError:
+                raise TimeoutError(f'Lookup of {host} timed out') from None
+        try:
+            infos: 'list[AddrInfo]' = await get_running_loop().getaddrinfo(host, port, type=SOCK_STREAM)
+        except UnicodeError as e:
+            raise self._land_invalid(key=key, flight=flight, host=host, error=e) from e
+        except OSError as e:
+            self._land(key=key, flight=flight, result=e)
+            raise
+        except BaseException as e:
+            # Cancelled, let waiting callers retry on their own
+            self._land(key=key, flight=flight, result=OSError(f'Lookup of {host} was cancelled'), remember=False)
+            raise e
+        self._land(key=key, flight=flight, result=infos)
+        return infos
+
+    def connect(self, host: 'str', addresses: 'list[AddrInfo]') -> 'socket':
+        """ A blocking socket connected to the first of ``addresses`` to answer. """
+        pending: 'list[AddrInfo]' = _interleave(addresses=addresses, first_family=self._families.get(host.lower()))
+        attempts: 'dict[socket, AddrInfo]' = {}
+        selector = DefaultSelector()
+        deadline: 'float' = monotonic() + self.connect_timeout
+        next_attempt: 'float' = 0.0
+        error: 'OSError | None' = None
+        try:
+            while pending or attempts:
+                now: 'float' = monotonic()
+                if now >= deadline:
+                    raise TimeoutError(f'Connecting to {host} timed out')
+                if pending and now >= next_attempt:
+                    info: 'AddrInfo' = pending.pop(0)
+                    sock = socket(info[0], info[1], info[2])
+                    sock.setblocking(False)
+                    code: 'int' = sock.connect_ex(info[4])
+                    if code not in (0, EINPROGRESS, EWOULDBLOCK):
+                        sock.close()
+                        error = OSError(code, strerror(code))
+                        continue
+                    selector.register(sock, EVENT_WRITE)
+                    attempts[sock] = info
+                    next_attempt = now + self.happy_eyeballs_delay
+                    continue
+
+                select_timeout: 'float' = deadline - now
+                if pending:
+                    select_timeout = min(select_timeout, next_attempt - now)
+                for key, _ in selector.select(timeout=select_timeout):
+                    sock = key.fileobj  # type:ignore
+                    selector.unregister(sock)
+                    info = attempts.pop(sock)
+                    code = sock.getsockopt(SOL_SOCKET, SO_ERROR)
+                    if not code:
+                        sock.setblocking(True)
+                        self._remember_family(host=host, family=info[0])
+                        return sock
+                    sock.close()
+                    error = OSError(code, strerror(code))
+                    # A failed attempt starts the next one right away
+                    next_attempt = 0.0
+            raise error or OSError(f'No addresses to connect to for {host}')
+        finally:
+            for sock in attempts:
+                sock.close()
+            selector.close()
+
+    async def connect_async(self, host: 'str', addresses: 'list[AddrInfo]') -> 'socket':
+        """ ``connect`` on the event loop, the socket is left non-blocking. """
+        loop = get_running_loop()
+        pending: 'list[AddrInfo]' = _interleave(addresses=addresses, first_family=self._families.get(host.lower()))
+        running: 'set[Task[tuple[socket, AddrInfo]]]' = set()
+        error: 'BaseException | None' = None
+
+        async def attempt(info: 'AddrInfo') -> 'tuple[socket, AddrInfo]':
+            sock = socket(info[0], info[1], info[2])
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, info[4])
+            except BaseException:
+                sock.close()
+                raise
+            return sock, info
+
+        try:
+            async with async_timeout(self.connect_timeout):
+                while pending or running:
+                    if pending:
+                        running.add(loop.create_task(attempt(info=pending.pop(0))))
+                    done, running = await wait(running, timeout=self.happy_eyeballs_delay if pending else None,
+                                               return_when=FIRST_COMPLETED)
+                    winners: 'list[tuple[socket, AddrInfo]]' = []
+                    for task in done:
+                        if task.exception() is None:
+                            winners.append(task.result())
+                        else:
+                            error = task.exception()
+                    if winners:
+                        for sock, _ in winners[1:]:
+                            sock.close()
+                        sock, info = winners[0]
+                        self._remember_family(host=host, family=info[0])
+                        return sock
+        except TimeoutError:
+            raise TimeoutError(f'Connecting to {host} timed out') from None
+        finally:
+            for task in running:
+                task.cancel()
+            for result in await gather(*running, return_exceptions=True):
+                if isinstance(result, tuple):
+                    result[0].close()
+        raise error or OSError(f'No addresses to connect to for {host}')
+
+    def clear(self) -> 'None':
+        with self._lock:
+            self._cache.clear()
+            self._families.clear()
+
+    def _cached(self, key: 'tuple[str, int]') -> 'list[AddrInfo] | None':
+        addresses: 'list[str] | None' = self.hosts.get(key[0])
+        if addresses is not None:
+            return _static(addresses=addresses, port=key[1])
+        try:
+            # Address literals need no lookup
+            return _static(addresses=(key[0],), port=key[1])
+        except ValueError:
+            pass
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or entry[0] <= monotonic():
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            result: 'list[AddrInfo] | OSError' = entry[1]
+        if isinstance(result, OSError):
+            raise result
+        return result
+
+    def _join_flight(self, key: 'tuple[str, int]') -> 'tuple[Future, bool]':
+        with self._lock:
+            flight: 'Future | None' = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Future()
+            self.misses += 1
+            return flight, True
+
+    def _land(self, key: 'tuple[str, int]', flight: 'Future', result: 'list[AddrInfo] | OSError',
+              remember: 'bool' = True) -> 'None':
+        failed: 'bool' = isinstance(result, OSError)
+        with self._lock:
+            del self._flights[key]
+            if failed:
+                self.failures += 1
+            if remember:
+                self._cache[key] = (monotonic() + (self.negative_ttl if failed else self.ttl), result)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        if failed:
+            flight.set_exception(result)  # type:ignore
+        else:
+            flight.set_result(result)
+
+    def _land_invalid(self, key: 'tuple[str, int]', flight: 'Future', host: 'str', error: 'UnicodeError') -> 'OSError':
+        # A name that can not be encoded, e.g. with a label over 63
+        # characters, fails like one that does not exist
+        invalid = OSError(f'Invalid host name {host!r}: {error}')
+        self._land(key=key, flight=flight, result=invalid)
+        return invalid
+
+    def _remember_family(self, host: 'str', family: 'int') -> 'None':
+        with self._lock:
+            self._families[host.lower()] = family
+            self._families.move_to_end(host.lower())
+            while len(self._families) > self.cache_size:
+                self._families.popitem(last=False)
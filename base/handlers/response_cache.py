@@ -0,0 +1,529 @@
+""" Shared HTTP cache for origin responses """
+
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from hashlib import sha256
+from json import dumps, loads
+from os import listdir, makedirs, path, remove, replace, stat
+from queue import Full, Queue
+from tempfile import gettempdir
+from threading import Lock, Thread, get_ident
+from time import time
+from typing import TYPE_CHECKING
+
+from base import cache, logger, response_cache
+
+if TYPE_CHECKING:
+    from email.message import Message
+    from typing import Any, Iterable
+
+    Variant = tuple[tuple[str, 'str | None'], ...]
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'ResponseCache',
+    'CachedResponse',
+    'parse_cache_control'
+]
+
+# Statuses that may be stored without explicit freshness (RFC 9110 section 15.1)
+_HEURISTIC_STATUSES = frozenset((200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501))
+# Not stored, and not updated from a 304 either
+_HOP_BY_HOP = frozenset(('connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'te', 'trailer',
+                         'upgrade', 'proxy-authenticate', 'proxy-authorization', 'age'))
+
+
+def parse_cache_control(value: 'str') -> 'dict[str, str | None]':
+    """ Directives of a ``Cache-Control`` value, names lowercased. """
+    directives: 'dict[str, str | None]' = {}
+    for part in value.split(','):
+        name, sep, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip().strip('"') if sep else None
+    return directives
+
+
+def _delta(value: 'str | None') -> 'int':
+    """ Seconds of a delta value, a malformed one counts as zero. """
+    try:
+        return max(0, int(value or 0))
+    except ValueError:
+        return 0
+
+
+def _seconds(directives: 'dict[str, str | None]', name: 'str') -> 'int | None':
+    return _delta(directives[name]) if name in directives else None
+
+
+def _http_date(value: 'str | None') -> 'float | None':
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _request_directives(headers: 'Message') -> 'dict[str, str | None]':
+    values: 'list[str]' = headers.get_all('Cache-Control') or []
+    if not values and 'no-cache' in (headers.get('Pragma') or '').lower():
+        return {'no-cache': None}
+    return parse_cache_control(value=', '.join(values))
+
+
+def _normalized(headers: 'Message', name: 'str') -> 'str | None':
+    values: 'list[str] | None' = headers.get_all(name)
+    if values is None:
+        return None
+    return ', '.join(' '.join(value.split()) for value in values)
+
+
+def _weak_equal(etags: 'str', etag: 'str') -> 'bool':
+    opaque: 'str' = etag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == opaque for candidate in etags.split(','))
+
+
+class CachedResponse:
+    """ A stored response: status, headers as relayed to clients and body.
+
+    ``request_time`` and ``response_time`` are the wall clock times the
+    request was sent and the response received, ``age_value`` its ``Age``
+    header, ``variant`` the values of the request headers the response
+    varies on.
+    """
+
+    __slots__ = ('status', 'reason', 'headers', 'body', 'request_time', 'response_time', 'variant',
+                 'directives', 'age_value', 'date_value')
+
+    def __init__(self, status: 'int', reason: 'str', headers: 'list[tuple[str, str]]', body: 'bytes',
+                 request_time: 'float', response_time: 'float', variant: 'Variant', age_value: 'int' = 0) -> 'None':
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.request_time = request_time
+        self.response_time = response_time
+        self.variant = variant
+        self.age_value = age_value
+        self.directives: 'dict[str, str | None]' = parse_cache_control(value=', '.join(
+            value for header, value in headers if header.lower() == 'cache-control'))
+        self.date_value: 'float' = _http_date(self.header('Date')) or response_time
+
+    @property
+    def size(self) -> 'int':
+        return len(self.body) + sum(len(header) + len(value) + 4 for header, value in self.headers)
+
+    def header(self, name: 'str') -> 'str | None':
+        name = name.lower()
+        for header, value in self.headers:
+            if header.lower() == name:
+                return value
+        return None
+
+    def current_age(self, now: 'float') -> 'float':
+        """ Age in seconds (RFC 9111 section 4.2.3). """
+        apparent_age: 'float' = max(0.0, self.response_time - self.date_value)
+        corrected_age: 'float' = self.age_value + (self.response_time - self.request_time)
+        return max(apparent_age, corrected_age) + (now - self.response_time)
+
+    def freshness_lifetime(self, heuristic_fraction: 'float', heuristic_max: 'float') -> 'float':
+        """ Seconds the response stays fresh for a shared cache (RFC 9111 section 4.2.1). """
+        for directive in ('s-maxage', 'max-age'):
+            seconds: 'int | None' = _seconds(directives=self.directives, name=directive)
+            if seconds is not None:
+                return seconds
+        expires: 'str | None' = self.header('Expires')
+        if expires is not None:
+            # An invalid date means already expired
+            return max(0.0, (_http_date(expires) or 0.0) - self.date_value)
+        last_modified: 'float | None' = _http_date(self.header('Last-Modified'))
+        if last_modified is not None and (self.status in _HEURISTIC_STATUSES or 'public' in self.directives):
+            return min(heuristic_max, max(0.0, self.date_value - last_modified) * heuristic_fraction)
+        return 0.0
+
+    @property
+    def validators(self) -> 'dict[str, str]':
+        """ Conditional request headers revalidating this response. """
+        conditions: 'dict[str, str]' = {}
+        etag: 'str | None' = self.header('ETag')
+        if etag is not None:
+            conditions['If-None-Match'] = etag
+        last_modified: 'str | None' = self.header('Last-Modified')
+        if last_modified is not None:
+            conditions['If-Modified-Since'] = last_modified
+        return conditions
+
+    def matches(self, headers: 'Message') -> 'bool':
+        """ Whether a request with ``headers`` selects this variant. """
+        return all(_normalized(headers=headers, name=name) == value for name, value in self.variant)
+
+    def to_json(self) -> 'dict[str, Any]':
+        return {'status': self.status, 'reason': self.reason, 'headers': self.headers, 'body_size': len(self.body),
+                'request_time': self.request_time, 'response_time': self.response_time,
+                'variant': self.variant, 'age_value': self.age_value}
+
+    @classmethod
+    def from_json(cls, data: 'dict[str, Any]', body: 'bytes') -> 'CachedResponse':
+        return cls(status=data['status'], reason=data['reason'],
+                   headers=[(header, value) for header, value in data['headers']], body=body,
+                   request_time=data['request_time'], response_time=data['response_time'],
+                   variant=tuple((name, value) for name, value in data['variant']), age_value=data['age_value'])
+
+
+class _DiskTier:
+    """ Responses of a URL in one file under ``directory``: a JSON line
+    describing the variants followed by their bodies.
+
+    Files are written and removed by a background thread, at most
+    ``queue_size`` operations wait for it and further ones are dropped.
+    The oldest files are removed once ``max_size`` bytes are used. Several
+    processes may share the directory.
+    """
+
+    def __init__(self, directory: 'str', max_size: 'int', queue_size: 'int') -> 'None':
+        makedirs(name=directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+        self.size = 0
+        self.dropped = 0
+        self._lock = Lock()
+        self._files: 'OrderedDict[str, int]' = OrderedDict()
+        for name, file_size, _ in sorted(self._scan(), key=lambda entry: entry[2]):
+            self._files[name] = file_size
+            self.size += file_size
+        self._queue: 'Queue[tuple[str, str, list[CachedResponse]] | tuple[str, None, None] | None]' = \
+            Queue(maxsize=queue_size)
+        self._thread = Thread(target=self._run, name='pylogproxy-response-cache', daemon=True)
+        self._thread.start()
+
+    def _scan(self) -> 'Iterable[tuple[str, int, float]]':
+        for name in listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            try:
+                info = stat(path.join(self.directory, name))
+            except OSError:
+                continue
+            yield name, info.st_size, info.st_mtime
+
+    def read(self, name: 'str') -> 'list[CachedResponse]':
+        try:
+            with open(file=path.join(self.directory, name), mode='rb') as f:
+                description: 'dict[str, Any]' = loads(f.readline())
+                return [CachedResponse.from_json(data=variant, body=f.read(variant['body_size']))
+                        for variant in description['variants']]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Dropping unreadable cached response {name}: {e}")
+            self.remove(name=name)
+            return []
+
+    def write(self, name: 'str', url: 'str', variants: 'list[CachedResponse]') -> 'None':
+        self._submit(operation=(name, url, variants))
+
+    def remove(self, name: 'str') -> 'None':
+        self._submit(operation=(name, None, None))
+
+    def _submit(self, operation: 'tuple[str, str, list[CachedResponse]] | tuple[str, None, None]') -> 'None':
+        try:
+            self._queue.put_nowait(operation)
+        except Full:
+            self.dropped += 1
+
+    def _run(self) -> 'None':
+        while (operation := self._queue.get()) is not None:
+            name, url, variants = operation
+            try:
+                if url is None:
+                    self._unlink(name=name)
+                else:
+                    self._store(name=name, url=url, variants=variants)  # type:ignore
+            except OSError as e:
+                logger.error(f"Could not update cached response {name}: {e}")
+
+    def _store(self, name: 'str', url: 'str', variants: 'list[CachedResponse]') -> 'None':
+        description: 'bytes' = dumps({'url': url, 'variants': [variant.to_json() for variant in variants]},
+                                     separators=(',', ':')).encode(encoding='utf-8')
+        temporary: 'str' = path.join(self.directory, f"{name}.{get_ident()}.tmp")
+        with open(file=temporary, mode='wb') as f:
+            f.write(description + b'\n')
+            for variant in variants:
+                f.write(variant.body)
+            file_size: 'int' = f.tell()
+        replace(temporary, path.join(self.directory, name))
+        evicted: 'list[str]' = []
+        with self._lock:
+            self.size += file_size - self._files.pop(name, 0)
+            self._files[name] = file_size
+            while self.size > self.max_size and len(self._files) > 1:
+                oldest, oldest_size = self._files.popitem(last=False)
+                self.size -= oldest_size
+                evicted.append(oldest)
+        for oldest in evicted:
+            self._remove_file(name=oldest)
+
+    def _unlink(self, name: 'str') -> 'None':
+        with self._lock:
+            self.size -= self._files.pop(name, 0)
+        self._remove_file(name=name)
+
+    def _remove_file(self, name: 'str') -> 'None':
+        try:
+            remove(path.join(self.directory, name))
+        except FileNotFoundError:
+            # Removed by another process sharing the directory
+            pass
+
+    def close(self) -> 'None':
+        self._queue.put(None)
+        self._thread.join()
+
+
+class ResponseCache:
+    """ Shared cache of origin responses following RFC 9111.
+
+    Complete responses to ``GET`` requests are kept, up to
+    ``max_object_size`` bytes each, in a memory tier bounded by
+    ``memory_size`` bytes and evicting the least recently used URL first.
+    With ``disk_size`` they are also written to a disk tier under
+    ``directory``; what the memory tier misses is looked up there and
+    promoted. Up to ``max_variants`` responses per URL are kept for
+    requests differing in the headers named by ``Vary``.
+
+    Responses without explicit freshness that carry ``Last-Modified`` stay
+    fresh for ``heuristic_fraction`` of their age, at most
+    ``heuristic_max`` seconds. Stale responses are revalidated with their
+    ``ETag`` or ``Last-Modified``. A disabled cache is falsy.
+    """
+
+    def __init__(self, enabled: 'bool | None' = None, memory_size: 'int | None' = None,
+                 disk_size: 'int | None' = None, max_object_size: 'int | None' = None,
+                 max_variants: 'int | None' = None, heuristic_fraction: 'float | None' = None,
+                 heuristic_max: 'float | None' = None, queue_size: 'int | None' = None,
+                 directory: 'str | None' = None) -> 'None':
+        enabled = response_cache['enabled'] if enabled is None else enabled
+        disk_size = response_cache['disk_size'] if disk_size is None else disk_size
+        queue_size = response_cache['queue_size'] if queue_size is None else queue_size
+        if directory is None:
+            directory = f"{cache['dir'] or f'{gettempdir()}/pylogproxy'}/responses"
+        self.enabled: 'bool' = enabled
+        self.memory_size: 'int' = response_cache['memory_size'] if memory_size is None else memory_size
+        self.max_object_size: 'int' = response_cache['max_object_size'] if max_object_size is None \
+            else max_object_size
+        self.max_variants: 'int' = response_cache['max_variants'] if max_variants is None else max_variants
+        self.heuristic_fraction: 'float' = response_cache['heuristic_fraction'] if heuristic_fraction is None \
+            else heuristic_fraction
+        self.heuristic_max: 'float' = response_cache['heuristic_max'] if heuristic_max is None else heuristic_max
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stored = 0
+        self.bytes_saved = 0
+        self._lock = Lock()
+        self._memory: 'OrderedDict[str, list[CachedResponse]]' = OrderedDict()
+        self.disk: '_DiskTier | None' = _DiskTier(directory=directory, max_size=disk_size, queue_size=queue_size) \
+            if enabled and disk_size > 0 else None
+
+    def __bool__(self) -> 'bool':
+        return self.enabled
+
+    @property
+    def hit_ratio(self) -> 'float':
+        """ Share of cacheable requests answered without a full upstream response. """
+        lookups: 'int' = self.hits + self.revalidated + self.misses
+        return (self.hits + self.revalidated) / lookups if lookups else 0.0
+
+    @staticmethod
+    def url(host: 'str', port: 'int', tls: 'bool', path: 'str') -> 'str':
+        return f"{'https' if tls else 'http'}://{host.lower()}:{port}{path}"
+
+    @staticmethod
+    def accepts(method: 'str', headers: 'Message') -> 'bool':
+        """ Whether a request may be answered from the cache at all. """
+        if method not in ('GET', 'HEAD') or 'Range' in headers:
+            return False
+        if 'Transfer-Encoding' in headers or headers.get('Content-Length', '0') != '0':
+            return False
+        return 'no-store' not in _request_directives(headers=headers)
+
+    def lookup(self, url: 'str', headers: 'Message') -> 'CachedResponse | None':
+        """ Most recent response stored in memory for a request, fresh or not. """
+        with self._lock:
+            variants: 'list[CachedResponse] | None' = self._memory.get(url)
+            if variants is None:
+                return None
+            self._memory.move_to_end(url)
+        return next((variant for variant in reversed(variants) if variant.matches(headers=headers)), None)
+
+    def load(self, url: 'str', headers: 'Message') -> 'CachedResponse | None':
+        """ ``lookup`` falling back to the disk tier, which blocks on file I/O. """
+        found: 'CachedResponse | None' = self.lookup(url=url, headers=headers)
+        if found is not None or self.disk is None:
+            return found
+        variants: 'list[CachedResponse]' = self.disk.read(name=self._file_name(url=url))
+        if not variants:
+            return None
+        with self._lock:
+            if url not in self._memory:
+                self._keep(url=url, variants=variants)
+        return next((variant for variant in reversed(variants) if variant.matches(headers=headers)), None)
+
+    def usable(self, entry: 'CachedResponse', headers: 'Message') -> 'bool':
+        """ Whether ``entry`` may answer a request without revalidation (RFC 9111 section 4.2). """
+        requested: 'dict[str, str | None]' = _request_directives(headers=headers)
+        if 'no-cache' in requested or 'no-cache' in entry.directives:
+            return False
+        age: 'float' = entry.current_age(now=time())
+        lifetime: 'float' = entry.freshness_lifetime(heuristic_fraction=self.heuristic_fraction,
+                                                     heuristic_max=self.heuristic_max)
+        max_age: 'int | None' = _seconds(directives=requested, name='max-age')
+        if max_age is not None and age > max_age:
+            return False
+        min_fresh: 'int | None' = _seconds(directives=requested, name='min-fresh')
+        if min_fresh is not None and lifetime - age < min_fresh:
+            return False
+        if lifetime > age:
+            return True
+        # Stale, served only to clients accepting it unless the origin forbids
+        if 'max-stale' not in requested or \
+                any(directive in entry.directives for directive in ('must-revalidate', 'proxy-revalidate', 's-maxage')):
+            return False
+        return requested['max-stale'] is None or age - lifetime <= _delta(requested['max-stale'])
+
+    @staticmethod
+    def only_if_cached(headers: 'Message') -> 'bool':
+        """ Whether the client asked for a stored response or none at all. """
+        return 'only-if-cached' in _request_directives(headers=headers)
+
+    def record(self, result: 'str', saved: 'int' = 0) -> 'None':
+        """ Count a request answered as ``hit``, ``revalidated`` or ``miss``
+        and the body bytes that did not come from the origin. """
+        with self._lock:
+            if result == 'hit':
+                self.hits += 1
+            elif result == 'revalidated':
+                self.revalidated += 1
+            else:
+                self.misses += 1
+            self.bytes_saved += saved
+
+    @staticmethod
+    def not_modified(entry: 'CachedResponse', headers: 'Message') -> 'bool':
+        """ Whether the client's own conditions hold for ``entry`` (RFC 9110 section 13.2.2). """
+        etags: 'str | None' = headers.get('If-None-Match')
+        if etags is not None:
+            etag: 'str | None' = entry.header('ETag')
+            return etag is not None and (etags.strip() == '*' or _weak_equal(etags=etags, etag=etag))
+        since: 'float | None' = _http_date(headers.get('If-Modified-Since'))
+        modified: 'float | None' = _http_date(entry.header('Last-Modified'))
+        return since is not None and modified is not None and modified <= since
+
+    def age_header(self, entry: 'CachedResponse') -> 'str':
+        return str(int(entry.current_age(now=time())))
+
+    def store(self, url: 'str', headers: 'Message', status: 'int', reason: 'str',
+              response_headers: 'list[tuple[str, str]]', body: 'bytes', request_time: 'float',
+              response_time: 'float') -> 'bool':
+        """ Keep the response to a ``GET`` request if a shared cache may (RFC 9111 section 3). """
+        if len(body) > self.max_object_size or status in (206, 304):
+            return False
+        directives: 'dict[str, str | None]' = parse_cache_control(value=', '.join(
+            value for header, value in response_headers if header.lower() == 'cache-control'))
+        requested: 'dict[str, str | None]' = _request_directives(headers=headers)
+        if 'no-store' in directives or 'no-store' in requested or 'private' in directives:
+            return False
+        if 'Authorization' in headers and not any(
+                directive in directives for directive in ('public', 's-maxage', 'must-revalidate')):
+            return False
+        vary: 'list[str]' = []
+        for header, value in response_headers:
+            lowered: 'str' = header.lower()
+            if lowered == 'set-cookie':
+                # Cookies are for the client that asked, not for everyone behind the proxy
+                return False
+            if lowered == 'vary':
+                vary.extend(name.strip().lower() for name in value.split(',') if name.strip())
+        if '*' in vary:
+            return False
+
+        kept: 'list[tuple[str, str]]' = [(header, value) for header, value in response_headers
+                                         if header.lower() not in _HOP_BY_HOP]
+        if not any(header.lower() == 'date' for header, _ in kept):
+            kept.append(('Date', formatdate(timeval=response_time, usegmt=True)))
+        entry = CachedResponse(status=status, reason=reason, headers=kept, body=body, request_time=request_time,
+                               response_time=response_time,
+                               variant=tuple((name, _normalized(headers=headers, name=name)) for name in sorted(set(vary))),
+                               age_value=_delta(next((value for header, value in response_headers
+                                                      if header.lower() == 'age'), None)))
+        explicit: 'bool' = entry.header('Expires') is not None or \
+            any(directive in directives for directive in ('max-age', 's-maxage', 'public'))
+        if status not in _HEURISTIC_STATUSES and not explicit:
+            return False
+        if not entry.validators and entry.freshness_lifetime(heuristic_fraction=self.heuristic_fraction,
+                                                             heuristic_max=self.heuristic_max) <= 0:
+            # Could neither be served nor revalidated
+            return False
+        self._add(url=url, entry=entry)
+        self.stored += 1
+        return True
+
+    def freshen(self, url: 'str', entry: 'CachedResponse', response_headers: 'list[tuple[str, str]]',
+                request_time: 'float', response_time: 'float') -> 'CachedResponse':
+        """ Update ``entry`` from the headers of a ``304`` revalidating it (RFC 9111 section 4.3.4). """
+        updated: 'set[str]' = {header.lower() for header, _ in response_headers
+                               if header.lower() not in _HOP_BY_HOP and header.lower() != 'content-length'}
+        headers: 'list[tuple[str, str]]' = [(header, value) for header, value in entry.headers
+                                            if header.lower() not in updated]
+        headers.extend((header, value) for header, value in response_headers if header.lower() in updated)
+        fresh = CachedResponse(status=entry.status, reason=entry.reason, headers=headers, body=entry.body,
+                               request_time=request_time, response_time=response_time, variant=entry.variant,
+                               age_value=_delta(next((value for header, value in response_headers
+                                                      if header.lower() == 'age'), None)))
+        self._add(url=url, entry=fresh)
+        return fresh
+
+    def invalidate(self, url: 'str') -> 'None':
+        """ Forget the responses for ``url``, after an unsafe request changed it. """
+        with self._lock:
+            variants: 'list[CachedResponse] | None' = self._memory.pop(url, None)
+            if variants is not None:
+                self.memory_bytes -= sum(variant.size for variant in variants)
+        if self.disk is not None:
+            self.disk.remove(name=self._file_name(url=url))
+
+    def _add(self, url: 'str', entry: 'CachedResponse') -> 'None':
+        with self._lock:
+            variants: 'list[CachedResponse]' = [variant for variant in self._memory.get(url, ())
+                                                if variant.variant != entry.variant]
+            variants.append(entry)
+            variants = variants[-self.max_variants:]
+            self._keep(url=url, variants=variants)
+        if self.disk is not None:
+            self.disk.write(name=self._file_name(url=url), url=url, variants=variants)
+
+    def _keep(self, url: 'str', variants: 'list[CachedResponse]') -> 'None':
+        # Called with the lock held
+        previous: 'list[CachedResponse] | None' = self._memory.pop(url, None)
+        if previous is not None:
+            self.memory_bytes -= sum(variant.size for variant in previous)
+        self._memory[url] = variants
+        self.memory_bytes += sum(variant.size for variant in variants)
+        while self.memory_bytes > self.memory_size and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_bytes -= sum(variant.size for variant in evicted)
+
+    @staticmethod
+    def _file_name(url: 'str') -> 'str':
+        return sha256(url.encode(encoding='utf-8')).hexdigest()
+
+    def close(self) -> 'None':
+        if self.disk is not None:
+            self.disk.close()
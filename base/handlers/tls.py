@@ -0,0 +1,216 @@
+""" Cached SSL contexts for both legs of an intercepted connection """
+
+from calendar import timegm
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from ssl import (PROTOCOL_TLS_SERVER, SSLContext, SSLObject, SSLSession,
+                 SSLSocket, create_default_context)
+from threading import Lock, Thread
+from time import monotonic, strptime, time
+from typing import TYPE_CHECKING
+
+from OpenSSL.crypto import FILETYPE_PEM, load_certificate
+
+from base import logger, startup, tls
+
+if TYPE_CHECKING:
+    from socket import socket
+
+    from .ca import CertificateAuthority
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'ServerContextCache',
+    'ClientSessionCache'
+]
+
+
+class ServerContextCache:
+    """ LRU of ready-to-use server side ``SSLContext`` objects, one per hostname.
+
+    A context is built once from the leaf certificate minted by the
+    ``CertificateAuthority`` and served until the leaf's notAfter. Every
+    context carries an ``sni_callback`` that switches the handshake to the
+    context of the SNI name when the client asks for a different host than
+    the one it sent CONNECT for. The handshake does not wait for a leaf to
+    be minted: until the SNI name's context is ready it is prepared in the
+    background and the CONNECT host's context answers. ``warm`` prepares
+    the contexts of a list of hosts ahead of their first connection.
+    """
+
+    def __init__(self, ca: 'CertificateAuthority', capacity: 'int | None' = None) -> 'None':
+        self.ca = ca
+        self.capacity: 'int' = tls['context_cache_size'] if capacity is None else capacity
+        self.hits = 0
+        self.misses = 0
+        self.warmed = 0
+        self._lock = Lock()
+        self._contexts: 'OrderedDict[str, tuple[float, SSLContext]]' = OrderedDict()
+        self._preparing: 'set[str]' = set()
+
+    def lookup(self, hostname: 'str') -> 'SSLContext | None':
+        """ Return the cached context for ``hostname`` without minting one. """
+        with self._lock:
+            entry = self._contexts.get(hostname)
+            if entry is None or entry[0] <= time():
+                return None
+            self._contexts.move_to_end(hostname)
+            self.hits += 1
+            return entry[1]
+
+    def get(self, hostname: 'str', san: 'list[tuple[str,str]]') -> 'SSLContext':
+        """ Return the context for ``hostname``, minting its leaf certificate if needed. """
+        context = self.lookup(hostname=hostname)
+        if context is not None:
+            return context
+
+        with self._lock:
+            self.misses += 1
+        return self._add(hostname=hostname, san=san)
+
+    def warm(self, hostnames: 'list[str] | None' = None, workers: 'int | None' = None) -> 'Thread | None':
+        """ Prepare the contexts of ``hostnames`` on ``workers`` threads in
+        the background, minting leaf certificates not yet in the CA's cache. """
+        hostnames = startup['warm_hosts'] if hostnames is None else hostnames
+        workers = startup['warm_workers'] if workers is None else workers
+        if not hostnames:
+            return None
+        thread = Thread(target=self._warm, args=(list(hostnames), workers), name='pylogproxy-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def clear(self) -> 'None':
+        with self._lock:
+            self._contexts.clear()
+
+    def _add(self, hostname: 'str', san: 'list[tuple[str,str]]') -> 'SSLContext':
+        not_after, context = self._build(hostname=hostname, san=san)
+        with self._lock:
+            self._contexts[hostname] = (not_after, context)
+            self._contexts.move_to_end(hostname)
+            while len(self._contexts) > self.capacity:
+                self._contexts.popitem(last=False)
+        return context
+
+    def _warm(self, hostnames: 'list[str]', workers: 'int') -> 'None':
+        started: 'float' = monotonic()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pylogproxy-warmup') as pool:
+            prepared: 'int' = sum(pool.map(self._warm_one, hostnames))
+        logger.info(f"Prepared SSL contexts for {prepared} of {len(hostnames)} hosts "
+                    f"in {monotonic() - started:.1f}s")
+
+    def _warm_one(self, hostname: 'str') -> 'bool':
+        try:
+            # No upstream certificate to copy names from, the leaf names the host
+            self._add(hostname=hostname, san=[])
+        except Exception as e:
+            logger.warning(f"Could not prepare SSL context for {hostname}: {e}")
+            return False
+        with self._lock:
+            self.warmed += 1
+        return True
+
+    def _build(self, hostname: 'str', san: 'list[tuple[str,str]]') -> 'tuple[float, SSLContext]':
+        cert: 'str'
+        pem: 'str'
+        cert, pem = self.ca.generate_sign_cert(cn=hostname, san=san)
+
+        context = SSLContext(PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile=cert, keyfile=pem)
+        context.sni_callback = partial(self._select, hostname)
+
+        with open(file=cert, mode='rb') as f:
+            not_after: 'bytes' = load_certificate(type=FILETYPE_PEM, buffer=f.read()).get_notAfter() or b""
+        return timegm(strptime(not_after.decode(encoding='ascii'), '%Y%m%d%H%M%SZ')), context
+
+    def _select(self, hostname: 'str', ssl_socket: 'SSLSocket | SSLObject',
+                server_name: 'str | None', context: 'SSLContext') -> 'None':
+        # Runs inside the handshake, on the event loop with the asyncio engine
+        if server_name and server_name.lower() != hostname.lower():
+            selected: 'SSLContext | None' = self.lookup(hostname=server_name)
+            if selected is not None:
+                ssl_socket.context = selected
+            else:
+                self._prepare_in_background(hostname=server_name)
+
+    def _prepare_in_background(self, hostname: 'str') -> 'None':
+        with self._lock:
+            if hostname in self._preparing:
+                return
+            self._preparing.add(hostname)
+            self.misses += 1
+        Thread(target=self._prepare, args=(hostname,), name='pylogproxy-sni', daemon=True).start()
+
+    def _prepare(self, hostname: 'str') -> 'None':
+        try:
+            self._add(hostname=hostname, san=[('DNS', hostname)])
+        except Exception as e:
+            logger.warning(f"Could not prepare SSL context for {hostname}: {e}")
+        finally:
+            with self._lock:
+                self._preparing.discard(hostname)
+
+
+class ClientSessionCache:
+    """ Shared client side ``SSLContext`` for upstream connections and an LRU
+    of ``SSLSession`` objects keyed by ``(hostname, port)``.
+
+    Loading the CA bundle happens once per server instead of once per
+    connection, and a stored session lets the next connection to the same
+    origin resume with an abbreviated handshake. ``hits`` and ``misses``
+    count session lookups, ``resumed`` the handshakes the origin accepted.
+    """
+
+    def __init__(self, cafile: 'str', capacity: 'int | None' = None) -> 'None':
+        self.context: 'SSLContext' = create_default_context(cafile=cafile)
+        self.capacity: 'int' = tls['session_cache_size'] if capacity is None else capacity
+        self.hits = 0
+        self.misses = 0
+        self.resumed = 0
+        self._lock = Lock()
+        self._sessions: 'OrderedDict[tuple[str, int], SSLSession]' = OrderedDict()
+
+    def wrap_socket(self, sock: 'socket', hostname: 'str', port: 'int') -> 'SSLSocket':
+        """ Wrap ``sock`` for ``hostname``, resuming a cached session if there is one. """
+        ssl_sock = self.context.wrap_socket(sock=sock, server_hostname=hostname,
+                                            session=self.lookup(hostname=hostname, port=port))
+        if ssl_sock.session_reused:
+            with self._lock:
+                self.resumed += 1
+        return ssl_sock
+
+    def lookup(self, hostname: 'str', port: 'int') -> 'SSLSession | None':
+        with self._lock:
+            session = self._sessions.get((hostname, port))
+            if session is not None and session.time + session.timeout <= time():
+                del self._sessions[(hostname, port)]
+                session = None
+            if session is None:
+                self.misses += 1
+                return None
+            self._sessions.move_to_end((hostname, port))
+            self.hits += 1
+            return session
+
+    def store(self, hostname: 'str', port: 'int', ssl_sock: 'SSLSocket') -> 'None':
+        """ Remember the session of ``ssl_sock``. With TLS 1.3 the ticket only
+        arrives after the handshake, so call this once data has been read. """
+        session = ssl_sock.session
+        if session is None:
+            return
+        with self._lock:
+            self._sessions[(hostname, port)] = session
+            self._sessions.move_to_end((hostname, port))
+            while len(self._sessions) > self.capacity:
+                self._sessions.popitem(last=False)
+
+    def clear(self) -> 'None':
+        with self._lock:
+            self._sessions.clear()
@@ -1,7 +1,16 @@
-from socketserver import ThreadingMixIn
+from asyncio import (AbstractEventLoop, Event, StreamReader, StreamWriter,
+                     get_running_loop, run, start_server)
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
+from base import app
+
+from ..handlers.connection_pool import AsyncUpstreamConnectionPool
 from .proxy_server import BaseProxyServer
 
+if TYPE_CHECKING:
+    from ..handlers.async_request_handler import AsyncProxyRequestHandler
+
 __author__ = 'Rushirajsinh Chudasama'
 __copyright__ = 'Copyright 2025, PyLogProxy Project'
 __credits__ = ['Rushirajsinh Chudasama']
@@ -14,5 +23,48 @@ __all__ = [
 ]
 
 
-class AsyncBaseProxyServer(ThreadingMixIn, BaseProxyServer):
-    pass
+class AsyncBaseProxyServer(BaseProxyServer):
+    """ Proxy server serving every client connection from one asyncio event loop.
+
+    The listening socket is still bound by ``HTTPServer``; ``serve_forever``
+    hands it to ``asyncio.start_server`` and each connection becomes a task
+    running ``RequestHandlerClass.handle``. Blocking plugin work runs on a
+    bounded thread pool installed as the loop's default executor.
+    """
+
+    connection_pool_class = AsyncUpstreamConnectionPool
+    keep_alive = True
+
+    def __init__(self, server_address: 'tuple[str,int]',
+                 RequestHandlerClass: 'type[AsyncProxyRequestHandler]',
+                 bind_and_activate: 'bool'):
+        BaseProxyServer.__init__(self, server_address,
+                                 RequestHandlerClass,  # type:ignore
+                                 bind_and_activate)
+        self._loop: 'AbstractEventLoop | None' = None
+        self._shutdown_request: 'Event | None' = None
+
+    def serve_forever(self, poll_interval: 'float' = 0.5) -> 'None':
+        run(self.serve())
+
+    async def serve(self) -> 'None':
+        self._loop = get_running_loop()
+        self._loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=app['executor_workers'], thread_name_prefix='pylogproxy'))
+        self._shutdown_request = Event()
+
+        server = await start_server(self._handle_client, sock=self.socket)
+        try:
+            async with server:
+                await self._shutdown_request.wait()
+        finally:
+            # Pooled streams can only be closed while their loop runs
+            self.upstream_pool.clear()
+
+    async def _handle_client(self, reader: 'StreamReader', writer: 'StreamWriter') -> 'None':
+        handler = self.RequestHandlerClass(reader, writer, self)  # type:ignore
+        await handler.handle()
+
+    def shutdown(self) -> 'None':
+        if self._loop is not None and self._shutdown_request is not None:
+            self._loop.call_soon_threadsafe(self._shutdown_request.set)
@@ -0,0 +1,58 @@
+""" Local HTTP endpoint serving the proxy's metrics """
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any
+
+    from ..handlers.metrics import Metrics
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'MetricsServer'
+]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    server: 'MetricsServer'  # type:ignore
+
+    def do_GET(self) -> 'None':
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(code=404)
+            return
+        body: 'bytes' = self.server.metrics.render().encode(encoding='utf-8')
+        self.send_response(code=200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: 'str', *args: 'Any') -> 'None':
+        # Scrapes are not worth an access line each
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """ Serves ``metrics.render()`` on ``/metrics`` from a daemon thread. """
+
+    daemon_threads = True
+
+    def __init__(self, server_address: 'tuple[str, int]', metrics: 'Metrics') -> 'None':
+        ThreadingHTTPServer.__init__(self, server_address, _MetricsHandler)
+        self.metrics = metrics
+        self._thread = Thread(target=self.serve_forever, name='pylogproxy-metrics', daemon=True)
+        self._thread.start()
+
+    def server_close(self) -> 'None':
+        self.shutdown()
+        self._thread.join()
+        ThreadingHTTPServer.server_close(self)
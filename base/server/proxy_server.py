@@ -1,16 +1,30 @@
 from http.server import HTTPServer
 from typing import TYPE_CHECKING
 
+from base import logger, metrics
+from plugins.dispatch import InterceptorDispatch
 from plugins.interceptor import (InterceptorPlugin,
                                  InvalidInterceptorPluginException,
                                  RequestInterceptorPlugin,
                                  ResponseInterceptorPlugin)
+from plugins.observer import ObserverPool
 
 from ..handlers.ca import CertificateAuthority
+from ..handlers.capture import CaptureWriter
+from ..handlers.connection_pool import UpstreamConnectionPool
+from ..handlers.memory_budget import MemoryBudget
+from ..handlers.metrics import Metrics
+from ..handlers.passthrough import BypassList, TunnelStats
 from ..handlers.request_handler import ProxyRequestHandler
+from ..handlers.resolver import Resolver
+from ..handlers.response_cache import ResponseCache
+from ..handlers.tls import ClientSessionCache, ServerContextCache
+from .metrics_server import MetricsServer
 
 if TYPE_CHECKING:
-    from typing import Any
+    from typing import Any, Callable, Iterator
+
+    from ..handlers.metrics import Sample
 
 __author__ = 'Rushirajsinh Chudasama'
 __copyright__ = 'Copyright 2025, PyLogProxy Project'
@@ -25,15 +39,44 @@ __all__ = [
 
 
 class BaseProxyServer(HTTPServer):
+
+    connection_pool_class: 'type[UpstreamConnectionPool]' = UpstreamConnectionPool
+    # Swapped by the supervisor so that worker processes share its writer
+    capture_writer_class: 'Callable[[], CaptureWriter]' = CaptureWriter
+    # metrics.port if None
+    metrics_port: 'int | None' = None
+    # One connection is served at a time, an idle keep-alive client would
+    # hold up every other one
+    keep_alive: 'bool' = False
+
     def __init__(self, server_address: 'tuple[str,int]',
                  RequestHandlerClass: 'type[ProxyRequestHandler]',
                  bind_and_activate: 'bool'):
         HTTPServer.__init__(self, server_address,
                             RequestHandlerClass,  # type:ignore
                             bind_and_activate)
-        self.ca = CertificateAuthority()
+        self.metrics = Metrics()
+        self.ca = CertificateAuthority(metrics=self.metrics)
+        self.capture = self.capture_writer_class()
+        self.tls_contexts = ServerContextCache(ca=self.ca)
+        self.tls_contexts.warm()
+        self.tls_sessions = ClientSessionCache(cafile=RequestHandlerClass.ca_file)
+        self.upstream_pool = self.connection_pool_class()
+        self.memory_budget = MemoryBudget()
+        self.resolver = Resolver()
+        self.response_cache = ResponseCache()
+        self.passthrough = BypassList()
+        self.tunnels = TunnelStats()
         self.res_plugins: 'list[type[ResponseInterceptorPlugin]]' = []
         self.req_plugins: 'list[type[RequestInterceptorPlugin]]' = []
+        self.interceptors = InterceptorDispatch()
+        self.observers = ObserverPool()
+        self.metrics_server: 'MetricsServer | None' = None
+        if self.metrics:
+            self.metrics.collect(collector=self._collect_metrics)
+            port: 'int' = metrics['port'] if self.metrics_port is None else self.metrics_port
+            self.metrics_server = MetricsServer(server_address=(metrics['host'], port),
+                                                metrics=self.metrics)
 
     def register_interceptor(self, interceptor_class: 'Any'):
         if not issubclass(interceptor_class, InterceptorPlugin):
@@ -43,3 +86,61 @@ class BaseProxyServer(HTTPServer):
             self.req_plugins.append(interceptor_class)
         if issubclass(interceptor_class, ResponseInterceptorPlugin):
             self.res_plugins.append(interceptor_class)
+        self.interceptors.register(interceptor=interceptor_class(server=self))
+
+    def _collect_metrics(self) -> 'Iterator[Sample]':
+        yield 'tls_context_cache_total', 'counter', {'result': 'hit'}, self.tls_contexts.hits
+        yield 'tls_context_cache_total', 'counter', {'result': 'miss'}, self.tls_contexts.misses
+        yield 'tls_contexts_warmed_total', 'counter', {}, self.tls_contexts.warmed
+        yield 'ca_ready', 'gauge', {}, int(self.ca.ready)
+        yield 'tls_session_cache_total', 'counter', {'result': 'hit'}, self.tls_sessions.hits
+        yield 'tls_session_cache_total', 'counter', {'result': 'miss'}, self.tls_sessions.misses
+        yield 'tls_sessions_resumed_total', 'counter', {}, self.tls_sessions.resumed
+        yield 'dns_cache_total', 'counter', {'result': 'hit'}, self.resolver.hits
+        yield 'dns_cache_total', 'counter', {'result': 'miss'}, self.resolver.misses
+        yield 'dns_failures_total', 'counter', {}, self.resolver.failures
+        if self.memory_budget:
+            yield 'memory_budget_bytes', 'gauge', {'state': 'used'}, self.memory_budget.used
+            yield 'memory_budget_bytes', 'gauge', {'state': 'peak'}, self.memory_budget.peak
+            yield 'memory_budget_bytes', 'gauge', {'state': 'limit'}, self.memory_budget.limit
+            yield 'memory_budget_waits_total', 'counter', {}, self.memory_budget.waits
+            yield 'memory_budget_overcommits_total', 'counter', {}, self.memory_budget.overcommits
+            yield 'body_spills_total', 'counter', {}, self.memory_budget.spills
+        if self.response_cache:
+            yield from self._collect_metrics_response_cache()
+        yield 'tunnels_total', 'counter', {}, self.tunnels.tunnels
+        yield 'tunnels_active', 'gauge', {}, self.tunnels.active
+        yield 'tunnel_bytes_total', 'counter', {'direction': 'up'}, self.tunnels.bytes_up
+        yield 'tunnel_bytes_total', 'counter', {'direction': 'down'}, self.tunnels.bytes_down
+        yield 'captures_total', 'counter', {'result': 'written'}, self.capture.written
+        yield 'captures_total', 'counter', {'result': 'dropped'}, self.capture.dropped
+        yield 'observer_queue_depth', 'gauge', {}, self.observers.depth
+        yield 'observer_exchanges_total', 'counter', {'result': 'dropped'}, self.observers.dropped
+        yield 'observer_exchanges_total', 'counter', {'result': 'failed'}, self.observers.failed
+
+    def _collect_metrics_response_cache(self) -> 'Iterator[Sample]':
+        cache: 'ResponseCache' = self.response_cache
+        yield 'response_cache_total', 'counter', {'result': 'hit'}, cache.hits
+        yield 'response_cache_total', 'counter', {'result': 'revalidated'}, cache.revalidated
+        yield 'response_cache_total', 'counter', {'result': 'miss'}, cache.misses
+        yield 'response_cache_hit_ratio', 'gauge', {}, cache.hit_ratio
+        yield 'response_cache_bytes_saved_total', 'counter', {}, cache.bytes_saved
+        yield 'response_cache_stored_total', 'counter', {}, cache.stored
+        yield 'response_cache_size_bytes', 'gauge', {'tier': 'memory'}, cache.memory_bytes
+        if cache.disk is not None:
+            yield 'response_cache_size_bytes', 'gauge', {'tier': 'disk'}, cache.disk.size
+
+    def server_close(self) -> 'None':
+        HTTPServer.server_close(self)
+        if self.metrics_server is not None:
+            self.metrics_server.server_close()
+        self.upstream_pool.clear()
+        self.tls_sessions.clear()
+        self.observers.close()
+        self.capture.close()
+        if self.response_cache:
+            cache: 'ResponseCache' = self.response_cache
+            logger.info(f"Response cache answered {cache.hit_ratio:.1%} of cacheable requests, "
+                        f"{cache.hits} hits, {cache.revalidated} revalidated, {cache.misses} misses, "
+                        f"{cache.bytes_saved} bytes saved")
+            cache.close()
@@ -0,0 +1,178 @@
+""" Multi-process serving of one proxy address """
+
+from functools import partial
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+from signal import SIGTERM, signal
+from socket import SO_REUSEPORT, SOL_SOCKET, socket
+from threading import Event, Thread
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from base import app, logger, metrics, request_log, supervisor
+
+from ..handlers.ca import CertificateAuthority
+from ..handlers.capture import CaptureForwarder, CaptureWriter
+
+if TYPE_CHECKING:
+    from multiprocessing.context import SpawnProcess
+    from multiprocessing.queues import Queue as ProcessQueue
+    from typing import Any
+
+    from ..handlers.capture import CaptureEntry
+    from .proxy_server import BaseProxyServer
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'WorkerSupervisor'
+]
+
+
+def _serve_worker(proxy_class: 'type[BaseProxyServer]', server_address: 'tuple[str, int]',
+                  queue: 'ProcessQueue[CaptureEntry | None]', slot: 'int') -> 'None':
+    proxy_class.allow_reuse_port = True
+    proxy_class.metrics_port = metrics['port'] + slot
+    proxy_class.capture_writer_class = partial(CaptureForwarder, queue=queue)
+    proxy: 'BaseProxyServer' = proxy_class(server_address=server_address)  # type:ignore
+
+    # shutdown waits for serve_forever to return, so it can not run on the
+    # thread the signal interrupted
+    def stop(signum: 'int', frame: 'Any') -> 'None':
+        Thread(target=proxy.shutdown, name='pylogproxy-shutdown', daemon=True).start()
+
+    signal(SIGTERM, stop)
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.server_close()
+
+
+class WorkerSupervisor:
+    """ Serves ``proxy_class`` from ``workers`` processes bound to the same
+    address with ``SO_REUSEPORT``, the kernel spreads connections over them.
+
+    Workers are spawned fresh, so each has its own interpreter, GIL, TLS
+    context cache and upstream pool. The certificate authority is created
+    here once, a missing one while the first workers start up and wait for
+    it behind the CA's lock file; leaf certificates are shared
+    through ``cache.dir``, whose lock files keep workers from minting the
+    same host twice. Capture records are forwarded to the supervisor's
+    ``CaptureWriter``; metrics are served by every worker on
+    ``metrics.port`` plus its slot. A worker that exits on its own is
+    restarted after ``restart_delay`` seconds, doubled for every crash
+    within ``max_restart_delay`` seconds of its start. Stopping workers get
+    ``stop_timeout`` seconds to close before they are killed.
+    """
+
+    def __init__(self, proxy_class: 'type[BaseProxyServer]',
+                 server_address: 'tuple[str, int] | None' = None, workers: 'int | None' = None,
+                 restart_delay: 'float | None' = None, max_restart_delay: 'float | None' = None,
+                 stop_timeout: 'float | None' = None) -> 'None':
+        server_address = (app['host'], app['port']) if server_address is None else server_address
+        workers = supervisor['workers'] if workers is None else workers
+        restart_delay = supervisor['restart_delay'] if restart_delay is None else restart_delay
+        max_restart_delay = supervisor['max_restart_delay'] if max_restart_delay is None else max_restart_delay
+        stop_timeout = supervisor['stop_timeout'] if stop_timeout is None else stop_timeout
+        if workers < 1:
+            raise ValueError(f'Expected at least one worker got {workers}')
+        self.proxy_class = proxy_class
+        self.workers = workers
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stop_timeout = stop_timeout
+        self.restarts = 0
+
+        # Resolves port 0 once for every worker, never listens itself
+        self.socket = socket()
+        self.socket.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+        self.socket.bind(server_address)
+        self.server_address: 'tuple[str, int]' = self.socket.getsockname()[:2]
+
+        CertificateAuthority()
+        self.capture = CaptureWriter()
+        self._context = get_context('spawn')
+        self._queue: 'ProcessQueue[CaptureEntry | None]' = self._context.Queue(maxsize=request_log['queue_size'])
+        self._collector = Thread(target=self._collect, name='pylogproxy-capture-collector', daemon=True)
+        self._collector.start()
+        self._processes: 'list[SpawnProcess | None]' = [None] * workers
+        self._started: 'list[float]' = [0.0] * workers
+        self._failures: 'list[int]' = [0] * workers
+        self._shutdown_request = Event()
+
+    def serve_forever(self, poll_interval: 'float' = 0.5) -> 'None':
+        """ Start the workers and keep them running until ``shutdown``. """
+        restart_at: 'dict[int, float]' = {slot: 0.0 for slot in range(self.workers)}
+        try:
+            while not self._shutdown_request.is_set():
+                now: 'float' = monotonic()
+                for slot, due in list(restart_at.items()):
+                    if due <= now:
+                        del restart_at[slot]
+                        self._start(slot=slot)
+
+                running: 'list[SpawnProcess]' = [p for p in self._processes if p is not None]
+                wait([p.sentinel for p in running], timeout=poll_interval)
+                for slot, process in enumerate(self._processes):
+                    if process is None or process.is_alive() or self._shutdown_request.is_set():
+                        continue
+                    self._processes[slot] = None
+                    restart_at[slot] = monotonic() + self._backoff(slot=slot)
+                    self.restarts += 1
+                    logger.error(f"Proxy worker {process.pid} exited with {process.exitcode}, "
+                                 f"restarting in {restart_at[slot] - monotonic():.1f}s")
+        finally:
+            self._stop_workers()
+
+    def shutdown(self) -> 'None':
+        self._shutdown_request.set()
+
+    def server_close(self) -> 'None':
+        self._stop_workers()
+        self.socket.close()
+        self._queue.put(None)
+        self._collector.join()
+        self.capture.close()
+
+    def _start(self, slot: 'int') -> 'None':
+        process: 'SpawnProcess' = self._context.Process(
+            target=_serve_worker, args=(self.proxy_class, self.server_address, self._queue, slot),
+            name=f'pylogproxy-worker-{slot}', daemon=True)
+        process.start()
+        self._processes[slot] = process
+        self._started[slot] = monotonic()
+
+    def _backoff(self, slot: 'int') -> 'float':
+        if monotonic() - self._started[slot] >= self.max_restart_delay:
+            self._failures[slot] = 0
+        delay: 'float' = min(self.restart_delay * 2 ** self._failures[slot], self.max_restart_delay)
+        self._failures[slot] += 1
+        return delay
+
+    def _stop_workers(self) -> 'None':
+        running: 'list[SpawnProcess]' = [p for p in self._processes if p is not None]
+        self._processes = [None] * self.workers
+        for process in running:
+            process.terminate()
+        deadline: 'float' = monotonic() + self.stop_timeout
+        for process in running:
+            process.join(timeout=max(deadline - monotonic(), 0))
+            if process.is_alive():
+                logger.error(f"Proxy worker {process.pid} did not stop in time, killing it")
+                process.kill()
+                process.join()
+
+    def _collect(self) -> 'None':
+        while True:
+            item: 'CaptureEntry | None' = self._queue.get()
+            if item is None:
+                return
+            meta, request_body, response_body = item
+            self.capture.submit(meta=meta, request_body=request_body, response_body=response_body)
@@ -0,0 +1,434 @@
+""" Reproducible local load benchmark for the proxy engines """
+
+from argparse import ArgumentParser, Namespace
+from gzip import compress as gzip_compress
+from http.client import HTTPConnection, HTTPSConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from json import dumps, load
+from multiprocessing import get_context
+from os import cpu_count, listdir, makedirs, path, unlink
+from platform import platform, python_version
+from signal import SIGTERM, signal
+from ssl import PROTOCOL_TLS_SERVER, SSLContext, create_default_context
+from sys import stderr, stdout
+from tempfile import gettempdir
+from threading import Event, Thread
+from time import perf_counter, sleep, time
+from typing import TYPE_CHECKING, NamedTuple
+
+from brotli import compress as brotli_compress  # type:ignore
+
+from base import ssl_certificate_file
+
+if TYPE_CHECKING:
+    from multiprocessing.context import SpawnContext, SpawnProcess
+    from multiprocessing.queues import Queue as ProcessQueue
+    from typing import IO, Any
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+
+# Deterministic payloads, the same bytes on every run
+_PAYLOAD: 'bytes' = bytes(range(256)) * 4096
+_TEXT: 'bytes' = b"".join(b'{"id": %d, "name": "item-%d", "tags": ["a", "b", "c"]}\n' % (i, i) for i in range(16384))
+
+
+class Scenario(NamedTuple):
+    """ One load pattern; ``requests`` and ``concurrency`` are defaults
+    scaled by the command line. """
+
+    name: 'str'
+    method: 'str'
+    path: 'str'
+    tls: 'bool' = False
+    body_size: 'int' = 0
+    requests: 'int' = 2000
+    concurrency: 'int' = 16
+    # Distinct CONNECT targets, each request opens a new tunnel when > 1
+    hosts: 'int' = 1
+    headers: 'tuple[tuple[str, str], ...]' = ()
+
+
+SCENARIOS: 'dict[str, Scenario]' = {scenario.name: scenario for scenario in (
+    Scenario(name='small_get', method='GET', path='/bytes/256'),
+    Scenario(name='small_get_tls', method='GET', path='/bytes/256', tls=True),
+    Scenario(name='large_download', method='GET', path='/bytes/16777216', requests=64, concurrency=4),
+    Scenario(name='upload', method='POST', path='/upload', body_size=1048576, requests=256, concurrency=8),
+    Scenario(name='gzip', method='GET', path='/gzip', requests=500, headers=(('Accept-Encoding', 'gzip'),)),
+    Scenario(name='brotli', method='GET', path='/br', requests=500, headers=(('Accept-Encoding', 'br'),)),
+    Scenario(name='many_hosts', method='GET', path='/bytes/256', tls=True, requests=512, concurrency=16, hosts=64),
+    Scenario(name='high_concurrency', method='GET', path='/bytes/256', requests=8000, concurrency=256),
+)}
+
+
+class _OriginHandler(BaseHTTPRequestHandler):
+    """ Origin stand-in: ``/bytes/<n>``, ``/upload``, ``/gzip`` and ``/br``. """
+
+    protocol_version = 'HTTP/1.1'
+    # Head and body are written separately, do not let Nagle hold the body back
+    disable_nagle_algorithm = True
+    encoded: 'dict[str, tuple[str, bytes]]' = {}
+
+    def do_GET(self) -> 'None':
+        if self.path.startswith('/bytes/'):
+            size: 'int' = int(self.path[len('/bytes/'):])
+            self._reply(headers={'Content-Type': 'application/octet-stream', 'Content-Length': str(size)})
+            view = memoryview(_PAYLOAD)
+            while size > 0:
+                self.wfile.write(view[:min(size, len(view))])
+                size -= len(view)
+        elif self.path in self.encoded:
+            encoding, body = self.encoded[self.path]
+            self._reply(headers={'Content-Type': 'application/json', 'Content-Encoding': encoding,
+                                 'Content-Length': str(len(body))})
+            self.wfile.write(body)
+        else:
+            self.send_error(code=404)
+
+    def do_POST(self) -> 'None':
+        remaining: 'int' = int(self.headers.get('Content-Length', 0))
+        received: 'int' = 0
+        while remaining > 0:
+            data: 'bytes' = self.rfile.read(min(remaining, 65536))
+            if not data:
+                break
+            remaining -= len(data)
+            received += len(data)
+        body: 'bytes' = str(received).encode(encoding='ascii')
+        self._reply(headers={'Content-Type': 'text/plain', 'Content-Length': str(len(body))})
+        self.wfile.write(body)
+
+    def _reply(self, headers: 'dict[str, str]') -> 'None':
+        self.send_response(code=200)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.end_headers()
+
+    def log_message(self, format: 'str', *args: 'Any') -> 'None':
+        pass
+
+
+class _OriginServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def _stop_on_sigterm(server: 'Any') -> 'None':
+    # shutdown waits for serve_forever, it can not run on the interrupted thread
+    signal(SIGTERM, lambda signum, frame: Thread(target=server.shutdown, daemon=True).start())
+
+
+def _serve_origin(cert: 'str', key: 'str', hosts: 'list[str]', ready: 'ProcessQueue[Any]') -> 'None':
+    _OriginHandler.encoded = {'/gzip': ('gzip', gzip_compress(_TEXT, compresslevel=6)),
+                              '/br': ('br', brotli_compress(_TEXT, quality=5))}
+    context = SSLContext(PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile=cert, keyfile=key)
+
+    plain = _OriginServer((hosts[0], 0), _OriginHandler)
+    servers: 'list[_OriginServer]' = [plain]
+    tls_port: 'int' = 0
+    for host in hosts:
+        server = _OriginServer((host, tls_port), _OriginHandler)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        tls_port = server.server_address[1]
+        servers.append(server)
+    for server in servers[1:]:
+        Thread(target=server.serve_forever, daemon=True).start()
+    _stop_on_sigterm(server=plain)
+    ready.put((plain.server_address[1], tls_port))
+    plain.serve_forever()
+
+
+def _serve_proxy(engine: 'str', workdir: 'str', origin_ca: 'str', ready: 'ProcessQueue[Any]') -> 'None':
+    # Defaults of the proxy modules are bound when they are imported, point
+    # the CA and the capture store at the work directory first.
+    import base
+    base.cache['dir'] = path.join(workdir, 'proxy-ca')
+    base.request_log['dir'] = path.join(workdir, 'captures')
+    # One access line per request on stdout would be measured too
+    base.logger.setLevel('WARNING')
+    from proxies.logging_proxy import AsyncLoggingProxy, LoggingProxy
+
+    proxy_class: 'type[LoggingProxy | AsyncLoggingProxy]' = AsyncLoggingProxy if engine == 'async' else LoggingProxy
+    # Deep listen backlog so the high concurrency scenario measures the proxy, not SYN retries
+    proxy_class.request_queue_size = 1024
+    proxy = proxy_class(server_address=('127.0.0.1', 0))
+    proxy.tls_sessions.context.load_verify_locations(cafile=origin_ca)
+    _stop_on_sigterm(server=proxy)
+    # Clients trust the proxy CA from its file, which a first start writes in the background
+    proxy.ca.wait()
+    ready.put(proxy.server_address[1])
+    try:
+        proxy.serve_forever()
+    finally:
+        proxy.server_close()
+
+
+class _ProcessStats:
+    """ Peak resident memory and open file descriptors of a process, read
+    from ``/proc``; both stay ``None`` where it does not exist. """
+
+    def __init__(self, pid: 'int', interval: 'float' = 0.05) -> 'None':
+        self.pid = pid
+        self.interval = interval
+        self.peak_fds: 'int | None' = None
+        self._stop = Event()
+        self._thread = Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def peak_rss_kb(self) -> 'int | None':
+        try:
+            with open(file=f'/proc/{self.pid}/status', mode='r', encoding='ascii') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return None
+
+    def stop(self) -> 'None':
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self) -> 'None':
+        while not self._stop.wait(timeout=self.interval):
+            try:
+                fds: 'int' = len(listdir(f'/proc/{self.pid}/fd'))
+            except OSError:
+                return
+            self.peak_fds = fds if self.peak_fds is None else max(self.peak_fds, fds)
+
+
+class _Target(NamedTuple):
+    proxy_port: 'int'
+    plain_port: 'int'
+    tls_port: 'int'
+    hosts: 'list[str]'
+    client_ca: 'str'
+    timeout: 'float'
+
+
+def _percentile(values: 'list[float]', fraction: 'float') -> 'float':
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run_scenario(scenario: 'Scenario', target: '_Target') -> 'dict[str, Any]':
+    """ Drive ``scenario`` through the proxy from ``scenario.concurrency``
+    client threads, each on its own keep-alive connection. """
+    body: 'bytes' = (_PAYLOAD * (scenario.body_size // len(_PAYLOAD) + 1))[:scenario.body_size]
+    headers: 'dict[str, str]' = dict(scenario.headers)
+    if body:
+        headers['Content-Type'] = 'application/octet-stream'
+    client_context = create_default_context(cafile=target.client_ca)
+    tickets = count()
+    latencies: 'list[list[float]]' = [[] for _ in range(scenario.concurrency)]
+    errors: 'list[str]' = []
+    received: 'list[int]' = [0] * scenario.concurrency
+
+    def connect(host: 'str') -> 'HTTPConnection':
+        if not scenario.tls:
+            return HTTPConnection('127.0.0.1', target.proxy_port, timeout=target.timeout)
+        conn = HTTPSConnection('127.0.0.1', target.proxy_port, timeout=target.timeout, context=client_context)
+        conn.set_tunnel(host, target.tls_port)
+        return conn
+
+    def client(slot: 'int') -> 'None':
+        conn: 'HTTPConnection | None' = None
+        while (ticket := next(tickets)) < scenario.requests:
+            host: 'str' = target.hosts[ticket % scenario.hosts]
+            url: 'str' = scenario.path if scenario.tls else f'http://{host}:{target.plain_port}{scenario.path}'
+            started: 'float' = perf_counter()
+            try:
+                if conn is None or scenario.hosts > 1:
+                    if conn is not None:
+                        conn.close()
+                    conn = connect(host=host)
+                conn.request(scenario.method, url, body=body or None, headers=headers)
+                response = conn.getresponse()
+                size: 'int' = len(response.read())
+                if response.status != 200:
+                    raise ValueError(f'HTTP {response.status}')
+            except Exception as e:
+                errors.append(f'{type(e).__name__}: {e}')
+                if conn is not None:
+                    conn.close()
+                conn = None
+                continue
+            latencies[slot].append(perf_counter() - started)
+            received[slot] += size
+        if conn is not None:
+            conn.close()
+
+    threads: 'list[Thread]' = [Thread(target=client, args=(slot,), daemon=True) for slot in range(scenario.concurrency)]
+    started: 'float' = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed: 'float' = perf_counter() - started
+
+    ordered: 'list[float]' = sorted(latency for slot in latencies for latency in slot)
+    return {
+        'requests': len(ordered),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        'mb_per_s': round(sum(received) / elapsed / 1048576, 2) if elapsed else 0.0,
+        'p50_ms': round(_percentile(ordered, 0.50) * 1000, 3),
+        'p99_ms': round(_percentile(ordered, 0.99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+    }
+
+
+def _clear_leaf_certificates(directory: 'str') -> 'None':
+    # Every scenario starts with a cold leaf cache, the CA itself is kept
+    if not path.isdir(directory):
+        return
+    for name in listdir(directory):
+        if name.startswith(('.pylogp_', '.pycrt_')):
+            unlink(path.join(directory, name))
+
+
+def _start(context: 'SpawnContext', target: 'Any', args: 'tuple[Any, ...]',
+           timeout: 'float') -> 'tuple[SpawnProcess, Any]':
+    ready: 'ProcessQueue[Any]' = context.Queue()
+    process: 'SpawnProcess' = context.Process(target=target, args=args + (ready,), daemon=True)
+    process.start()
+    return process, ready.get(timeout=timeout)
+
+
+def _stop(process: 'SpawnProcess') -> 'None':
+    process.terminate()
+    process.join(timeout=10)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+def run(args: 'Namespace') -> 'dict[str, Any]':
+    from base.handlers.ca import CertificateAuthority
+
+    makedirs(name=args.workdir, exist_ok=True)
+    hosts: 'list[str]' = [f'127.0.0.{i}' for i in range(1, max(s.hosts for s in SCENARIOS.values()) + 1)]
+    origin_ca = CertificateAuthority(cache_dir=path.join(args.workdir, 'origin-ca'))
+    cert, key = origin_ca.generate_sign_cert(
+        cn='localhost', san=[('DNS', 'localhost')] + [('IP Address', host) for host in hosts])
+
+    context: 'SpawnContext' = get_context('spawn')
+    origin, (plain_port, tls_port) = _start(context=context, target=_serve_origin,
+                                            args=(cert, key, hosts), timeout=60)
+    results: 'dict[str, Any]' = {}
+    try:
+        for engine in args.engine:
+            results[engine] = {}
+            for name in args.scenario:
+                scenario: 'Scenario' = SCENARIOS[name]._replace(
+                    requests=max(int(SCENARIOS[name].requests * args.scale), 1),
+                    concurrency=args.concurrency or SCENARIOS[name].concurrency)
+                _clear_leaf_certificates(directory=path.join(args.workdir, 'proxy-ca'))
+                # The first start may generate the proxy CA, allow for that
+                started: 'float' = perf_counter()
+                proxy, proxy_port = _start(context=context, target=_serve_proxy,
+                                           args=(engine, args.workdir, origin_ca.crt_file), timeout=300)
+                startup_ms: 'float' = (perf_counter() - started) * 1000
+                stats = _ProcessStats(pid=proxy.pid)  # type:ignore
+                target = _Target(proxy_port=proxy_port, plain_port=plain_port, tls_port=tls_port, hosts=hosts,
+                                 client_ca=path.join(args.workdir, 'proxy-ca',
+                                                     ssl_certificate_file['certificate_name']),
+                                 timeout=args.timeout)
+                try:
+                    if args.warmup:
+                        run_scenario(scenario=scenario._replace(requests=scenario.concurrency), target=target)
+                    result: 'dict[str, Any]' = run_scenario(scenario=scenario, target=target)
+                    sleep(stats.interval * 2)
+                    result['peak_rss_kb'] = stats.peak_rss_kb()
+                finally:
+                    stats.stop()
+                    _stop(process=proxy)
+                result['peak_fds'] = stats.peak_fds
+                result['startup_ms'] = round(startup_ms, 3)
+                result['concurrency'] = scenario.concurrency
+                results[engine][name] = result
+                stderr.write(f"{engine:<8} {name:<18} {result['rps']:>10.1f} rps  p50 {result['p50_ms']:>9.3f} ms  "
+                             f"p99 {result['p99_ms']:>9.3f} ms  rss {result['peak_rss_kb']} kB  "
+                             f"fds {result['peak_fds']}  errors {result['errors']}\n")
+    finally:
+        _stop(process=origin)
+
+    return {
+        'meta': {
+            'time': time(),
+            'python': python_version(),
+            'platform': platform(),
+            'cpus': cpu_count(),
+            'scale': args.scale,
+            'warmup': args.warmup,
+        },
+        'results': results,
+    }
+
+
+def compare(report: 'dict[str, Any]', baseline: 'dict[str, Any]', tolerance: 'float', out: 'IO[str]') -> 'bool':
+    """ Print the change of every shared result against ``baseline``; tell
+    whether throughput or p99 latency got worse by more than ``tolerance`` percent. """
+    regressed = False
+    for engine, scenarios in report['results'].items():
+        for name, result in scenarios.items():
+            before: 'dict[str, Any] | None' = baseline.get('results', {}).get(engine, {}).get(name)
+            if not before:
+                continue
+            rps: 'float' = (result['rps'] / before['rps'] - 1) * 100 if before['rps'] else 0.0
+            p99: 'float' = (result['p99_ms'] / before['p99_ms'] - 1) * 100 if before['p99_ms'] else 0.0
+            worse: 'bool' = rps < -tolerance or p99 > tolerance
+            regressed = regressed or worse
+            out.write(f"{engine:<8} {name:<18} rps {rps:+7.1f}%  p99 {p99:+7.1f}%{'  REGRESSION' if worse else ''}\n")
+    return regressed
+
+
+def main(argv: 'list[str] | None' = None) -> 'None':
+    parser = ArgumentParser(description='Benchmark the proxy against a local origin and report JSON results. '
+                                        'The sync engine serves one connection at a time, concurrent '
+                                        'clients queue behind each other there.')
+    parser.add_argument('--engine', action='append', choices=('async', 'sync'),
+                        help='proxy engine, repeatable (default: async)')
+    parser.add_argument('--scenario', action='append', choices=tuple(SCENARIOS),
+                        help='scenario to run, repeatable (default: all)')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every request count (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, help='client connections, overriding the scenario default')
+    parser.add_argument('--timeout', type=float, default=30.0, help='client socket timeout (default: %(default)s)')
+    parser.add_argument('--warmup', action='store_true', help='send one request per client before measuring')
+    parser.add_argument('--workdir', default=path.join(gettempdir(), 'pylogproxy-bench'),
+                        help='CA, certificates and captures of the run (default: %(default)s)')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=10.0,
+                        help='percent change tolerated against the baseline (default: %(default)s)')
+    args: 'Namespace' = parser.parse_args(argv)
+    args.engine = args.engine or ['async']
+    args.scenario = args.scenario or list(SCENARIOS)
+
+    report: 'dict[str, Any]' = run(args=args)
+    if args.output:
+        with open(file=args.output, mode='w', encoding='utf-8') as out:
+            out.write(dumps(report, indent=2))
+    else:
+        stdout.write(dumps(report, indent=2) + '\n')
+
+    if args.baseline:
+        with open(file=args.baseline, mode='r', encoding='utf-8') as f:
+            baseline: 'dict[str, Any]' = load(f)
+        if compare(report=report, baseline=baseline, tolerance=args.tolerance, out=stderr):
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+""" Incremental content codecs with decompression limits """
+
+from typing import TYPE_CHECKING
+from zlib import MAX_WBITS
+from zlib import compressobj as zlib_compressobj
+from zlib import decompressobj as zlib_decompressobj
+from zlib import error as zlib_error
+
+from brotli import Compressor as BrotliCompressor  # type:ignore
+from brotli import Decompressor as BrotliDecompressor  # type:ignore
+from brotli import error as brotli_error  # type:ignore
+
+from base import codec
+
+try:
+    import zstandard  # type:ignore
+except ImportError:  # zstd is optional
+    zstandard = None
+
+if TYPE_CHECKING:
+    from typing import Any, Iterable
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'Decoder',
+    'Encoder',
+    'DecodeError',
+    'DecodeLimitExceeded',
+    'UnsupportedEncodingException',
+    'get_decoder',
+    'get_encoder',
+    'preview',
+    'supported_encodings'
+]
+
+# brotli before 1.2 can not bound the output of a single call
+_BROTLI_OUTPUT_LIMIT: 'bool' = hasattr(BrotliDecompressor(), 'can_accept_more_data')
+
+# zstandard can not bound its output either, input is fed in slices this
+# small so a single call can not expand beyond a few MB
+_ZSTD_INPUT_SLICE = 256
+
+
+class DecodeError(Exception):
+    """ The body is not valid for its content encoding. """
+    pass
+
+
+class DecodeLimitExceeded(DecodeError):
+    """ Decoding stopped at the configured size or ratio limit. """
+    pass
+
+
+class UnsupportedEncodingException(Exception):
+    pass
+
+
+class Decoder:
+    """ Decodes a body fed chunk by chunk.
+
+    ``feed`` returns the plaintext of each chunk as it arrives. Decoding
+    stops once more than ``max_size`` bytes were produced or the output
+    grows beyond ``max_ratio`` times the input; the ratio is only enforced
+    past ``ratio_grace`` bytes of output so small, highly compressible
+    bodies pass. With ``partial`` the size limit ends decoding quietly,
+    keeping the first ``max_size`` bytes and setting ``truncated``, which is
+    what log previews use. Every other limit raises ``DecodeLimitExceeded``.
+    """
+
+    def __init__(self, max_size: 'int | None' = None, max_ratio: 'float | None' = None,
+                 ratio_grace: 'int | None' = None, partial: 'bool' = False) -> 'None':
+        self.max_size: 'int' = codec['max_decoded_size'] if max_size is None else max_size
+        self.max_ratio: 'float' = codec['max_ratio'] if max_ratio is None else max_ratio
+        self.ratio_grace: 'int' = codec['ratio_grace'] if ratio_grace is None else ratio_grace
+        self.partial = partial
+        self.encoded = 0
+        self.decoded = 0
+        self.truncated = False
+
+    def feed(self, chunk: 'bytes') -> 'bytes':
+        if self.truncated:
+            return b""
+        self.encoded += len(chunk)
+        parts: 'list[bytes]' = []
+        data: 'bytes' = chunk
+        while True:
+            allowed: 'int' = self._allowed()
+            # One byte over the allowance tells a limit hit from an exact fit
+            piece: 'bytes' = self._process(data=data, max_length=allowed + 1)
+            data = b""
+            if len(piece) > allowed:
+                parts.append(self._over_limit(piece=piece, allowed=allowed))
+                break
+            self.decoded += len(piece)
+            parts.append(piece)
+            if not self._pending():
+                break
+        return b"".join(parts)
+
+    def flush(self) -> 'bytes':
+        """ Remaining plaintext once the whole body was fed. """
+        return self.feed(chunk=b"")
+
+    def decode(self, body: 'bytes') -> 'bytes':
+        return self.feed(chunk=body) + self.flush()
+
+    def _allowed(self) -> 'int':
+        by_ratio = max(int(self.encoded * self.max_ratio), self.ratio_grace)
+        return max(min(self.max_size, by_ratio) - self.decoded, 0)
+
+    def _over_limit(self, piece: 'bytes', allowed: 'int') -> 'bytes':
+        if self.partial and self.decoded + allowed >= self.max_size:
+            self.truncated = True
+            self.decoded += allowed
+            return piece[:allowed]
+        if self.decoded + len(piece) > self.max_size:
+            raise DecodeLimitExceeded(f"Decoded body exceeds {self.max_size} bytes")
+        raise DecodeLimitExceeded(f"Decoded body exceeds {self.max_ratio} times its {self.encoded} encoded bytes")
+
+    def _process(self, data: 'bytes', max_length: 'int') -> 'bytes':
+        """ Decode ``data`` plus pending input, returning at most ``max_length`` bytes. """
+        raise NotImplementedError
+
+    def _pending(self) -> 'bool':
+        """ Whether input is left that the last ``_process`` call did not decode. """
+        return False
+
+
+class _ZlibDecoder(Decoder):
+
+    wbits: 'int' = MAX_WBITS
+
+    def __init__(self, **limits: 'Any') -> 'None':
+        super().__init__(**limits)
+        self._obj = zlib_decompressobj(wbits=self.wbits)
+
+    def _process(self, data: 'bytes', max_length: 'int') -> 'bytes':
+        try:
+            return self._obj.decompress(self._obj.unconsumed_tail + data, max_length)
+        except zlib_error as e:
+            raise DecodeError(f"Decompression failed: {e}") from e
+
+    def _pending(self) -> 'bool':
+        return bool(self._obj.unconsumed_tail)
+
+
+class GzipDecoder(_ZlibDecoder):
+
+    wbits = 16 + MAX_WBITS
+
+
+class DeflateDecoder(_ZlibDecoder):
+    """ zlib wrapped deflate, falling back to raw deflate as some servers send it. """
+
+    def _process(self, data: 'bytes', max_length: 'int') -> 'bytes':
+        if self.wbits > 0 and not self.decoded and not self._obj.unconsumed_tail and data:
+            try:
+                return super()._process(data=data, max_length=max_length)
+            except DecodeError:
+                self.wbits = -MAX_WBITS
+                self._obj = zlib_decompressobj(wbits=self.wbits)
+        return super()._process(data=data, max_length=max_length)
+
+
+class BrotliDecoder(Decoder):
+
+    def __init__(self, **limits: 'Any') -> 'None':
+        super().__init__(**limits)
+        self._obj = BrotliDecompressor()
+
+    def _process(self, data: 'bytes', max_length: 'int') -> 'bytes':
+        try:
+            if _BROTLI_OUTPUT_LIMIT:
+                return self._obj.process(data, output_buffer_limit=max_length)
+            return self._obj.process(data)
+        except brotli_error as e:  # type:ignore
+            raise DecodeError(f"Decompression failed: {e}") from e
+
+    def _pending(self) -> 'bool':
+        return _BROTLI_OUTPUT_LIMIT and not self._obj.can_accept_more_data()
+
+
+class ZstdDecoder(Decoder):
+
+    def __init__(self, **limits: 'Any') -> 'None':
+        super().__init__(**limits)
+        self._obj = zstandard.ZstdDecompressor().decompressobj()  # type:ignore
+        self._tail = b""
+
+    def _process(self, data: 'bytes', max_length: 'int') -> 'bytes':
+        if self._obj.eof:
+            # A finished decompressobj can not be called again, anything
+            # after the frame is ignored like zlib's unused_data
+            self._tail = b""
+            return b""
+        data = self._tail + data
+        if not data:
+            return b""
+        self._tail = data[_ZSTD_INPUT_SLICE:]
+        try:
+            return self._obj.decompress(data[:_ZSTD_INPUT_SLICE])
+        except zstandard.ZstdError as e:  # type:ignore
+            raise DecodeError(f"Decompression failed: {e}") from e
+
+    def _pending(self) -> 'bool':
+        return bool(self._tail)
+
+
+class Encoder:
+    """ Encodes a body fed chunk by chunk, ``finish`` returns the trailer. """
+
+    def feed(self, chunk: 'bytes') -> 'bytes':
+        raise NotImplementedError
+
+    def finish(self) -> 'bytes':
+        raise NotImplementedError
+
+    def encode(self, body: 'bytes') -> 'bytes':
+        return self.feed(chunk=body) + self.finish()
+
+
+class _ZlibEncoder(Encoder):
+
+    wbits: 'int' = MAX_WBITS
+
+    def __init__(self) -> 'None':
+        self._obj = zlib_compressobj(wbits=self.wbits)
+
+    def feed(self, chunk: 'bytes') -> 'bytes':
+        return self._obj.compress(chunk)
+
+    def finish(self) -> 'bytes':
+        return self._obj.flush()
+
+
+class GzipEncoder(_ZlibEncoder):
+
+    wbits = 16 + MAX_WBITS
+
+
+class DeflateEncoder(_ZlibEncoder):
+    pass
+
+
+class BrotliEncoder(Encoder):
+
+    def __init__(self) -> 'None':
+        self._obj = BrotliCompressor()
+
+    def feed(self, chunk: 'bytes') -> 'bytes':
+        return self._obj.process(chunk)
+
+    def finish(self) -> 'bytes':
+        return self._obj.finish()
+
+
+class ZstdEncoder(Encoder):
+
+    def __init__(self) -> 'None':
+        self._obj = zstandard.ZstdCompressor().compressobj()  # type:ignore
+
+    def feed(self, chunk: 'bytes') -> 'bytes':
+        return self._obj.compress(chunk)
+
+    def finish(self) -> 'bytes':
+        return self._obj.flush()
+
+
+_DECODERS: 'dict[str, type[Decoder]]' = {
+    'gzip': GzipDecoder,
+    'x-gzip': GzipDecoder,
+    'deflate': DeflateDecoder,
+    'br': BrotliDecoder,
+}
+
+_ENCODERS: 'dict[str, type[Encoder]]' = {
+    'gzip': GzipEncoder,
+    'x-gzip': GzipEncoder,
+    'deflate': DeflateEncoder,
+    'br': BrotliEncoder,
+}
+
+if zstandard is not None:
+    _DECODERS['zstd'] = ZstdDecoder
+    _ENCODERS['zstd'] = ZstdEncoder
+
+
+def supported_encodings() -> 'tuple[str, ...]':
+    return tuple(_DECODERS)
+
+
+def get_decoder(content_encoding: 'str', **limits: 'Any') -> 'Decoder':
+    """ Decoder for a ``Content-Encoding`` value, ``limits`` as for ``Decoder``. """
+    try:
+        return _DECODERS[content_encoding.strip().lower()](**limits)
+    except KeyError:
+        raise UnsupportedEncodingException(f'Unsupported content encoding {content_encoding!r}') from None
+
+
+def get_encoder(content_encoding: 'str') -> 'Encoder':
+    try:
+        return _ENCODERS[content_encoding.strip().lower()]()
+    except KeyError:
+        raise UnsupportedEncodingException(f'Unsupported content encoding {content_encoding!r}') from None
+
+
+def preview(chunks: 'Iterable[bytes]', content_encoding: 'str', size: 'int | None' = None) -> 'tuple[bytes, bool]':
+    """ First ``size`` bytes of plaintext and whether more was left.
+
+    Decoding stops as soon as ``size`` bytes are available, so only as much
+    of the body is decompressed as the preview needs. A body cut short, as
+    a captured prefix may be, yields what could be decoded.
+    """
+    decoder: 'Decoder' = get_decoder(content_encoding, max_size=codec['preview_size'] if size is None else size,
+                                     partial=True)
+    parts: 'list[bytes]' = []
+    for chunk in chunks:
+        parts.append(decoder.feed(chunk=chunk))
+        if decoder.truncated:
+            break
+    else:
+        parts.append(decoder.flush())
+    return b"".join(parts), decoder.truncated
@@ -0,0 +1,132 @@
+""" Dispatch table selecting the interceptors of an exchange """
+
+from fnmatch import translate
+from re import IGNORECASE
+from re import compile as re_compile
+from typing import TYPE_CHECKING
+
+from base import interceptors
+
+from .interceptor import (InterceptorPlugin, ObserverPlugin,
+                          RequestInterceptorPlugin, ResponseInterceptorPlugin)
+
+if TYPE_CHECKING:
+    from re import Pattern
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'InterceptorDispatch'
+]
+
+
+def _overrides_hook(interceptor: 'InterceptorPlugin', hook: 'str') -> 'bool':
+    base: 'type[InterceptorPlugin]' = \
+        RequestInterceptorPlugin if hook == 'process_request_chunk' else ResponseInterceptorPlugin
+    return getattr(type(interceptor), hook) is not getattr(base, hook)
+
+
+def _globs(patterns: 'tuple[str, ...]') -> 'Pattern[str] | None':
+    return re_compile('|'.join(translate(pattern) for pattern in patterns), IGNORECASE) if patterns else None
+
+
+class _Rule:
+    """ Match criteria of one interceptor, compiled at registration. """
+
+    __slots__ = ('hosts', 'methods', 'content_types', 'status')
+
+    def __init__(self, interceptor: 'InterceptorPlugin') -> 'None':
+        self.hosts: 'Pattern[str] | None' = _globs(tuple(interceptor.match_hosts))
+        self.methods: 'frozenset[str] | None' = \
+            frozenset(method.upper() for method in interceptor.match_methods) or None
+        self.content_types: 'Pattern[str] | None' = _globs(tuple(interceptor.match_content_types))
+        self.status: 'tuple[tuple[int, int], ...]' = tuple(interceptor.match_status)
+
+    def accepts_request(self, host: 'str', method: 'str') -> 'bool':
+        return (self.methods is None or method in self.methods) and \
+            (self.hosts is None or self.hosts.fullmatch(host) is not None)
+
+    def accepts_response(self, status: 'int', content_type: 'str') -> 'bool':
+        if self.status and not any(low <= status <= high for low, high in self.status):
+            return False
+        return self.content_types is None or \
+            self.content_types.fullmatch(content_type.split(';', 1)[0].strip()) is not None
+
+
+class InterceptorDispatch:
+    """ Interceptor instances of a server and the table choosing them per exchange.
+
+    Each registered interceptor is instantiated once. Its ``match_*``
+    criteria are compiled into a ``_Rule``; the interceptors accepting a
+    ``(host, method)`` pair are computed once and kept in a table of up to
+    ``cache_size`` entries, so an exchange no plugin is interested in costs
+    a single dictionary lookup. Status and content type criteria are
+    checked per response, and only for interceptors that declare them.
+    """
+
+    def __init__(self, cache_size: 'int | None' = None) -> 'None':
+        self.cache_size: 'int' = interceptors['dispatch_cache_size'] if cache_size is None else cache_size
+        self.request_interceptors: 'list[RequestInterceptorPlugin]' = []
+        self.response_interceptors: 'list[ResponseInterceptorPlugin]' = []
+        self.observers: 'list[ObserverPlugin]' = []
+        self.request_chunk_interceptors: 'set[InterceptorPlugin]' = set()
+        self.response_chunk_interceptors: 'set[InterceptorPlugin]' = set()
+        self._rules: 'dict[InterceptorPlugin, _Rule]' = {}
+        self._request_table: 'dict[tuple[str, str], tuple[RequestInterceptorPlugin, ...]]' = {}
+        self._response_table: 'dict[tuple[str, str], tuple[ResponseInterceptorPlugin, ...]]' = {}
+        self._observer_table: 'dict[tuple[str, str], tuple[ObserverPlugin, ...]]' = {}
+
+    def register(self, interceptor: 'InterceptorPlugin') -> 'None':
+        self._rules[interceptor] = _Rule(interceptor=interceptor)
+        if isinstance(interceptor, RequestInterceptorPlugin):
+            self.request_interceptors.append(interceptor)
+            if _overrides_hook(interceptor, 'process_request_chunk'):
+                self.request_chunk_interceptors.add(interceptor)
+        if isinstance(interceptor, ResponseInterceptorPlugin):
+            self.response_interceptors.append(interceptor)
+            if _overrides_hook(interceptor, 'process_response_chunk'):
+                self.response_chunk_interceptors.add(interceptor)
+        if isinstance(interceptor, ObserverPlugin):
+            self.observers.append(interceptor)
+        self._request_table.clear()
+        self._response_table.clear()
+        self._observer_table.clear()
+
+    def for_request(self, host: 'str', method: 'str') -> 'tuple[RequestInterceptorPlugin, ...]':
+        return self._lookup(table=self._request_table, candidates=self.request_interceptors,
+                            host=host, method=method)
+
+    def for_response(self, host: 'str', method: 'str', status: 'int',
+                     content_type: 'str') -> 'tuple[ResponseInterceptorPlugin, ...]':
+        matched = self._lookup(table=self._response_table, candidates=self.response_interceptors,
+                               host=host, method=method)
+        return self._filter_response(matched=matched, status=status, content_type=content_type)
+
+    def for_observers(self, host: 'str', method: 'str', status: 'int',
+                      content_type: 'str') -> 'tuple[ObserverPlugin, ...]':
+        if not self.observers:
+            return ()
+        matched = self._lookup(table=self._observer_table, candidates=self.observers,
+                               host=host, method=method)
+        return self._filter_response(matched=matched, status=status, content_type=content_type)
+
+    def _filter_response(self, matched: 'tuple', status: 'int', content_type: 'str') -> 'tuple':
+        rules = self._rules
+        return tuple(interceptor for interceptor in matched
+                     if rules[interceptor].accepts_response(status=status, content_type=content_type))
+
+    def _lookup(self, table: 'dict', candidates: 'list', host: 'str', method: 'str') -> 'tuple':
+        key: 'tuple[str, str]' = (host.lower(), method)
+        matched: 'tuple | None' = table.get(key)
+        if matched is None:
+            matched = tuple(interceptor for interceptor in candidates
+                            if self._rules[interceptor].accepts_request(host=key[0], method=method))
+            if len(table) >= self.cache_size:
+                table.clear()
+            table[key] = matched
+        return matched
@@ -1,21 +1,26 @@
 """ Interceptor plugin for log request """
 
-from gzip import BadGzipFile, GzipFile
-from io import BytesIO
+from contextvars import ContextVar
+from logging import DEBUG
 from typing import TYPE_CHECKING
-from zlib import compressobj as zlib_compressobj
-from zlib import decompressobj as zlib_decompressobj
-from zlib import error as zlib_error
 
-from brotli import compress as brotli_compress  # type:ignore
-from brotli import decompress as brotli_decompress  # type:ignore
-from brotli import error as brotli_error  # type:ignore
+from base import codec
+
+from .codecs import (DecodeError, DecodeLimitExceeded,
+                     UnsupportedEncodingException, get_decoder, get_encoder,
+                     preview, supported_encodings)
 
 if TYPE_CHECKING:
 
+    from contextvars import Token
+    from typing import Any
+
     from base.handlers.request_handler import ProxyRequestHandler
     from base.server.proxy_server import BaseProxyServer
 
+    from .codecs import Decoder
+    from .observer import ExchangeSnapshot
+
 __author__ = 'Rushirajsinh Chudasama'
 __copyright__ = 'Copyright 2025, PyLogProxy Project'
 __credits__ = ['Rushirajsinh Chudasama']
@@ -26,134 +31,197 @@ __status__ = 'Development'
 __all__ = [
     'RequestInterceptorPlugin',
     'ResponseInterceptorPlugin',
-    'InvalidInterceptorPluginException'
+    'ObserverPlugin',
+    'InvalidInterceptorPluginException',
+    'bind_http_message_handler',
+    'unbind_http_message_handler'
 ]
 
+# Handler of the exchange being processed in the current thread or task
+_http_message_handler: 'ContextVar[ProxyRequestHandler | None]' = \
+    ContextVar('http_message_handler', default=None)
 
-class InterceptorPlugin(object):
 
-    def __init__(self, server: 'BaseProxyServer', http_message_handler: 'ProxyRequestHandler') -> 'None':
+def bind_http_message_handler(http_message_handler: 'ProxyRequestHandler') -> 'Token':
+    """ Make ``http_message_handler`` the per-request context of every plugin
+    called from the current thread or asyncio task. """
+    return _http_message_handler.set(http_message_handler)
+
+
+def unbind_http_message_handler(token: 'Token') -> 'None':
+    """ Undo the ``bind_http_message_handler`` call that returned ``token``,
+    so the handler is not kept alive past its connection. """
+    _http_message_handler.reset(token)
+
+
+# Stands in for a decoder while a streamed response is sent without encoding
+_IDENTITY: 'Any' = object()
+
+
+class InterceptorPlugin(object):
+    """ Base of all interceptors.
+
+    A server creates one instance per registered class and shares it
+    between all exchanges, so per-request state belongs on
+    ``http_message_handler``, not on the plugin. The ``match_*`` attributes
+    restrict which exchanges the plugin sees; empty means any. Host and
+    content type entries are glob patterns, status entries inclusive
+    ``(low, high)`` ranges. Content type and status only apply to responses.
+    """
+
+    match_hosts: 'tuple[str, ...]' = ()
+    match_methods: 'tuple[str, ...]' = ()
+    match_content_types: 'tuple[str, ...]' = ()
+    match_status: 'tuple[tuple[int, int], ...]' = ()
+
+    def __init__(self, server: 'BaseProxyServer', http_message_handler: 'ProxyRequestHandler | None' = None) -> 'None':
         self.server = server
-        self.http_message_handler = http_message_handler
+        self._http_message_handler = http_message_handler
+
+    @property
+    def http_message_handler(self) -> 'ProxyRequestHandler':
+        """ Handler of the exchange being processed. """
+        if self._http_message_handler is not None:
+            return self._http_message_handler
+        return _http_message_handler.get()  # type:ignore
 
     def decompress_data(self, body: 'bytes', content_encoding: 'str') -> 'tuple[bool, bytes, str, str]':
-        # Check the Content-Encoding header and decompress accordingly
+        # Decode according to the Content-Encoding header, within the codec limits
         decompressed_data: 'bytes' = b""
         decompression_error: 'str' = ""
         decompression_warning: 'str' = ""
         decompression_success = False
-        if content_encoding == 'gzip':
-            try:
-                with GzipFile(fileobj=BytesIO(body)) as f:
-                    decompressed_data = f.read()
-                decompression_success = True
-            except (BadGzipFile, IOError) as e:
-                decompression_error = f"Error decompressing the data: {e}"
-            except EOFError:
-                decompression_error = f"Error: Reached the end of the file unexpectedly while reading."
-            except Exception as e:
-                decompression_error = f"An unexpected error occurred: {e}"
-
-        elif content_encoding == 'deflate':
-            try:
-                decompressor = zlib_decompressobj()
-                decompressed_data = decompressor.decompress(body)
-                if decompressor.unused_data:
-                    decompression_warning = "Warning: Some unused data was left over."
-                decompression_success = True
-            except zlib_error as e:
-                # Handle decompression errors
-                decompression_error = f"Decompression failed: {e}"
-            except ValueError as e:
-                # Handle invalid data input, if any
-                decompression_error = f"Invalid input data: {e}"
-            except Exception as e:
-                # Catch all other exceptions
-                decompression_error = f"An unexpected error occurred: {e}"
-
-        elif content_encoding == 'br':
-            try:
-                decompressed_data = brotli_decompress(  # type:ignore
-                    body)
-                decompression_success = True
-            except brotli_error as e:  # type:ignore
-                # Handle decompression-specific errors
-                decompression_error = f"Decompression failed: {e}"
-            except TypeError as e:
-                # Handle invalid input types (e.g., non-bytes input)
-                decompression_error = f"Invalid input data: {e}"
-            except Exception as e:
-                # Handle any other unexpected errors
-                decompression_error = f"An unexpected error occurred: {e}"
-
-        return decompression_success, decompressed_data, decompression_error, decompression_warning  # type:ignore
+        try:
+            decompressed_data = get_decoder(content_encoding).decode(body=body)
+            decompression_success = True
+        except DecodeLimitExceeded as e:
+            decompression_error = f"Decompression stopped: {e}"
+        except (DecodeError, UnsupportedEncodingException) as e:
+            decompression_error = str(e)
+        except Exception as e:
+            decompression_error = f"An unexpected error occurred: {e}"
+
+        return decompression_success, decompressed_data, decompression_error, decompression_warning
 
     def compress_data(self, body: 'bytes', content_encoding: 'str') -> 'tuple[bool, bytes, str, str]':
-        # Check the Content-Encoding header and decompress accordingly
+        # Encode according to the Content-Encoding header
         compressed_data: 'bytes' = b""
         compression_error: 'str' = ""
         compression_warning: 'str' = ""
         compression_success = False
-        if content_encoding == 'gzip':
-            try:
-                out_file = BytesIO()
-                with GzipFile(fileobj=out_file, mode="wb") as f:
-                    f.write(data=body)
-                compressed_data = out_file.getvalue()
-                compression_success = True
-            except (BadGzipFile, IOError) as e:
-                compression_error = f"Error compressing the data: {e}"
-            except Exception as e:
-                compression_error = f"An unexpected error occurred: {e}"
-
-        elif content_encoding == 'deflate':
-            try:
-                compressor = zlib_compressobj()
-                compressed_data = compressor.compress(body)
-                compression_success = True
-            except zlib_error as e:
-                # Handle decompression errors
-                compression_error = f"Compression failed: {e}"
-            except ValueError as e:
-                # Handle invalid data input, if any
-                compression_error = f"Invalid input data: {e}"
-            except Exception as e:
-                # Catch all other exceptions
-                compression_error = f"An unexpected error occurred: {e}"
-
-        elif content_encoding == 'br':
+        try:
+            compressed_data = get_encoder(content_encoding).encode(body=body)
+            compression_success = True
+        except UnsupportedEncodingException as e:
+            compression_error = str(e)
+        except Exception as e:
+            compression_error = f"An unexpected error occurred: {e}"
+
+        return compression_success, compressed_data, compression_error, compression_warning
+
+    def decompress_response_body(self) -> 'tuple[bool, bytes, str, str]':
+        """ ``decompress_data`` of the current response body, decoded at most
+        once per body and shared by every plugin of the exchange. """
+        handler: 'ProxyRequestHandler' = self.http_message_handler
+        body: 'bytes' = handler.http_response_body
+        cached: 'tuple[bytes, tuple[bool, bytes, str, str]] | None' = handler.http_response_body_decoded
+        if cached is None or cached[0] is not body:
+            cached = (body, self.decompress_data(body=body,
+                                                 content_encoding=handler.http_response_headers.get('Content-Encoding', '')))
+            handler.http_response_body_decoded = cached
+        return cached[1]
+
+    def decode_response_chunk(self, chunk: 'bytes') -> 'tuple[int, bytes]':
+        """ Plaintext of a streamed response chunk and its offset in the
+        decoded body.
+
+        One decoder per exchange is kept on the handler and shared by every
+        plugin, so each chunk is decoded once. Decoding keeps to the codec
+        limits and quietly ends at ``max_decoded_size``; a body that can not
+        be decoded yields no more plaintext.
+        """
+        handler: 'ProxyRequestHandler' = self.http_message_handler
+        state: 'tuple[Decoder | None, bytes, int, bytes] | None' = handler.http_response_chunk_decoded
+        if state is None:
+            content_encoding: 'str' = handler.http_response_headers.get('Content-Encoding', '')
+            if not content_encoding or content_encoding.strip().lower() == 'identity':
+                decoder: 'Decoder | None' = _IDENTITY
+            else:
+                try:
+                    decoder = get_decoder(content_encoding, partial=True)
+                except UnsupportedEncodingException:
+                    decoder = None
+            state = (decoder, b"", 0, b"")
+        decoder, last, offset, plaintext = state
+        if chunk is last:
+            return offset, plaintext
+        offset += len(plaintext)
+        if decoder is _IDENTITY:
+            plaintext = chunk
+        elif decoder is None:
+            plaintext = b""
+        else:
             try:
-                compressed_data = brotli_compress(  # type:ignore
-                    string=body)
-                compression_success = True
-            except brotli_error as e:  # type:ignore
-                # Handle decompression-specific errors
-                compression_error = f"Compression failed: {e}"
-            except TypeError as e:
-                # Handle invalid input types (e.g., non-bytes input)
-                compression_error = f"Invalid input data: {e}"
-            except Exception as e:
-                # Handle any other unexpected errors
-                compression_error = f"An unexpected error occurred: {e}"
-
-        return compression_success, compressed_data, compression_error, compression_warning  # type:ignore
+                plaintext = decoder.feed(chunk=chunk)
+            except DecodeError as e:
+                handler.logger.error(str(e))
+                decoder, plaintext = None, b""
+        handler.http_response_chunk_decoded = (decoder, chunk, offset, plaintext)
+        return offset, plaintext
+
+    def decoded_response_size(self) -> 'int':
+        """ Plaintext bytes ``decode_response_chunk`` produced so far. """
+        state: 'tuple[Decoder | None, bytes, int, bytes] | None' = self.http_message_handler.http_response_chunk_decoded
+        return 0 if state is None else state[2] + len(state[3])
 
     def modify_response(self, http_response: 'bytes') -> 'bytes':
         # process response here
         return http_response
 
+    def modifies_response(self) -> 'bool':
+        # Bodies are only decoded and re-encoded for plugins overriding modify_response
+        return type(self).modify_response is not InterceptorPlugin.modify_response
+
 
 class RequestInterceptorPlugin(InterceptorPlugin):
 
     def process_request(self) -> 'None':
         pass
 
+    def process_request_chunk(self, chunk: 'bytes') -> 'None':
+        # Incremental hook for streamed requests, called once per forwarded
+        # chunk after process_request has seen the headers.
+        pass
+
+    def process_request_body(self) -> 'None':
+        # Called once a streamed request body has been forwarded, with the
+        # captured prefix in http_request_body and, when the capture is
+        # complete, the whole body behind http_request_body_capture.open().
+        pass
+
 
 class ResponseInterceptorPlugin(InterceptorPlugin):
 
     def process_response(self) -> 'None':
         pass
 
+    def process_response_chunk(self, chunk: 'bytes') -> 'None':
+        # Incremental hook for streamed responses, called once per relayed
+        # chunk before process_response sees the captured body prefix.
+        pass
+
+
+class ObserverPlugin(InterceptorPlugin):
+    """ Plugin that only looks at exchanges once they have been relayed.
+
+    ``observe`` runs on the server's observer pool with an immutable
+    ``ExchangeSnapshot``, never delaying the relay. It has no
+    ``http_message_handler``; in process mode it has no ``server`` either.
+    """
+
+    def observe(self, exchange: 'ExchangeSnapshot') -> 'None':
+        pass
+
 
 class InvalidInterceptorPluginException(Exception):
     pass
@@ -165,33 +233,65 @@ class DebugInterceptor(RequestInterceptorPlugin, ResponseInterceptorPlugin):
         self.http_message_handler.logger.info("\n\n")
         self.http_message_handler.logger.info(str(self.http_message_handler.http_request_title))
         self.http_message_handler.logger.info(str(self.http_message_handler.http_request_headers) + "\n\n")
+        if not self.http_message_handler.http_request_streamed:
+            self.process_request_body()
+
+    def process_request_body(self) -> 'None':
         self.http_message_handler.logger.info(self.http_message_handler.http_request_body)
+        if self.http_message_handler.http_request_streamed and self.http_message_handler.http_request_body_truncated:
+            self.http_message_handler.logger.info(
+                f"... truncated, {self.http_message_handler.http_request_body_capture.size} bytes streamed")
         self.http_message_handler.logger.info("\n\n")
 
     def process_response(self) -> 'None':
         self.http_message_handler.logger.info(str(self.http_message_handler.http_response_title))
         self.http_message_handler.logger.info(str(self.http_message_handler.http_response_headers) + "\n\n")
         content_encoding: 'str' = self.http_message_handler.http_response_headers.get('Content-Encoding', '')
-        if content_encoding in ['gzip', 'deflate', 'br']:
+        if content_encoding in supported_encodings():
+            # A streamed body has already been relayed as is
+            modify: 'bool' = not self.http_message_handler.http_response_streamed and self.modifies_response()
+            debug: 'bool' = self.http_message_handler.logger.isEnabledFor(DEBUG)
+            if not modify:
+                if debug and self.http_message_handler.http_response_chunk_decoded is None:
+                    # Decode no more than the log shows
+                    try:
+                        http_response_preview, more = preview(
+                            chunks=[self.http_message_handler.http_response_body], content_encoding=content_encoding)
+                    except DecodeError as e:
+                        self.http_message_handler.logger.error(str(e))
+                        return
+                    self.http_message_handler.logger.debug(
+                        f"Decompressed ({content_encoding}{', preview' if more else ''}):\n {http_response_preview}\n\n")
+                return
+
             decompression_success, http_response_body, \
-                decompression_error, decompression_warning = \
-                self.decompress_data(body=self.http_message_handler.http_response_body,
-                                     content_encoding=content_encoding)
+                decompression_error, decompression_warning = self.decompress_response_body()
             if decompression_success:
-                self.http_message_handler.logger.debug(f"Decompressed ({content_encoding}):\n {http_response_body}\n\n")
+                if debug:
+                    self.http_message_handler.logger.debug(
+                        f"Decompressed ({content_encoding}):\n {http_response_body[:codec['preview_size']]}\n\n")
             else:
                 self.http_message_handler.logger.error(decompression_error)
             if decompression_warning:
                 self.http_message_handler.logger.warning(decompression_warning)
 
-            self.modify_response(http_response=http_response_body)
+            if not decompression_success:
+                return
+
+            modified_body: 'bytes' = self.modify_response(http_response=http_response_body)
+            if modified_body is http_response_body or modified_body == http_response_body:
+                # Unchanged, forward the original encoded bytes
+                return
 
-            compression_success, self.http_message_handler.http_response_body, \
+            compression_success, compressed_body, \
                 compression_error, compression_warning = \
-                self.compress_data(body=http_response_body, content_encoding=content_encoding)
+                self.compress_data(body=modified_body, content_encoding=content_encoding)
             if compression_success:
-                self.http_message_handler.logger.debug(
-                    f"Compressed ({content_encoding}):\n {self.http_message_handler.http_response_body}\n\n")
+                self.http_message_handler.http_response_body = compressed_body
+                if debug:
+                    self.http_message_handler.logger.debug(
+                        f"Compressed ({content_encoding}):\n "
+                        f"{self.http_message_handler.http_response_body[:codec['preview_size']]}\n\n")
             else:
                 self.http_message_handler.logger.error(compression_error)
             if compression_warning:
@@ -203,3 +303,15 @@ class DebugInterceptor(RequestInterceptorPlugin, ResponseInterceptorPlugin):
         else:
             self.http_message_handler.logger.warning(f"No compression or unsupported encoding. - {content_encoding}")
             self.http_message_handler.logger.debug(self.http_message_handler.http_response_body)
+
+    def process_response_chunk(self, chunk: 'bytes') -> 'None':
+        # Streamed bodies are previewed as they are relayed, not from the captured prefix
+        content_encoding: 'str' = self.http_message_handler.http_response_headers.get('Content-Encoding', '')
+        if content_encoding not in supported_encodings() or \
+                not self.http_message_handler.logger.isEnabledFor(DEBUG) or \
+                self.decoded_response_size() >= codec['preview_size']:
+            return
+        offset, plaintext = self.decode_response_chunk(chunk=chunk)
+        shown: 'bytes' = plaintext[:codec['preview_size'] - offset]
+        if shown:
+            self.http_message_handler.logger.debug(f"Decompressed ({content_encoding}, chunk):\n {shown}\n\n")
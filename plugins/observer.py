@@ -0,0 +1,185 @@
+""" Out-of-band execution of observe-only plugins """
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import TYPE_CHECKING, NamedTuple
+
+from base import logger, observers
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+    from typing import Any
+
+    from .interceptor import ObserverPlugin
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+__all__ = [
+    'ExchangeSnapshot',
+    'ObserverPool'
+]
+
+
+class ExchangeSnapshot(NamedTuple):
+    """ Immutable, picklable copy of a relayed exchange.
+
+    Bodies are the captured prefixes, at most ``stream.capture_limit`` bytes,
+    the ``*_body_size`` fields give the full sizes. Timings are milliseconds
+    since the request head was parsed.
+    """
+
+    request_id: 'str'
+    time: 'float'
+    client: 'str'
+    host: 'str'
+    port: 'int'
+    tls: 'bool'
+    method: 'str'
+    status: 'int'
+    request_line: 'str'
+    request_headers: 'tuple[tuple[str, str], ...]'
+    request_body: 'bytes'
+    request_body_size: 'int'
+    response_line: 'str'
+    response_headers: 'tuple[tuple[str, str], ...]'
+    response_body: 'bytes'
+    response_body_size: 'int'
+    response_streamed: 'bool'
+    connect_time: 'float'
+    response_time: 'float'
+    total_time: 'float'
+
+    @classmethod
+    def from_capture(cls, request_id: 'str', meta: 'dict[str, Any]',
+                     request_body: 'bytes', response_body: 'bytes') -> 'ExchangeSnapshot':
+        request: 'dict[str, Any]' = meta['request']
+        response: 'dict[str, Any]' = meta['response']
+        timings: 'dict[str, float]' = meta['timings']
+        return cls(
+            request_id=request_id, time=meta['time'], client=meta['client'], host=meta['host'],
+            port=meta['port'], tls=meta['tls'], method=meta['method'], status=meta['status'],
+            request_line=request['line'], request_headers=tuple((k, v) for k, v in request['headers']),
+            request_body=bytes(request_body), request_body_size=request['body_size'],
+            response_line=response['line'], response_headers=tuple((k, v) for k, v in response['headers']),
+            response_body=bytes(response_body), response_body_size=response['body_size'],
+            response_streamed=response['streamed'], connect_time=timings['connect'],
+            response_time=timings['response'], total_time=timings['total'])
+
+    def header(self, name: 'str', response: 'bool' = True) -> 'str':
+        """ First value of header ``name``, case-insensitive. """
+        name = name.lower()
+        for header, value in self.response_headers if response else self.request_headers:
+            if header.lower() == name:
+                return value
+        return ''
+
+
+# Observer instances of a worker process, created on first use
+_process_observers: 'dict[type[ObserverPlugin], ObserverPlugin]' = {}
+
+
+def _observe_in_process(observer_classes: 'tuple[type[ObserverPlugin], ...]', exchange: 'ExchangeSnapshot') -> 'None':
+    for observer_class in observer_classes:
+        observer: 'ObserverPlugin | None' = _process_observers.get(observer_class)
+        if observer is None:
+            observer = _process_observers[observer_class] = observer_class(server=None)  # type:ignore
+        observer.observe(exchange=exchange)
+
+
+def _observe_in_thread(observers: 'tuple[ObserverPlugin, ...]', exchange: 'ExchangeSnapshot') -> 'None':
+    for observer in observers:
+        observer.observe(exchange=exchange)
+
+
+class ObserverPool:
+    """ Runs observer plugins on a thread or process pool, off the relay path.
+
+    At most ``queue_size`` exchanges may be queued or in progress; beyond
+    that new work is dropped and counted in ``dropped`` instead of slowing
+    the relay down. In ``process`` mode every worker process creates its own
+    observer instances, without a server, and snapshots are pickled to it.
+    The pool is only started once the first exchange is submitted.
+    """
+
+    def __init__(self, mode: 'str | None' = None, workers: 'int | None' = None,
+                 queue_size: 'int | None' = None) -> 'None':
+        mode = observers['mode'] if mode is None else mode
+        workers = observers['workers'] if workers is None else workers
+        queue_size = observers['queue_size'] if queue_size is None else queue_size
+        if mode not in ('thread', 'process'):
+            raise ValueError(f'Unknown observer pool mode {mode!r}')
+        self.mode = mode
+        self.workers = workers
+        self.queue_size = queue_size
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._slots = BoundedSemaphore(value=queue_size)
+        self._lock = Lock()
+        self._executor: 'Executor | None' = None
+        self._closed = False
+
+    @property
+    def depth(self) -> 'int':
+        """ Exchanges queued or being observed. """
+        with self._lock:
+            return self.submitted - self.completed - self.failed
+
+    def submit(self, observers: 'tuple[ObserverPlugin, ...]', exchange: 'ExchangeSnapshot') -> 'None':
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.submitted += 1
+        try:
+            if self.mode == 'process':
+                future: 'Future' = self._start().submit(
+                    _observe_in_process, tuple(type(observer) for observer in observers), exchange)
+            else:
+                future = self._start().submit(_observe_in_thread, observers, exchange)
+        except RuntimeError:
+            # Shut down
+            self._slots.release()
+            with self._lock:
+                self.submitted -= 1
+                self.dropped += 1
+            return
+        future.add_done_callback(self._done)
+
+    def close(self) -> 'None':
+        """ Wait for queued exchanges and stop the workers. """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._closed = True
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _start(self) -> 'Executor':
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Observer pool is closed')
+            if self._executor is None:
+                if self.mode == 'process':
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='pylogproxy-observer')
+            return self._executor
+
+    def _done(self, future: 'Future') -> 'None':
+        self._slots.release()
+        error: 'BaseException | None' = None if future.cancelled() else future.exception()
+        with self._lock:
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if error is not None:
+            logger.error(f"Observer failed: {error!r}")
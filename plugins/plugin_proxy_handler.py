@@ -1,11 +1,21 @@
 """ Proxy handler that uses plugin for processing data"""
 
+from time import monotonic
 from typing import TYPE_CHECKING
 
+from base.handlers.async_request_handler import AsyncProxyRequestHandler
 from base.handlers.request_handler import ProxyRequestHandler
+from plugins.interceptor import (bind_http_message_handler,
+                                 unbind_http_message_handler)
+from plugins.observer import ExchangeSnapshot
 
 if TYPE_CHECKING:
-    from plugins.interceptor import (RequestInterceptorPlugin,
+    from contextvars import Token
+    from typing import Any, Callable
+
+    from base.handlers.metrics import Metrics
+
+    from plugins.interceptor import (ObserverPlugin, RequestInterceptorPlugin,
                                      ResponseInterceptorPlugin)
 
 __author__ = 'Rushirajsinh Chudasama'
@@ -16,28 +26,179 @@ __license__ = 'MIT'
 __status__ = 'Development'
 
 __all__ = [
-    "PluginProxyHandler"
+    "PluginProxyHandler",
+    "AsyncPluginProxyHandler"
 ]
 
 
-class PluginProxyHandler(ProxyRequestHandler):
+def _content_type(headers: 'dict[str,str]') -> 'str':
+    for header, value in headers.items():
+        if header.lower() == 'content-type':
+            return value
+    return ''
+
+
+def _observe_hook(metrics: 'Metrics', hook: 'Callable[..., Any]', started: 'float') -> 'None':
+    metrics.observe('plugin_seconds', monotonic() - started,
+                    plugin=type(hook.__self__).__name__, hook=hook.__name__)  # type:ignore
+
+
+class _InterceptorSelection(ProxyRequestHandler):
+    """ Picks the interceptors and observers of an exchange from the server's
+    dispatch table, shared by both plugin handlers. """
+
+    def _request_interceptors(self) -> 'tuple[RequestInterceptorPlugin, ...]':
+        return self.server.interceptors.for_request(host=self.hostname, method=self.command)
+
+    def _response_interceptors(self) -> 'tuple[ResponseInterceptorPlugin, ...]':
+        return self.server.interceptors.for_response(
+            host=self.hostname, method=self.command, status=self.http_response_status,
+            content_type=_content_type(headers=self.http_response_headers))
+
+    def _select_request_interceptors(self) -> 'None':
+        self.req_interceptors: 'tuple[RequestInterceptorPlugin, ...]' = self._request_interceptors()
+        self.req_chunk_interceptors: 'list[RequestInterceptorPlugin]' = [
+            interceptor for interceptor in self.req_interceptors
+            if interceptor in self.server.interceptors.request_chunk_interceptors]
+
+    def _select_response_interceptors(self) -> 'None':
+        self.res_interceptors: 'tuple[ResponseInterceptorPlugin, ...]' = self._response_interceptors()
+        self.res_chunk_interceptors: 'list[ResponseInterceptorPlugin]' = [
+            interceptor for interceptor in self.res_interceptors
+            if interceptor in self.server.interceptors.response_chunk_interceptors]
+
+    def end_exchange(self, meta: 'dict[str, Any]', request_body: 'bytes', response_body: 'bytes') -> 'None':
+        observers: 'tuple[ObserverPlugin, ...]' = self.server.interceptors.for_observers(
+            host=self.hostname, method=self.command, status=self.http_response_status,
+            content_type=_content_type(headers=self.http_response_headers))
+        if observers:
+            self.server.observers.submit(observers=observers, exchange=ExchangeSnapshot.from_capture(
+                request_id=str(self.request_id), meta=meta, request_body=request_body, response_body=response_body))
+
+
+class PluginProxyHandler(_InterceptorSelection):
+    """ Proxy handler running the server's interceptors on every exchange.
+
+    Interceptors are picked per exchange from the server's dispatch table
+    and find this handler through their ``http_message_handler``.
+    """
+
+    def run_interceptor(self, hook: 'Callable[..., None]', *args: 'Any') -> 'None':
+        """ Call an interceptor hook, timed per plugin when metrics are enabled. """
+        metrics: 'Metrics' = self.server.metrics
+        if not metrics:
+            hook(*args)
+            return
+        started: 'float' = monotonic()
+        try:
+            hook(*args)
+        finally:
+            _observe_hook(metrics=metrics, hook=hook, started=started)
+
+    def handle(self) -> 'None':
+        token: 'Token' = bind_http_message_handler(self)
+        try:
+            super().handle()
+        finally:
+            unbind_http_message_handler(token)
+
+    def build_request(self) -> 'list[bytes]':
+        self.logger.info("*** REQUEST ***")
+        self._select_request_interceptors()
+        for interceptor in self.req_interceptors:
+            self.run_interceptor(interceptor.process_request)
+        data: 'list[bytes]' = super().build_request()
+        self.logger.info("*** END REQUEST ***\n\n")
+        return data
+
+    def request_body_chunk(self, chunk: 'bytes') -> 'None':
+        for interceptor in self.req_chunk_interceptors:
+            self.run_interceptor(interceptor.process_request_chunk, chunk)
+
+    def end_request_stream(self) -> 'None':
+        for interceptor in self.req_interceptors:
+            self.run_interceptor(interceptor.process_request_body)
+
+    def build_response(self) -> 'list[bytes]':
+        self.logger.info("*** RESPONSE ***")
+        for interceptor in self._response_interceptors():
+            self.run_interceptor(interceptor.process_response)
+        data: 'list[bytes]' = super().build_response()
+        self.logger.info("*** END RESPONSE ***")
+        return data
+
+    def begin_response_stream(self) -> 'None':
+        self.logger.info("*** RESPONSE ***")
+        self._select_response_interceptors()
+
+    def response_body_chunk(self, chunk: 'bytes') -> 'None':
+        for interceptor in self.res_chunk_interceptors:
+            self.run_interceptor(interceptor.process_response_chunk, chunk)
+
+    def end_response_stream(self) -> 'None':
+        for interceptor in self.res_interceptors:
+            self.run_interceptor(interceptor.process_response)
+        self.logger.info("*** END RESPONSE ***")
+
 
-    def build_request(self) -> 'bytes':
+class AsyncPluginProxyHandler(_InterceptorSelection, AsyncProxyRequestHandler):
+    """ ``PluginProxyHandler`` for the asyncio engine, interceptors run on the
+    default executor. """
+
+    async def run_interceptor_async(self, hook: 'Callable[..., None]', *args: 'Any') -> 'None':
+        """ ``run_interceptor`` through ``run_blocking``, executor queueing included. """
+        metrics: 'Metrics' = self.server.metrics
+        if not metrics:
+            await self.run_blocking(hook, *args)
+            return
+        started: 'float' = monotonic()
+        try:
+            await self.run_blocking(hook, *args)
+        finally:
+            _observe_hook(metrics=metrics, hook=hook, started=started)
+
+    async def handle(self) -> 'None':  # type:ignore
+        # Every connection is its own task, the binding stays with it
+        token: 'Token' = bind_http_message_handler(self)
+        try:
+            await super().handle()
+        finally:
+            unbind_http_message_handler(token)
+
+    async def build_request_async(self) -> 'list[bytes]':
         self.logger.info("*** REQUEST ***")
-        plugin: 'type[RequestInterceptorPlugin]'
-        for plugin in self.server.req_plugins:
-            plugin(server=self.server,
-                   http_message_handler=self).process_request()
-        data: 'bytes' = super().build_request()
+        self._select_request_interceptors()
+        for interceptor in self.req_interceptors:
+            await self.run_interceptor_async(interceptor.process_request)
+        data: 'list[bytes]' = await super().build_request_async()
         self.logger.info("*** END REQUEST ***\n\n")
         return data
 
-    def build_response(self) -> 'bytes':
+    async def request_body_chunk_async(self, chunk: 'bytes') -> 'None':
+        for interceptor in self.req_chunk_interceptors:
+            await self.run_interceptor_async(interceptor.process_request_chunk, chunk)
+
+    async def end_request_stream_async(self) -> 'None':
+        for interceptor in self.req_interceptors:
+            await self.run_interceptor_async(interceptor.process_request_body)
+
+    async def build_response_async(self) -> 'list[bytes]':
         self.logger.info("*** RESPONSE ***")
-        plugin: 'type[ResponseInterceptorPlugin]'
-        for plugin in self.server.res_plugins:
-            plugin(server=self.server,
-                   http_message_handler=self).process_response()
-        data: 'bytes' = super().build_response()
+        for interceptor in self._response_interceptors():
+            await self.run_interceptor_async(interceptor.process_response)
+        data: 'list[bytes]' = await super().build_response_async()
         self.logger.info("*** END RESPONSE ***")
         return data
+
+    async def begin_response_stream_async(self) -> 'None':
+        self.logger.info("*** RESPONSE ***")
+        self._select_response_interceptors()
+
+    async def response_body_chunk_async(self, chunk: 'bytes') -> 'None':
+        for interceptor in self.res_chunk_interceptors:
+            await self.run_interceptor_async(interceptor.process_response_chunk, chunk)
+
+    async def end_response_stream_async(self) -> 'None':
+        for interceptor in self.res_interceptors:
+            await self.run_interceptor_async(interceptor.process_response)
+        self.logger.info("*** END RESPONSE ***")
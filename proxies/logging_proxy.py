@@ -5,7 +5,8 @@ from base import app
 from base.server.async_proxy_server import AsyncBaseProxyServer
 from base.server.proxy_server import BaseProxyServer
 from plugins.interceptor import DebugInterceptor
-from plugins.plugin_proxy_handler import PluginProxyHandler
+from plugins.plugin_proxy_handler import (AsyncPluginProxyHandler,
+                                          PluginProxyHandler)
 
 __author__ = 'Rushirajsinh Chudasama'
 __copyright__ = 'Copyright 2025, PyLogProxy Project'
@@ -21,18 +22,18 @@ __all__ = [
 
 
 class LoggingProxy(BaseProxyServer):
-    def __init__(self, server_address: 'tuple[str,int]' = (app['host'], app['port']),
+    def __init__(self, server_address: 'tuple[str,int] | None' = None,
                  RequestHandlerClass: 'type[PluginProxyHandler]' = PluginProxyHandler,
                  bind_and_activate: 'bool' = True) -> 'None':
-        super().__init__(server_address, RequestHandlerClass,
+        super().__init__(server_address or (app['host'], app['port']), RequestHandlerClass,
                          bind_and_activate)
         self.register_interceptor(interceptor_class=DebugInterceptor)
 
 
 class AsyncLoggingProxy(AsyncBaseProxyServer):
-    def __init__(self, server_address: 'tuple[str,int]' = (app['host'], app['port']),
-                 RequestHandlerClass: 'type[PluginProxyHandler]' = PluginProxyHandler,
+    def __init__(self, server_address: 'tuple[str,int] | None' = None,
+                 RequestHandlerClass: 'type[AsyncPluginProxyHandler]' = AsyncPluginProxyHandler,
                  bind_and_activate: 'bool' = True) -> 'None':
-        super().__init__(server_address, RequestHandlerClass,
+        super().__init__(server_address or (app['host'], app['port']), RequestHandlerClass,
                          bind_and_activate)
         self.register_interceptor(interceptor_class=DebugInterceptor)
@@ -1,7 +1,10 @@
+from base import supervisor
+from base.server.supervisor import WorkerSupervisor
 from proxies.logging_proxy import AsyncLoggingProxy
 
 if __name__ == '__main__':
-    proxy: 'AsyncLoggingProxy' = AsyncLoggingProxy()
+    proxy: 'AsyncLoggingProxy | WorkerSupervisor' = \
+        WorkerSupervisor(proxy_class=AsyncLoggingProxy) if supervisor['workers'] else AsyncLoggingProxy()
     try:
         print("Proxy server Started")
         proxy.serve_forever()
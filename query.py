@@ -0,0 +1,260 @@
+""" Query and export captured traffic """
+
+from argparse import ArgumentParser, Namespace
+from base64 import b64encode
+from datetime import datetime, timezone
+from itertools import islice
+from json import dumps
+from multiprocessing import Pool, cpu_count
+from sys import stdout
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qsl, urlsplit
+
+from base import request_log
+from base.handlers.capture_store import CaptureReader, host_hash, segments
+from plugins.codecs import DecodeError, UnsupportedEncodingException, get_decoder
+
+if TYPE_CHECKING:
+    from typing import IO, Any, Iterator
+
+__author__ = 'Rushirajsinh Chudasama'
+__copyright__ = 'Copyright 2025, PyLogProxy Project'
+__credits__ = ['Rushirajsinh Chudasama']
+
+__license__ = 'MIT'
+__status__ = 'Development'
+
+
+def parse_time(value: 'str') -> 'float':
+    """ Epoch seconds or an ISO 8601 timestamp, local time if no zone is given. """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_status(value: 'str') -> 'tuple[int, int]':
+    """ ``404``, ``4xx`` or ``400-499`` as an inclusive range. """
+    if value.lower().endswith('xx'):
+        return int(value[0]) * 100, int(value[0]) * 100 + 99
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+def _body(data: 'bytes') -> 'dict[str, Any]':
+    try:
+        return {'text': data.decode(encoding='utf-8')}
+    except UnicodeDecodeError:
+        return {'text': b64encode(data).decode(encoding='ascii'), 'encoding': 'base64'}
+
+
+def _url(record: 'dict[str, Any]') -> 'str':
+    scheme: 'str' = 'https' if record['tls'] else 'http'
+    default: 'int' = 443 if record['tls'] else 80
+    netloc: 'str' = record['host'] if record['port'] == default else f"{record['host']}:{record['port']}"
+    return f"{scheme}://{netloc}{record['request']['line'].split(' ')[1]}"
+
+
+def _header(headers: 'list[list[str]]', name: 'str') -> 'str':
+    for header, value in headers:
+        if header.lower() == name:
+            return value
+    return ''
+
+
+def _decode(data: 'bytes', headers: 'list[list[str]]') -> 'bytes | None':
+    """ Plaintext of a body sent with a ``Content-Encoding``, None if it was
+    sent as is or can not be decoded. Decoding keeps to the codec limits, a
+    body past ``max_decoded_size`` is cut there. """
+    content_encoding: 'str' = _header(headers=headers, name='content-encoding')
+    if not data or not content_encoding or content_encoding.strip().lower() == 'identity':
+        return None
+    try:
+        return get_decoder(content_encoding, partial=True).decode(body=data)
+    except (DecodeError, UnsupportedEncodingException):
+        return None
+
+
+def decode_bodies(record: 'dict[str, Any]') -> 'None':
+    """ Replaces the captured bodies of an exchange with their plaintext.
+
+    The decoded size of a response goes to ``response['content_size']``.
+    """
+    if 'request' not in record:
+        return
+    for side in ('request', 'response'):
+        decoded: 'bytes | None' = _decode(data=record[f'{side}_body'], headers=record[side]['headers'])
+        if decoded is not None:
+            record[f'{side}_body'] = decoded
+            record[side]['content_size'] = len(decoded)
+
+
+def to_jsonl(record: 'dict[str, Any]') -> 'str':
+    request_body: 'bytes' = record.pop('request_body')
+    response_body: 'bytes' = record.pop('response_body')
+    if 'request' in record:
+        record['request']['body'] = _body(data=request_body)
+        record['response']['body'] = _body(data=response_body)
+    return dumps(record)
+
+
+def to_har(record: 'dict[str, Any]') -> 'str':
+    request: 'dict[str, Any]' = record['request']
+    response: 'dict[str, Any]' = record['response']
+    url: 'str' = _url(record=record)
+    timings: 'dict[str, float]' = record['timings']
+    entry: 'dict[str, Any]' = {
+        'startedDateTime': datetime.fromtimestamp(record['time'], tz=timezone.utc).isoformat(),
+        'time': timings['total'],
+        'request': {
+            'method': record['method'],
+            'url': url,
+            'httpVersion': request['line'].rsplit(' ', 1)[-1],
+            'headers': [{'name': name, 'value': value} for name, value in request['headers']],
+            'queryString': [{'name': name, 'value': value}
+                            for name, value in parse_qsl(urlsplit(url).query, keep_blank_values=True)],
+            'cookies': [],
+            'headersSize': -1,
+            'bodySize': request['body_size'],
+        },
+        'response': {
+            'status': record['status'],
+            'statusText': response['line'].split(' ', 2)[-1],
+            'httpVersion': response['line'].split(' ', 1)[0],
+            'headers': [{'name': name, 'value': value} for name, value in response['headers']],
+            'cookies': [],
+            'content': {
+                'size': response.get('content_size', response['body_size']),
+                'mimeType': _header(headers=response['headers'], name='content-type'),
+                **_body(data=record['response_body']),
+            },
+            'redirectURL': _header(headers=response['headers'], name='location'),
+            'headersSize': -1,
+            'bodySize': response['body_size'],
+        },
+        'cache': {},
+        'timings': {
+            'connect': timings['connect'],
+            'send': 0,
+            'wait': round(timings['response'] - timings['connect'], 3),
+            'receive': round(timings['total'] - timings['response'], 3),
+        },
+    }
+    if record['request_body']:
+        entry['request']['postData'] = {
+            'mimeType': _header(headers=request['headers'], name='content-type'),
+            **_body(data=record['request_body']),
+        }
+    return dumps(entry)
+
+
+def search_segment(base: 'str', args: 'Namespace') -> 'Iterator[str]':
+    """ Matching records of one segment, serialized for ``args.format``.
+
+    Time, host, method and status are checked against the index first, only
+    the records passing those are read from the segment. Bodies are decoded
+    before ``--grep`` looks at them.
+    """
+    wanted_host: 'int | None' = host_hash(args.host) if args.host else None
+    wanted_method: 'str | None' = args.method.upper() if args.method else None
+    needle: 'bytes | None' = args.grep.encode(encoding='utf-8') if args.grep else None
+    exchanges_only: 'bool' = args.format == 'har' or any(
+        (args.host, args.path, args.status, args.method))
+    serialize = to_har if args.format == 'har' else to_jsonl
+
+    with CaptureReader(base=base) as reader:
+        for entry in reader.entries():
+            if args.since is not None and entry.time < args.since:
+                continue
+            if args.until is not None and entry.time > args.until:
+                continue
+            if exchanges_only and not entry.method:
+                continue
+            if wanted_host is not None and entry.host_hash != wanted_host:
+                continue
+            if wanted_method is not None and entry.method != wanted_method:
+                continue
+            if args.status is not None and not args.status[0] <= entry.status <= args.status[1]:
+                continue
+
+            record: 'dict[str, Any]' = reader.read(entry=entry)
+            # The index only holds hashes and method codes, confirm on the record
+            if args.host and record['host'].lower() != args.host.lower():
+                continue
+            if wanted_method is not None and record['method'] != wanted_method:
+                continue
+            if args.path and not record['request']['line'].split(' ')[1].startswith(args.path):
+                continue
+            decode_bodies(record=record)
+            if needle is not None and needle not in record['request_body'] and \
+                    needle not in record['response_body']:
+                continue
+            yield serialize(record)
+
+
+def query(args: 'Namespace') -> 'Iterator[str]':
+    """ Serialized matches across the capture directory, oldest segment first,
+    at most ``args.limit`` of them. """
+    bases: 'list[str]' = segments(directory=args.dir)
+    if args.jobs == 1 or len(bases) < 2:
+        matches: 'Iterator[str]' = (line for base in bases for line in search_segment(base=base, args=args))
+        yield from islice(matches, args.limit)
+        return
+    count = 0
+    with Pool(processes=min(args.jobs, len(bases))) as pool:
+        for results in pool.imap(_search_segment, [(base, args) for base in bases]):
+            for line in results:
+                if args.limit is not None and count >= args.limit:
+                    # Leaving the block terminates the workers still searching
+                    return
+                yield line
+                count += 1
+
+
+def _search_segment(job: 'tuple[str, Namespace]') -> 'list[str]':
+    base, args = job
+    # A worker never needs more matches than the whole query returns
+    return list(islice(search_segment(base=base, args=args), args.limit))
+
+
+def write(args: 'Namespace', out: 'IO[str]') -> 'int':
+    count = 0
+    if args.format == 'har':
+        out.write('{"log":{"version":"1.2","creator":{"name":"PyLogProxy","version":"1.0"},"entries":[\n')
+    for line in query(args=args):
+        if args.format == 'har' and count:
+            out.write(',\n')
+        out.write(line)
+        if args.format != 'har':
+            out.write('\n')
+        count += 1
+    if args.format == 'har':
+        out.write('\n]}}\n')
+    return count
+
+
+def main(argv: 'list[str] | None' = None) -> 'None':
+    parser = ArgumentParser(description='Filter captured traffic and export it as JSON lines or HAR.')
+    parser.add_argument('--dir', default=request_log['dir'], help='capture directory (default: %(default)s)')
+    parser.add_argument('--host', help='exact hostname')
+    parser.add_argument('--path', help='request path prefix')
+    parser.add_argument('--method', help='request method')
+    parser.add_argument('--status', type=parse_status, help='status code, class (5xx) or range (200-299)')
+    parser.add_argument('--since', type=parse_time, help='start time, epoch seconds or ISO 8601')
+    parser.add_argument('--until', type=parse_time, help='end time, epoch seconds or ISO 8601')
+    parser.add_argument('--grep', help='substring of the captured request or response body')
+    parser.add_argument('--format', choices=('jsonl', 'har'), default='jsonl')
+    parser.add_argument('--limit', type=int, help='stop after this many records')
+    parser.add_argument('--jobs', type=int, default=cpu_count(), help='worker processes (default: %(default)s)')
+    parser.add_argument('--output', help='write to this file instead of stdout')
+    args: 'Namespace' = parser.parse_args(argv)
+
+    if args.output:
+        with open(file=args.output, mode='w', encoding='utf-8') as out:
+            write(args=args, out=out)
+    else:
+        write(args=args, out=stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+from gzip import compress
+from zlib import compress as zlib_compress
+from zlib import compressobj
+
+import pytest
+
+from plugins.codecs import (DecodeError, DecodeLimitExceeded,
+                            UnsupportedEncodingException, get_decoder,
+                            get_encoder, preview, supported_encodings)
+
+BODY = b'the quick brown fox jumps over the lazy dog\n' * 1000
+
+
+@pytest.mark.parametrize('encoding', supported_encodings())
+def test_round_trip(encoding):
+    encoded = get_encoder(encoding).encode(body=BODY)
+    assert get_decoder(encoding).decode(body=encoded) == BODY
+
+
+@pytest.mark.parametrize('encoding', supported_encodings())
+def test_chunked_feed(encoding):
+    encoded = get_encoder(encoding).encode(body=BODY)
+    decoder = get_decoder(encoding)
+    decoded = b"".join(decoder.feed(chunk=encoded[i:i + 7]) for i in range(0, len(encoded), 7))
+    assert decoded + decoder.flush() == BODY
+
+
+def test_raw_deflate_fallback():
+    raw = compressobj(wbits=-15)
+    assert get_decoder('deflate').decode(body=raw.compress(BODY) + raw.flush()) == BODY
+    assert get_decoder('deflate').decode(body=zlib_compress(BODY)) == BODY
+
+
+def test_size_limit():
+    with pytest.raises(DecodeLimitExceeded):
+        get_decoder('gzip', max_size=len(BODY) - 1).decode(body=compress(BODY))
+    assert get_decoder('gzip', max_size=len(BODY)).decode(body=compress(BODY)) == BODY
+
+
+def test_partial_size_limit_truncates():
+    decoder = get_decoder('gzip', max_size=100, partial=True)
+    assert decoder.decode(body=compress(BODY)) == BODY[:100]
+    assert decoder.truncated
+    assert decoder.feed(chunk=b'more') == b""
+
+
+@pytest.mark.parametrize('encoding', ('gzip', 'br', pytest.param('zstd', marks=pytest.mark.skipif(
+    'zstd' not in supported_encodings(), reason='zstandard is not installed'))))
+def test_ratio_limit(encoding):
+    bomb = get_encoder(encoding).encode(body=b'\0' * (4 << 20))
+    with pytest.raises(DecodeLimitExceeded):
+        get_decoder(encoding, max_ratio=10, ratio_grace=1 << 10).decode(body=bomb)
+    # Small, highly compressible bodies pass within the grace
+    small = get_encoder(encoding).encode(body=b'\0' * 1000)
+    assert get_decoder(encoding, max_ratio=10, ratio_grace=1 << 10).decode(body=small) == b'\0' * 1000
+
+
+def test_invalid_and_unsupported():
+    with pytest.raises(DecodeError):
+        get_decoder('gzip').decode(body=b'not gzip at all')
+    with pytest.raises(UnsupportedEncodingException):
+        get_decoder('compress')
+    with pytest.raises(UnsupportedEncodingException):
+        get_encoder('compress')
+
+
+def test_preview():
+    encoded = compress(BODY)
+    assert preview(chunks=[encoded], content_encoding='gzip', size=10) == (BODY[:10], True)
+    assert preview(chunks=[encoded], content_encoding='gzip', size=len(BODY)) == (BODY, False)
+    # A captured prefix decodes as far as it goes
+    text, more = preview(chunks=[encoded[:len(encoded) // 2]], content_encoding='gzip', size=len(BODY))
+    assert BODY.startswith(text) and not more
@@ -0,0 +1,92 @@
+from argparse import Namespace
+from gzip import compress
+from io import StringIO
+from json import loads
+from uuid import uuid4
+
+import pytest
+
+from base.handlers.capture_store import CaptureStore
+from query import parse_status, query, write
+
+
+def _exchange(host: 'str', method: 'str', path: 'str', status: 'int', at: 'float',
+              response_body: 'bytes' = b"", response_headers: 'list[list[str]] | None' = None) -> 'dict':
+    return {
+        'time': at, 'request_id': str(uuid4()), 'client': '127.0.0.1', 'host': host, 'port': 80, 'tls': False,
+        'method': method, 'status': status,
+        'request': {'line': f'{method} {path} HTTP/1.1', 'headers': [['Host', host]], 'body_size': 0},
+        'response': {'line': f'HTTP/1.1 {status} OK', 'headers': response_headers or [],
+                     'body_size': len(response_body), 'streamed': False},
+        'cache': 'miss', 'timings': {'connect': 1.0, 'response': 2.0, 'total': 3.0},
+    }, response_body
+
+
+@pytest.fixture
+def capture_dir(tmp_path):
+    store = CaptureStore(directory=str(tmp_path), segment_bytes=1 << 20, segment_seconds=3600, name='a')
+    plain = _exchange('example.com', 'GET', '/plain', 200, 100.0, b'hello plain')
+    gzipped = _exchange('example.com', 'GET', '/gzip', 200, 200.0, compress(b'hello needle'),
+                        [['Content-Encoding', 'gzip'], ['Content-Type', 'text/plain']])
+    posted = _exchange('api.example.com', 'POST', '/items', 201, 300.0, b'{}')
+    missing = _exchange('example.com', 'GET', '/missing', 404, 400.0, b'not found')
+    for meta, body in (plain, gzipped, posted, missing):
+        store.append(meta=meta, response_body=body)
+    store.close()
+    return str(tmp_path)
+
+
+def _args(directory: 'str', **overrides) -> 'Namespace':
+    args = dict(dir=directory, host=None, path=None, method=None, status=None, since=None, until=None,
+                grep=None, format='jsonl', limit=None, jobs=1)
+    args.update(overrides)
+    return Namespace(**args)
+
+
+def _paths(directory: 'str', **overrides) -> 'list[str]':
+    return [loads(line)['request']['line'].split(' ')[1] for line in query(_args(directory, **overrides))]
+
+
+def test_parse_status():
+    assert parse_status('404') == (404, 404)
+    assert parse_status('5xx') == (500, 599)
+    assert parse_status('200-299') == (200, 299)
+
+
+def test_filters(capture_dir):
+    assert _paths(capture_dir) == ['/plain', '/gzip', '/items', '/missing']
+    assert _paths(capture_dir, host='API.example.com') == ['/items']
+    assert _paths(capture_dir, method='post') == ['/items']
+    assert _paths(capture_dir, status=(400, 499)) == ['/missing']
+    assert _paths(capture_dir, path='/g') == ['/gzip']
+    assert _paths(capture_dir, since=150.0, until=350.0) == ['/gzip', '/items']
+
+
+def test_grep_matches_decoded_bodies(capture_dir):
+    assert _paths(capture_dir, grep='needle') == ['/gzip']
+    record = loads(next(query(_args(capture_dir, grep='needle'))))
+    assert record['response']['body'] == {'text': 'hello needle'}
+
+
+def test_limit(capture_dir):
+    assert _paths(capture_dir, limit=2) == ['/plain', '/gzip']
+    out = StringIO()
+    assert write(_args(capture_dir, limit=1), out=out) == 1
+
+
+def test_limit_across_workers(capture_dir, tmp_path):
+    second = CaptureStore(directory=str(tmp_path), segment_bytes=1 << 20, segment_seconds=3600, name='b')
+    meta, body = _exchange('example.com', 'GET', '/second', 200, 500.0, b'x')
+    second.append(meta=meta, response_body=body)
+    second.close()
+    assert len(_paths(capture_dir, jobs=2)) == 5
+    assert len(_paths(capture_dir, jobs=2, limit=3)) == 3
+
+
+def test_har_content_is_decoded(capture_dir):
+    out = StringIO()
+    write(_args(capture_dir, format='har', path='/gzip'), out=out)
+    entry = loads(out.getvalue())['log']['entries'][0]
+    assert entry['response']['content']['text'] == 'hello needle'
+    assert entry['response']['content']['size'] == len(b'hello needle')
+    assert entry['response']['bodySize'] == len(compress(b'hello needle'))
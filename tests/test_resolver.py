@@ -0,0 +1,130 @@
+from asyncio import gather, get_running_loop, run, sleep
+from socket import AF_INET, IPPROTO_TCP, SOCK_STREAM
+from threading import Event, Thread
+from time import monotonic
+
+import pytest
+
+from base.handlers import resolver as resolver_module
+from base.handlers.resolver import Resolver
+
+ANSWER = [(AF_INET, SOCK_STREAM, IPPROTO_TCP, '', ('192.0.2.1', 80))]
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """ Counts getaddrinfo calls, which block while ``release`` is unset. """
+    calls: 'list[str]' = []
+    release = Event()
+    release.set()
+
+    def getaddrinfo(host, port, type=0):
+        calls.append(host)
+        release.wait()
+        if host.endswith('.invalid'):
+            raise OSError(f'Unknown host {host}')
+        return ANSWER
+
+    monkeypatch.setattr(resolver_module, 'getaddrinfo', getaddrinfo)
+    return calls, release
+
+
+def _resolver(**options) -> 'Resolver':
+    settings = dict(ttl=60.0, negative_ttl=5.0, cache_size=16, hosts={}, happy_eyeballs_delay=0.25,
+                    connect_timeout=5.0, lookup_timeout=5.0)
+    settings.update(options)
+    return Resolver(**settings)
+
+
+def test_static_hosts_and_literals_skip_lookup(lookups):
+    calls, _ = lookups
+    resolver = _resolver(hosts={'Pinned.test': ['198.51.100.7', '2001:db8::1']})
+    assert [info[4][0] for info in resolver.resolve(host='pinned.test', port=443)] == ['198.51.100.7', '2001:db8::1']
+    assert resolver.resolve(host='203.0.113.5', port=80)[0][4] == ('203.0.113.5', 80)
+    assert calls == []
+
+
+def test_answers_and_failures_are_cached(lookups):
+    calls, _ = lookups
+    resolver = _resolver()
+    assert resolver.resolve(host='Example.test', port=80) == ANSWER
+    assert resolver.resolve(host='example.test', port=80) == ANSWER
+    for _ in range(2):
+        with pytest.raises(OSError):
+            resolver.resolve(host='gone.invalid', port=80)
+    assert calls == ['Example.test', 'gone.invalid']
+    assert (resolver.hits, resolver.misses, resolver.failures) == (2, 2, 1)
+
+
+def test_expired_answers_are_looked_up_again(lookups):
+    calls, _ = lookups
+    resolver = _resolver(ttl=0.0)
+    resolver.resolve(host='example.test', port=80)
+    resolver.resolve(host='example.test', port=80)
+    assert len(calls) == 2
+
+
+def test_concurrent_lookups_share_a_flight(lookups):
+    calls, release = lookups
+    release.clear()
+    resolver = _resolver()
+    results: 'list[object]' = []
+    threads = [Thread(target=lambda: results.append(resolver.resolve(host='example.test', port=80)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while not calls:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert results == [ANSWER] * 4
+    assert calls == ['example.test']
+
+
+def test_follower_gives_up_after_lookup_timeout(lookups):
+    calls, release = lookups
+    release.clear()
+    resolver = _resolver(lookup_timeout=0.1)
+    leader = Thread(target=resolver.resolve, kwargs=dict(host='slow.test', port=80))
+    leader.start()
+    while not calls:
+        pass
+    started = monotonic()
+    with pytest.raises(TimeoutError):
+        resolver.resolve(host='slow.test', port=80)
+    assert monotonic() - started < 2
+    release.set()
+    leader.join(timeout=5)
+    assert resolver.resolve(host='slow.test', port=80) == ANSWER
+
+
+def test_invalid_name_lands_the_flight():
+    resolver = _resolver()
+    host = 'a' * 64 + '.test'
+    with pytest.raises(OSError):
+        resolver.resolve(host=host, port=80)
+    # Answered from the negative cache instead of waiting on a stale flight
+    with pytest.raises(OSError):
+        resolver.resolve(host=host, port=80)
+    assert not resolver._flights
+    with pytest.raises(OSError):
+        run(resolver.resolve_async(host='b' * 64 + '.test', port=80))
+    assert not resolver._flights
+
+
+def test_async_lookups_share_a_flight(monkeypatch):
+    calls: 'list[str]' = []
+
+    async def getaddrinfo(host, port, type=0):
+        calls.append(host)
+        await sleep(0.05)
+        return ANSWER
+
+    async def main():
+        monkeypatch.setattr(get_running_loop(), 'getaddrinfo', getaddrinfo)
+        resolver = _resolver()
+        return await gather(*(resolver.resolve_async(host='example.test', port=80) for _ in range(3)))
+
+    assert run(main()) == [ANSWER] * 3
+    assert calls == ['example.test']
@@ -0,0 +1,178 @@
+from email.utils import formatdate
+from http.client import HTTPMessage
+from time import time
+
+import pytest
+
+from base.handlers.response_cache import (CachedResponse, ResponseCache,
+                                          parse_cache_control)
+
+URL = 'http://example.test:80/resource'
+
+
+def _headers(**fields: 'str') -> 'HTTPMessage':
+    message = HTTPMessage()
+    for name, value in fields.items():
+        message[name.replace('_', '-')] = value
+    return message
+
+
+def _cache(tmp_path, **options) -> 'ResponseCache':
+    settings = dict(enabled=True, memory_size=1 << 20, disk_size=0, max_object_size=1024, max_variants=2,
+                    heuristic_fraction=0.1, heuristic_max=86400, queue_size=16, directory=str(tmp_path))
+    settings.update(options)
+    return ResponseCache(**settings)
+
+
+def _store(cache: 'ResponseCache', response_headers: 'list[tuple[str, str]]', status: 'int' = 200,
+           body: 'bytes' = b'body', request: 'HTTPMessage | None' = None, at: 'float | None' = None) -> 'bool':
+    at = time() if at is None else at
+    return cache.store(url=URL, headers=request or _headers(), status=status, reason='OK',
+                       response_headers=response_headers, body=body, request_time=at, response_time=at)
+
+
+def test_parse_cache_control():
+    assert parse_cache_control('Max-Age=60, no-cache, private="Set-Cookie"') == \
+        {'max-age': '60', 'no-cache': None, 'private': 'Set-Cookie'}
+
+
+def test_disabled_cache_is_falsy(tmp_path):
+    assert not _cache(tmp_path, enabled=False)
+    assert _cache(tmp_path)
+
+
+@pytest.mark.parametrize('response_headers, status, request_headers', [
+    ([('Cache-Control', 'no-store, max-age=60')], 200, None),
+    ([('Cache-Control', 'private, max-age=60')], 200, None),
+    ([('Cache-Control', 'max-age=60'), ('Set-Cookie', 'id=1')], 200, None),
+    ([('Cache-Control', 'max-age=60'), ('Vary', '*')], 200, None),
+    ([('Cache-Control', 'max-age=60')], 206, None),
+    ([('Cache-Control', 'max-age=60')], 200, _headers(Cache_Control='no-store')),
+    ([('Cache-Control', 'max-age=60')], 200, _headers(Authorization='Bearer x')),
+    # Neither fresh nor revalidatable
+    ([], 200, None),
+    # No explicit freshness for a status that allows no heuristics
+    ([('ETag', '"a"')], 302, None),
+])
+def test_not_stored(tmp_path, response_headers, status, request_headers):
+    cache = _cache(tmp_path)
+    assert not _store(cache, response_headers, status=status, request=request_headers)
+    assert cache.lookup(url=URL, headers=_headers()) is None
+
+
+def test_storage_rules(tmp_path):
+    cache = _cache(tmp_path)
+    assert not _store(cache, [('Cache-Control', 'max-age=60')], body=b'x' * 1025)
+    assert _store(cache, [('Cache-Control', 'public, max-age=60')], request=_headers(Authorization='Bearer x'))
+    entry = cache.lookup(url=URL, headers=_headers())
+    assert entry is not None and entry.header('Date') is not None
+    assert _store(cache, [('Cache-Control', 'max-age=60'), ('Connection', 'close'), ('Age', '5')])
+    entry = cache.lookup(url=URL, headers=_headers())
+    assert entry.header('Connection') is None and entry.header('Age') is None and entry.age_value == 5
+
+
+def test_freshness(tmp_path):
+    cache = _cache(tmp_path)
+    now = time()
+    _store(cache, [('Cache-Control', 'max-age=60')], at=now - 30)
+    entry = cache.lookup(url=URL, headers=_headers())
+    assert cache.usable(entry=entry, headers=_headers())
+    assert not cache.usable(entry=entry, headers=_headers(Cache_Control='max-age=10'))
+    assert not cache.usable(entry=entry, headers=_headers(Cache_Control='min-fresh=40'))
+    assert not cache.usable(entry=entry, headers=_headers(Cache_Control='no-cache'))
+    assert not cache.usable(entry=entry, headers=_headers(Pragma='no-cache'))
+
+    _store(cache, [('Cache-Control', 'max-age=60'), ('Age', '50')], at=now - 30)
+    stale = cache.lookup(url=URL, headers=_headers())
+    assert not cache.usable(entry=stale, headers=_headers())
+    assert cache.usable(entry=stale, headers=_headers(Cache_Control='max-stale'))
+    assert cache.usable(entry=stale, headers=_headers(Cache_Control='max-stale=30'))
+    assert not cache.usable(entry=stale, headers=_headers(Cache_Control='max-stale=10'))
+
+    _store(cache, [('Cache-Control', 'max-age=60, must-revalidate'), ('Age', '50')], at=now - 30)
+    assert not cache.usable(entry=cache.lookup(url=URL, headers=_headers()), headers=_headers(Cache_Control='max-stale'))
+
+
+def test_freshness_lifetime():
+    now = time()
+
+    def lifetime(*headers: 'tuple[str, str]', status: 'int' = 200) -> 'float':
+        entry = CachedResponse(status=status, reason='OK', headers=[('Date', formatdate(now, usegmt=True)), *headers],
+                               body=b"", request_time=now, response_time=now, variant=())
+        return entry.freshness_lifetime(heuristic_fraction=0.1, heuristic_max=3600)
+
+    assert lifetime(('Cache-Control', 's-maxage=10, max-age=60')) == 10
+    assert lifetime(('Expires', formatdate(now + 120, usegmt=True))) == pytest.approx(120, abs=1)
+    assert lifetime(('Expires', 'not a date')) == 0
+    assert lifetime(('Last-Modified', formatdate(now - 1000, usegmt=True))) == pytest.approx(100, abs=1)
+    assert lifetime(('Last-Modified', formatdate(now - 10 ** 6, usegmt=True))) == 3600
+    assert lifetime(('Last-Modified', formatdate(now - 1000, usegmt=True)), status=302) == 0
+
+
+def test_vary_selects_variants(tmp_path):
+    cache = _cache(tmp_path)
+    for language in ('en', 'de', 'fr'):
+        _store(cache, [('Cache-Control', 'max-age=60'), ('Vary', 'Accept-Language')],
+               body=language.encode(), request=_headers(Accept_Language=language))
+    assert cache.lookup(url=URL, headers=_headers(Accept_Language='fr')).body == b'fr'
+    assert cache.lookup(url=URL, headers=_headers(Accept_Language='de')).body == b'de'
+    # Only max_variants are kept
+    assert cache.lookup(url=URL, headers=_headers(Accept_Language='en')) is None
+
+
+def test_conditional_requests(tmp_path):
+    cache = _cache(tmp_path)
+    modified = formatdate(time() - 100, usegmt=True)
+    _store(cache, [('Cache-Control', 'max-age=60'), ('ETag', 'W/"v1"'), ('Last-Modified', modified)])
+    entry = cache.lookup(url=URL, headers=_headers())
+    assert entry.validators == {'If-None-Match': 'W/"v1"', 'If-Modified-Since': modified}
+    assert cache.not_modified(entry=entry, headers=_headers(If_None_Match='"v0", "v1"'))
+    assert not cache.not_modified(entry=entry, headers=_headers(If_None_Match='"v2"'))
+    assert cache.not_modified(entry=entry, headers=_headers(If_Modified_Since=formatdate(time(), usegmt=True)))
+
+
+def test_freshen_and_invalidate(tmp_path):
+    cache = _cache(tmp_path)
+    now = time()
+    _store(cache, [('Cache-Control', 'max-age=60'), ('ETag', '"v1"'), ('X-Old', '1')], at=now - 120)
+    entry = cache.lookup(url=URL, headers=_headers())
+    assert not cache.usable(entry=entry, headers=_headers())
+    fresh = cache.freshen(url=URL, entry=entry, response_headers=[('Cache-Control', 'max-age=600'),
+                                                                 ('Content-Length', '0')],
+                          request_time=now, response_time=now)
+    assert fresh.body == b'body' and fresh.header('X-Old') == '1' and fresh.header('Cache-Control') == 'max-age=600'
+    assert cache.usable(entry=cache.lookup(url=URL, headers=_headers()), headers=_headers())
+    cache.invalidate(url=URL)
+    assert cache.lookup(url=URL, headers=_headers()) is None and cache.memory_bytes == 0
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    cache = _cache(tmp_path, memory_size=600)
+    for index in range(3):
+        cache.store(url=f'{URL}/{index}', headers=_headers(), status=200, reason='OK',
+                    response_headers=[('Cache-Control', 'max-age=60')], body=b'x' * 200,
+                    request_time=time(), response_time=time())
+    assert cache.lookup(url=f'{URL}/0', headers=_headers()) is None
+    assert cache.lookup(url=f'{URL}/2', headers=_headers()) is not None
+    assert cache.memory_bytes <= 600
+
+
+def test_disk_tier(tmp_path):
+    cache = _cache(tmp_path, disk_size=1 << 20)
+    _store(cache, [('Cache-Control', 'max-age=60'), ('Vary', 'Accept')], request=_headers(Accept='text/html'))
+    cache.close()
+    reopened = _cache(tmp_path, disk_size=1 << 20)
+    try:
+        assert reopened.lookup(url=URL, headers=_headers(Accept='text/html')) is None
+        loaded = reopened.load(url=URL, headers=_headers(Accept='text/html'))
+        assert loaded is not None and loaded.body == b'body'
+        assert reopened.load(url=URL, headers=_headers(Accept='application/json')) is None
+    finally:
+        reopened.close()
+
+
+def test_accepts():
+    assert ResponseCache.accepts(method='GET', headers=_headers())
+    assert not ResponseCache.accepts(method='POST', headers=_headers())
+    assert not ResponseCache.accepts(method='GET', headers=_headers(Range='bytes=0-1'))
+    assert not ResponseCache.accepts(method='GET', headers=_headers(Cache_Control='no-store'))